@@ -28,15 +28,19 @@ from google.adk.tools import load_artifacts
 
 from .sub_agents import bqml_agent
 from .sub_agents.bigquery.tools import (
-    get_database_settings as get_bq_database_settings,
+    database_settings_ref as bq_database_settings_ref,
+    get_database_settings_async as get_bq_database_settings_async,
+    resolve_database_settings as resolve_bq_database_settings,
+    start_warmup as start_bq_warmup,
 )
 from .prompts import return_instructions_root
 from .tools import call_db_agent, call_ds_agent
+from .utils.instruction_cache import instruction_cache
 
 date_today = date.today()
 
 
-def setup_before_agent_call(callback_context: CallbackContext):
+async def setup_before_agent_call(callback_context: CallbackContext):
     """Setup the agent."""
 
     # setting up database settings in session.state
@@ -45,29 +49,40 @@ def setup_before_agent_call(callback_context: CallbackContext):
         db_settings["use_database"] = "BigQuery"
         callback_context.state["all_db_settings"] = db_settings
 
-    # setting up schema in instruction
+    # setting up the reference to the database settings the instruction is
+    # rendered from
     if callback_context.state["all_db_settings"]["use_database"] == "BigQuery":
-        callback_context.state["database_settings"] = get_bq_database_settings()
-        all_schemas = callback_context.state["database_settings"]["all_bq_ddl_schemas"]
+        callback_context.state["database_settings"] = bq_database_settings_ref(
+            await get_bq_database_settings_async()
+        )
+
 
-        # Combine all schemas into a single string for the agent's instruction
-        combined_schema_str = ""
-        for dataset_id, schema_ddl in all_schemas.items():
-            combined_schema_str += f"""
+def render_root_instruction(database_settings):
+    """Renders the root instruction, with the schema of all datasets."""
+    all_schemas = database_settings["all_bq_ddl_schemas"]
+
+    # Combine all schemas into a single string for the agent's instruction
+    combined_schema_str = "".join(
+        f"""
     --------- BigQuery schema for dataset: `{dataset_id}` with a few sample rows. ---------
     {schema_ddl}
 
     """
-        callback_context._invocation_context.agent.instruction = (
-            return_instructions_root()
-            + combined_schema_str
-        )
+        for dataset_id, schema_ddl in all_schemas.items()
+    )
+    return return_instructions_root() + combined_schema_str
 
 
 root_agent = Agent(
     model=os.getenv("ROOT_AGENT_MODEL"),
     name="db_ds_multiagent",
-    instruction=return_instructions_root(),
+    # Rendered once per schema version, see `InstructionCache`.
+    instruction=instruction_cache.provider(
+        "db_ds_multiagent",
+        render_root_instruction,
+        return_instructions_root,
+        resolve=resolve_bq_database_settings,
+    ),
     global_instruction=(
         f"""
         You are a Data Science and Data Analytics Multi Agent System.
@@ -83,3 +98,8 @@ root_agent = Agent(
     before_agent_callback=setup_before_agent_call,
     generate_content_config=types.GenerateContentConfig(temperature=0.01),
 )
+
+# Build the database settings and open the connections when the agent is
+# loaded, rather than in the first user turn.
+if os.getenv("WARMUP_ON_STARTUP", "1") == "1":
+    start_bq_warmup()
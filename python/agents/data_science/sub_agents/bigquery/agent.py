@@ -27,12 +27,24 @@ from .prompts import return_instructions_bigquery
 NL2SQL_METHOD = os.getenv("NL2SQL_METHOD", "BASELINE")
 
 
-def setup_before_agent_call(callback_context: CallbackContext) -> None:
+async def setup_before_agent_call(callback_context: CallbackContext) -> None:
     """Setup the agent."""
 
     if "database_settings" not in callback_context.state:
-        callback_context.state["database_settings"] = \
-            tools.get_database_settings()
+        callback_context.state["database_settings"] = tools.database_settings_ref(
+            await tools.get_database_settings_async()
+        )
+
+
+def database_agent_request(question: str) -> dict:
+    """Returns the `AgentTool` arguments of a question to the database agent.
+
+    Only the question is sent. The agent and its tools read the schema from
+    the database settings the session state refers to, which `AgentTool`
+    copies into the session of the agent, so the schema is not repeated in
+    the input of the agent.
+    """
+    return {"request": question}
 
 
 database_agent = Agent(
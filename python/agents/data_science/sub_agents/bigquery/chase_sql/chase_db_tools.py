@@ -20,10 +20,14 @@ import os
 from google.adk.tools import ToolContext
 
 # pylint: disable=g-importing-member
+from .context_cache import CONTEXT_CACHE_MAX_SCHEMA_TOKENS, context_cache
 from .dc_prompt_template import DC_PROMPT_TEMPLATE
 from .llm_utils import GeminiModel
 from .qp_prompt_template import QP_PROMPT_TEMPLATE
 from .sql_postprocessor import sql_translator
+from .. import tools
+from ..prompt_layout import PromptLayout
+from ..schema_compactor import estimate_tokens
 
 # pylint: enable=g-importing-member
 
@@ -41,6 +45,35 @@ class GenerateSQLType(enum.Enum):
     QP = "qp"
 
 
+# Compiled once, so that every prompt starts with the same instructions.
+PROMPT_LAYOUTS = {
+    GenerateSQLType.DC.value: PromptLayout.compile(
+        DC_PROMPT_TEMPLATE, BQ_DATA_PROJECT_ID=BQ_DATA_PROJECT_ID
+    ),
+    GenerateSQLType.QP.value: PromptLayout.compile(
+        QP_PROMPT_TEMPLATE, BQ_DATA_PROJECT_ID=BQ_DATA_PROJECT_ID
+    ),
+}
+
+
+def _can_cache_schema(settings):
+    """Returns whether the schema of all datasets may be cached.
+
+    A cached prefix holds every table, instead of the ones linked to the
+    question. That is only worth it when the schema is small enough, or when
+    all the tables are sent anyway.
+    """
+    if tools.SCHEMA_LINKING_TOP_K <= 0:
+        return True
+    schema_token_count = settings.get("schema_token_count")
+    if schema_token_count is None:
+        # Settings stored before the token count.
+        schema_token_count = sum(
+            estimate_tokens(ddl) for ddl in settings["all_bq_ddl_schemas"].values()
+        )
+    return schema_token_count <= CONTEXT_CACHE_MAX_SCHEMA_TOKENS
+
+
 def exception_wrapper(func):
     """A decorator to catch exceptions in a function and return the exception as a string.
 
@@ -93,43 +126,63 @@ def initial_bq_nl2sql(
       str: An SQL statement to answer this question.
     """
     print("****** Running agent with ChaseSQL algorithm.")
-    ddl_schema = tool_context.state["database_settings"]["bq_ddl_schema"]
-    project = tool_context.state["database_settings"]["bq_data_project_id"]
-    db = tool_context.state["database_settings"]["bq_dataset_id"]
-    transpile_to_bigquery = tool_context.state["database_settings"][
-        "transpile_to_bigquery"
-    ]
-    process_input_errors = tool_context.state["database_settings"][
-        "process_input_errors"
-    ]
-    process_tool_output_errors = tool_context.state["database_settings"][
-        "process_tool_output_errors"
-    ]
-    number_of_candidates = tool_context.state["database_settings"][
-        "number_of_candidates"
-    ]
-    model = tool_context.state["database_settings"]["model"]
-    temperature = tool_context.state["database_settings"]["temperature"]
-    generate_sql_type = tool_context.state["database_settings"]["generate_sql_type"]
-
-    if generate_sql_type == GenerateSQLType.DC.value:
-        prompt = DC_PROMPT_TEMPLATE.format(
-            SCHEMA=ddl_schema,
-            QUESTION=question,
-            BQ_DATA_PROJECT_ID=BQ_DATA_PROJECT_ID
+    # Repeated questions skip the generation.
+    cached_sql = tools.get_cached_sql(question, tool_context)
+    if cached_sql is not None:
+        return cached_sql
+
+    # The session state only holds a reference to the settings, and the
+    # relevant schema of the question stays local to this call, so sessions
+    # never see the schema of each other's questions.
+    settings = tools.resolve_database_settings(
+        tool_context.state["database_settings"]
+    )
+    project = settings["bq_data_project_id"]
+    db = settings["bq_dataset_id"]
+    transpile_to_bigquery = settings["transpile_to_bigquery"]
+    process_input_errors = settings["process_input_errors"]
+    process_tool_output_errors = settings["process_tool_output_errors"]
+    number_of_candidates = settings["number_of_candidates"]
+    model = settings["model"]
+    temperature = settings["temperature"]
+    generate_sql_type = settings["generate_sql_type"]
+
+    prompt_layout = PROMPT_LAYOUTS.get(generate_sql_type)
+    if prompt_layout is None:
+        raise ValueError(f"Unsupported generate_sql_type: {generate_sql_type}")
+
+    # The prefix of the prompt, up to the question, is cached with the
+    # schema of all datasets, which only changes with the schema version.
+    # The schema is the compacted one (see `BQ_SCHEMA_TOKEN_BUDGET`), but
+    # not linked to the question, so large schemas are not cached and each
+    # prompt gets the relevant tables instead.
+    cache_name = None
+    if _can_cache_schema(settings):
+        cache_name = context_cache.get_cache_name(
+            model_name=model,
+            template_name=generate_sql_type,
+            schema_version=settings["schema_version"],
+            render_prefix=lambda: prompt_layout.render_prefix(
+                "\n".join(settings["all_bq_ddl_schemas"].values())
+            ),
         )
-    elif generate_sql_type == GenerateSQLType.QP.value:
-        prompt = QP_PROMPT_TEMPLATE.format(
-            SCHEMA=ddl_schema,
-            QUESTION=question,
-            BQ_DATA_PROJECT_ID=BQ_DATA_PROJECT_ID
+
+    # The translator is given the model without the cached prefix.
+    gemini_model = GeminiModel(model_name=model, temperature=temperature)
+    if cache_name is not None:
+        prompt = prompt_layout.render_question(question)
+        generation_model = GeminiModel(
+            model_name=model, temperature=temperature, cache_name=cache_name
         )
     else:
-        raise ValueError(f"Unsupported generate_sql_type: {generate_sql_type}")
+        ddl_schema = tools.get_relevant_schema(question, settings)
+        prompt = prompt_layout.render(ddl_schema, question)
+        generation_model = gemini_model
 
-    model = GeminiModel(model_name=model, temperature=temperature)
     requests = [prompt for _ in range(number_of_candidates)]
-    responses = model.call_parallel(requests, parser_func=parse_response)
+    responses = generation_model.call_parallel(
+        requests, parser_func=parse_response
+    )
     # Take just the first response.
     responses = responses[0]
 
@@ -137,15 +190,20 @@ def initial_bq_nl2sql(
     # then do it here.
     if transpile_to_bigquery:
         translator = sql_translator.SqlTranslator(
-            model=model,
+            model=gemini_model,
             temperature=temperature,
             process_input_errors=process_input_errors,
             process_tool_output_errors=process_tool_output_errors,
         )
         # pylint: disable=g-bad-todo
         # pylint: enable=g-bad-todo
+        # The structured schema gives the translator the column types without
+        # parsing the DDL.
         responses: str = translator.translate(
-            responses, ddl_schema=ddl_schema, db=db, catalog=project
+            responses,
+            ddl_schema=tools.get_database_schema(settings).mapping_schema(),
+            db=db,
+            catalog=project,
         )
 
     return responses
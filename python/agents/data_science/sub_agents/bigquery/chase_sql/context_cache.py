@@ -0,0 +1,329 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Vertex AI context caches of the static prefix of the CHASE-SQL prompts.
+
+The DC and QP prompts are made of long instructions and examples, then the
+schema, then the question. Everything before the question only changes with
+the schema, so it is stored once as cached content, per model, template and
+schema version, and each call only sends the question.
+
+Caches are renewed when used close to their expiry, replaced when the schema
+changes, and calls fall back to the full prompt if a cache cannot be created.
+"""
+
+import dataclasses
+import datetime
+import functools
+import logging
+import os
+import threading
+import time
+from typing import Callable, Protocol
+
+from data_science.utils.single_flight import SingleFlight
+
+from ..schema_compactor import estimate_tokens
+
+# Lifetime of the caches. 0 disables the caching.
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CHASE_CONTEXT_CACHE_TTL_SECONDS", "0"))
+# Caches used less than this before their expiry are renewed.
+CONTEXT_CACHE_RENEW_BEFORE_SECONDS = 300
+# Time before retrying to create a cache that could not be created.
+CONTEXT_CACHE_RETRY_SECONDS = 600
+# Caches hold the schema of all datasets, not the tables linked to the
+# question, so they are only used for schemas of at most this many tokens.
+# Larger schemas are linked to the question and sent in full prompts.
+CONTEXT_CACHE_MAX_SCHEMA_TOKENS = int(
+    os.getenv("CHASE_CONTEXT_CACHE_MAX_SCHEMA_TOKENS", "32768")
+)
+
+
+@dataclasses.dataclass(slots=True)
+class CachedPrefix:
+    """A context cache created by a `ContextCacheBackend`.
+
+    Attributes:
+      name: The resource name of the cache.
+      expire_time: The expiry, as a POSIX timestamp.
+    """
+
+    name: str
+    expire_time: float
+
+
+class ContextCacheBackend(Protocol):
+    """The service storing the context caches."""
+
+    def create(
+        self, model_name: str, prefix: str, ttl_seconds: int
+    ) -> CachedPrefix:
+        """Caches a prompt prefix for a model."""
+
+    def renew(self, name: str, ttl_seconds: int) -> float:
+        """Extends the lifetime of a cache and returns its new expiry."""
+
+    def delete(self, name: str):
+        """Deletes a cache."""
+
+
+class VertexContextCacheBackend:
+    """Context caches of the Vertex AI `CachedContent` API."""
+
+    def create(
+        self, model_name: str, prefix: str, ttl_seconds: int
+    ) -> CachedPrefix:
+        # pylint: disable=g-import-not-at-top
+        from vertexai.generative_models import Content, Part
+        from vertexai.preview import caching
+
+        # pylint: enable=g-import-not-at-top
+        cached_content = caching.CachedContent.create(
+            model_name=model_name,
+            contents=[Content(role="user", parts=[Part.from_text(prefix)])],
+            ttl=datetime.timedelta(seconds=ttl_seconds),
+        )
+        return CachedPrefix(
+            name=cached_content.name,
+            expire_time=cached_content.expire_time.timestamp(),
+        )
+
+    def renew(self, name: str, ttl_seconds: int) -> float:
+        from vertexai.preview import caching  # pylint: disable=g-import-not-at-top
+
+        cached_content = caching.CachedContent(cached_content_name=name)
+        cached_content.update(ttl=datetime.timedelta(seconds=ttl_seconds))
+        cached_content.refresh()
+        return cached_content.expire_time.timestamp()
+
+    def delete(self, name: str):
+        from vertexai.preview import caching  # pylint: disable=g-import-not-at-top
+
+        caching.CachedContent(cached_content_name=name).delete()
+
+
+@dataclasses.dataclass(slots=True)
+class ContextCacheStats:
+    """Usage counters of a `ContextCacheManager`.
+
+    Attributes:
+      hits: Calls served from an existing cache.
+      misses: Calls that created a cache.
+      fallbacks: Calls sent without a cache, because none could be created.
+      renewals: Caches renewed before their expiry.
+      invalidations: Caches replaced after a schema change.
+      saved_tokens: Estimated prompt tokens not sent, thanks to the hits.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    fallbacks: int = 0
+    renewals: int = 0
+    invalidations: int = 0
+    saved_tokens: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of calls served from an existing cache."""
+        calls = self.hits + self.misses + self.fallbacks
+        return self.hits / calls if calls else 0.0
+
+
+@dataclasses.dataclass(slots=True)
+class _CacheEntry:
+    schema_version: str
+    cached: CachedPrefix | None
+    prefix_tokens: int = 0
+    # Set when the cache could not be created, until the next attempt.
+    retry_time: float = 0.0
+
+
+class ContextCacheManager:
+    """Creates, renews and invalidates the context caches of prompt prefixes.
+
+    There is at most one cache per (model, template): a cache of a previous
+    schema version is deleted when the first call on the new schema replaces
+    it. The cache service is called outside the lock, so that a slow call
+    only holds up the calls on the same prefix, which wait for it instead of
+    each creating a cache.
+    """
+
+    def __init__(
+        self,
+        backend: ContextCacheBackend,
+        ttl_seconds: int = CONTEXT_CACHE_TTL_SECONDS,
+        renew_before_seconds: int = CONTEXT_CACHE_RENEW_BEFORE_SECONDS,
+        retry_seconds: int = CONTEXT_CACHE_RETRY_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self._backend = backend
+        self._ttl_seconds = ttl_seconds
+        self._renew_before_seconds = renew_before_seconds
+        self._retry_seconds = retry_seconds
+        self._clock = clock
+        self._entries: dict[tuple[str, str], _CacheEntry] = {}
+        # Guards the entries and stats, never held during a service call.
+        self._lock = threading.Lock()
+        # The in-flight creation or renewal of the cache of each prefix.
+        self._flights: dict[tuple[str, str], SingleFlight] = {}
+        self.stats = ContextCacheStats()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether caches are created."""
+        return self._ttl_seconds > 0
+
+    def get_cache_name(
+        self,
+        model_name: str,
+        template_name: str,
+        schema_version: str,
+        render_prefix: Callable[[], str],
+    ) -> str | None:
+        """Returns the cache of a prompt prefix, creating it if needed.
+
+        Args:
+            model_name: The model the cache is used with.
+            template_name: The name of the prompt template.
+            schema_version: The version of the schema in the prefix.
+            render_prefix: Renders the prefix. Only called to create a cache.
+
+        Returns:
+            The resource name of the cache, or None if the prompt must be sent
+            in full.
+        """
+        if not self.enabled:
+            return None
+        key = (model_name, template_name)
+        with self._lock:
+            name, found = self._lookup(key, schema_version)
+            if found:
+                return name
+            flight = self._flights.setdefault(key, SingleFlight())
+        return flight.do(
+            functools.partial(
+                self._update, key, model_name, schema_version, render_prefix
+            )
+        )
+
+    def _lookup(self, key, schema_version):
+        """Returns the usable cache of a prefix, and whether it was decided.
+
+        Must be called with the lock held. Returns (None, False) when the cache
+        must be created, renewed or replaced.
+        """
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is None or entry.schema_version != schema_version:
+            return None, False
+        if entry.cached is None:
+            if now < entry.retry_time:
+                self.stats.fallbacks += 1
+                return None, True
+            return None, False
+        if now >= entry.cached.expire_time - self._renew_before_seconds:
+            return None, False
+        self.stats.hits += 1
+        self.stats.saved_tokens += entry.prefix_tokens
+        return entry.cached.name, True
+
+    def _update(self, key, model_name, schema_version, render_prefix):
+        """Renews, replaces or creates the cache of a prefix."""
+        with self._lock:
+            # A previous flight may have updated the cache in the meantime.
+            name, found = self._lookup(key, schema_version)
+            if found:
+                return name
+            entry = self._entries.get(key)
+
+        if entry is not None and entry.schema_version != schema_version:
+            self._delete(entry)
+            with self._lock:
+                self.stats.invalidations += 1
+            entry = None
+        if (
+            entry is not None
+            and entry.cached is not None
+            and self._clock() < entry.cached.expire_time
+        ):
+            entry = self._renew(entry)
+            if entry is not None:
+                with self._lock:
+                    self._entries[key] = entry
+                    self.stats.hits += 1
+                    self.stats.saved_tokens += entry.prefix_tokens
+                return entry.cached.name
+
+        entry = self._create(model_name, schema_version, render_prefix)
+        with self._lock:
+            self._entries[key] = entry
+            if entry.cached is None:
+                self.stats.fallbacks += 1
+                return None
+            self.stats.misses += 1
+            return entry.cached.name
+
+    def _create(self, model_name, schema_version, render_prefix):
+        prefix = render_prefix()
+        try:
+            cached = self._backend.create(model_name, prefix, self._ttl_seconds)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logging.warning(
+                f"Could not create the context cache for {model_name}, sending"
+                f" full prompts for {self._retry_seconds} seconds: {e}"
+            )
+            return _CacheEntry(
+                schema_version=schema_version,
+                cached=None,
+                retry_time=self._clock() + self._retry_seconds,
+            )
+        logging.info(f"Created the context cache {cached.name} for {model_name}.")
+        return _CacheEntry(
+            schema_version=schema_version,
+            cached=cached,
+            prefix_tokens=estimate_tokens(prefix),
+        )
+
+    def _renew(self, entry):
+        """Returns the renewed entry, or None if it expired."""
+        try:
+            expire_time = self._backend.renew(entry.cached.name, self._ttl_seconds)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logging.warning(
+                f"Could not renew the context cache {entry.cached.name}: {e}"
+            )
+            if self._clock() >= entry.cached.expire_time:
+                return None
+            return entry
+        with self._lock:
+            self.stats.renewals += 1
+        return dataclasses.replace(
+            entry,
+            cached=CachedPrefix(name=entry.cached.name, expire_time=expire_time),
+        )
+
+    def _delete(self, entry):
+        if entry.cached is None:
+            return
+        try:
+            self._backend.delete(entry.cached.name)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # The cache expires by itself anyway.
+            logging.warning(
+                f"Could not delete the context cache {entry.cached.name}: {e}"
+            )
+
+
+# Shared by all the CHASE-SQL calls of the process.
+context_cache = ContextCacheManager(VertexContextCacheBackend())
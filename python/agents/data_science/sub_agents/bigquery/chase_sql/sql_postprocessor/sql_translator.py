@@ -20,6 +20,7 @@ from typing import Any, Final
 import regex
 import sqlglot
 import sqlglot.optimizer
+from sqlglot.schema import MappingSchema
 
 from ..llm_utils import GeminiModel  # pylint: disable=g-importing-member
 from .correction_prompt_template import (
@@ -33,7 +34,7 @@ TableSchemaType = tuple[str, AllColumnsSchemaType]
 DDLSchemaType = list[TableSchemaType]
 
 SQLGlotColumnsDictType = dict[str, str]
-SQLGlotSchemaType = dict[str, Any]
+SQLGlotSchemaType = dict[str, Any] | MappingSchema
 
 BirdSampleType = dict[str, Any]
 
@@ -83,7 +84,7 @@ def _isinstance_sqlglot_schema_type(obj: Any) -> bool:
 
 
 def _isinstance_bird_sample_type(obj: Any) -> bool:
-    """Checks if the object is a SQLGlot schema type."""
+    """Checks if the object is a Bird dataset example."""
     return isinstance(obj, dict) and not _isinstance_sqlglot_schema_type(obj)
 
 
@@ -282,7 +283,11 @@ class SqlTranslator:
     ) -> SQLGlotSchemaType:
         """Rewrites the schema for use in SQLGlot."""
         schema_dict = None
-        if schema:
+        if isinstance(schema, MappingSchema):
+            # Already built, e.g. from the structured schema of the database
+            # settings: no need to parse anything.
+            schema_dict = schema
+        elif schema:
             if isinstance(schema, str):
                 schema = cls.extract_schema_from_ddls(schema)
                 schema_dict = cls.format_schema(schema)
@@ -365,8 +370,9 @@ class SqlTranslator:
           catalog: The catalog to use for the translation. `catalog` is the SQLGlot
             term for the project ID. This field is optional.
           ddl_schema: The DDL schema to use for the translation. The DDL format can
-            be the SQLGlot format, the DDL schema format, a Bird dataset example, or
-            a string containing multiple DDL statements. This field is optional.
+            be the SQLGlot format (a dict or a `MappingSchema`), the DDL schema
+            format, a Bird dataset example, or a string containing multiple DDL
+            statements. This field is optional.
           number_of_candidates: The number of candidates to generate, default is 1.
 
         Returns:
@@ -388,7 +394,11 @@ class SqlTranslator:
         responses = sql_query  # Default to the input SQL query after error check.
         if errors:
             print("Processing input errors")
-            if schema_dict:
+            if isinstance(schema_dict, MappingSchema):
+                schema_insert = (
+                    f"\nThe database schema is:\n{schema_dict.mapping}\n"
+                )
+            elif schema_dict:
                 # If the schema is provided, then insert it into the prompt.
                 schema_insert = f"\nThe database schema is:\n{schema_dict}\n"
             else:
@@ -430,7 +440,8 @@ class SqlTranslator:
           catalog: The catalog to use for the translation. `catalog` is the SQLGlot
             term for the project ID. This field is optional.
           ddl_schema: The DDL schema to use for the translation. The DDL format can
-            be the SQLGlot format or the DDL schema format. This field is optional.
+            be the SQLGlot format (a dict or a `MappingSchema`) or the DDL schema
+            format. This field is optional.
 
         Returns:
           The translated SQL query.
@@ -0,0 +1,95 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Prefix-stable layout of the NL2SQL prompts.
+
+The prompt templates are compiled once, at import, into three parts sent in
+this order:
+
+1. The static prefix: instructions and examples, with the constants of the
+   deployment (e.g. the data project) already filled in.
+2. The schema block, which only changes with the schema.
+3. The question block.
+
+Every prompt of a template starts with the same static prefix, byte for
+byte, so that the model server can reuse it across requests (implicit prefix
+caching), and the prefix can also be stored as explicit cached content.
+"""
+
+import dataclasses
+
+SCHEMA_PLACEHOLDER = "{SCHEMA}"
+QUESTION_PLACEHOLDER = "{QUESTION}"
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class PromptLayout:
+    """A prompt template split into its static, schema and question parts.
+
+    Attributes:
+      static_prefix: The text before the schema.
+      schema_template: The text from the schema to the question, with
+        `{SCHEMA}`.
+      question_template: The text from the question to the end, with
+        `{QUESTION}`.
+    """
+
+    static_prefix: str
+    schema_template: str
+    question_template: str
+
+    @classmethod
+    def compile(cls, template: str, **constants) -> "PromptLayout":
+        """Compiles a `str.format` template with `{SCHEMA}` and `{QUESTION}`.
+
+        Args:
+          template: The template. The schema must come before the question.
+          **constants: The values of the other placeholders.
+
+        Returns:
+          The layout of the template.
+
+        Raises:
+          ValueError: If the schema does not come before the question.
+        """
+        text = template.format(
+            **constants,
+            SCHEMA=SCHEMA_PLACEHOLDER,
+            QUESTION=QUESTION_PLACEHOLDER,
+        )
+        schema_at = text.find(SCHEMA_PLACEHOLDER)
+        question_at = text.find(QUESTION_PLACEHOLDER)
+        if not 0 <= schema_at < question_at:
+            raise ValueError(
+                "The schema must come before the question in prompt templates."
+            )
+        return cls(
+            static_prefix=text[:schema_at],
+            schema_template=text[schema_at:question_at],
+            question_template=text[question_at:],
+        )
+
+    def render_prefix(self, schema: str) -> str:
+        """Renders the part of the prompt before the question."""
+        return self.static_prefix + self.schema_template.replace(
+            SCHEMA_PLACEHOLDER, schema, 1
+        )
+
+    def render_question(self, question: str) -> str:
+        """Renders the part of the prompt from the question."""
+        return self.question_template.replace(QUESTION_PLACEHOLDER, question, 1)
+
+    def render(self, schema: str, question: str) -> str:
+        """Renders the whole prompt."""
+        return self.render_prefix(schema) + self.render_question(question)
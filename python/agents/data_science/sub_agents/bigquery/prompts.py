@@ -20,6 +20,10 @@ These instructions guide the agent's behavior, workflow, and tool usage.
 
 import os
 
+# Name of the validation tool, which ADK takes from its function,
+# `tools.run_bigquery_validation`.
+VALIDATION_TOOL_NAME = "run_bigquery_validation"
+
 
 def return_instructions_bigquery() -> str:
 
@@ -29,6 +33,7 @@ def return_instructions_bigquery() -> str:
     else:
         db_tool_name = None
         raise ValueError(f"Unknown NL2SQL method: {NL2SQL_METHOD}")
+    validation_tool_name = VALIDATION_TOOL_NAME
 
     instruction_prompt_bqml_v1 = f"""
       You are an AI assistant serving as a SQL expert for BigQuery.
@@ -37,16 +42,17 @@ def return_instructions_bigquery() -> str:
 
       Use the provided tools to help generate the most accurate SQL:
       1. First, use {db_tool_name} tool to generate initial SQL from the question.
-      2. You should also validate the SQL you have created for syntax and function errors (Use run_bigquery_validation tool). If there are any errors, you should go back and address the error in the SQL. Recreate the SQL based by addressing the error.
+      2. You should also validate the SQL you have created for syntax and function errors (Use {validation_tool_name} tool). If there are any errors, you should go back and address the error in the SQL. Recreate the SQL based by addressing the error.
+      3. If the validation reports that the query is too expensive, do not retry the same SQL: narrow it down (select only the needed columns, filter on the partitioning columns or a smaller range) and validate it again.
       4. Generate the final result in JSON format with four keys: "explain", "sql", "sql_results", "nl_results".
           "explain": "write out step-by-step reasoning to explain how you are generating the query based on the schema, example, and question.",
           "sql": "Output your generated SQL!",
-          "sql_results": "raw sql execution query_result from run_bigquery_validation if it's available, otherwise None",
+          "sql_results": "raw sql execution query_result from {validation_tool_name} if it's available, otherwise None",
           "nl_results": "Natural language about results, otherwise it's None if generated SQL is invalid"
       ```
       You should pass one tool call to another tool call as needed!
 
-      NOTE: you should ALWAYS USE THE TOOLS ({db_tool_name} AND run_bigquery_validation) to generate SQL, not make up SQL WITHOUT CALLING TOOLS.
+      NOTE: you should ALWAYS USE THE TOOLS ({db_tool_name} AND {validation_tool_name}) to generate SQL, not make up SQL WITHOUT CALLING TOOLS.
       Keep in mind that you are an orchestration agent, not a SQL expert, so use the tools to help you generate SQL, but do not make up SQL.
 
     """
@@ -0,0 +1,208 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cache of the results of the validated queries.
+
+Queries are keyed by a hash of their canonical SQL, as generated by SQLGlot
+from their syntax tree, so that the same query written with other spaces,
+keyword case or table aliases hits the same results. Like the BigQuery query
+cache, results of queries using non-deterministic functions are not cached.
+"""
+
+import collections
+import copy
+import dataclasses
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable
+
+import sqlglot
+from sqlglot import exp
+
+# Maximum size of the cached results, in bytes of JSON. 0 disables the cache.
+RESULT_CACHE_MAX_BYTES = int(
+    os.getenv("BQ_RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+# Lifetime of the cached results.
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("BQ_RESULT_CACHE_TTL_SECONDS", "300"))
+
+# Functions whose results change between runs of the same query.
+_NON_DETERMINISTIC_FUNCTIONS = frozenset({
+    "CURRENT_DATE",
+    "CURRENT_DATETIME",
+    "CURRENT_TIME",
+    "CURRENT_TIMESTAMP",
+    "GENERATE_UUID",
+    "NOW",
+    "RAND",
+    "SESSION_USER",
+    # GENERATE_UUID, as named by SQLGlot.
+    "UUID",
+})
+
+
+def _function_name(function: exp.Func) -> str:
+    if isinstance(function, exp.Anonymous):
+        return function.name.upper()
+    return function.sql_name()
+
+
+def canonical_sql(
+    sql: str, expression: exp.Expression | None = None
+) -> str | None:
+    """Returns the canonical SQL of a query, None if it must not be cached.
+
+    Table aliases, which BigQuery compares without case, are renamed in order
+    of appearance, and the SQL is generated
+    from the syntax tree, which normalizes spaces and the case of keywords
+    and functions. Column aliases are kept, as they name the result columns.
+    Queries that cannot be parsed are canonicalized by their spaces only.
+    The syntax tree of the query, if already parsed, is reused but left
+    unchanged.
+    """
+    if expression is not None:
+        expression = expression.copy()
+    else:
+        try:
+            expression = sqlglot.parse_one(sql, read="bigquery")
+        except sqlglot.errors.ParseError:
+            return " ".join(sql.split())
+    if any(
+        _function_name(function) in _NON_DETERMINISTIC_FUNCTIONS
+        for function in expression.find_all(exp.Func)
+    ):
+        return None
+
+    aliases = {}
+    for table in expression.find_all(exp.Table):
+        if table.alias:
+            new_alias = aliases.setdefault(
+                table.alias.lower(), f"_t{len(aliases)}"
+            )
+            table.set("alias", exp.TableAlias(this=exp.to_identifier(new_alias)))
+    for column in expression.find_all(exp.Column):
+        if column.table.lower() in aliases:
+            column.set("table", exp.to_identifier(aliases[column.table.lower()]))
+    return expression.sql(dialect="bigquery", normalize_functions="upper")
+
+
+@dataclasses.dataclass(slots=True)
+class ResultCacheStats:
+    """Usage counters of a `QueryResultCache`.
+
+    Attributes:
+      hits: Queries answered from the cache.
+      misses: Queries run against BigQuery.
+      evictions: Results removed, as least recently used or expired.
+      size_bytes: The current size of the cached results.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size_bytes: int = 0
+
+
+@dataclasses.dataclass(slots=True)
+class _Entry:
+    result: dict[str, Any]
+    size_bytes: int
+    expire_time: float
+
+
+class QueryResultCache:
+    """LRU cache of query results, bounded in bytes, by schema version.
+
+    Results are copied when cached and when returned, so the sessions
+    getting the same result never share, nor change, each other's copy.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        ttl_seconds: float = RESULT_CACHE_TTL_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self._max_bytes = max_bytes
+        self._ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: collections.OrderedDict[str, _Entry] = (
+            collections.OrderedDict()
+        )
+        self.stats = ResultCacheStats()
+
+    @staticmethod
+    def key(
+        sql: str,
+        schema_version: str,
+        expression: exp.Expression | None = None,
+    ) -> str | None:
+        """Returns the cache key of a query, None if it must not be cached."""
+        canonical = canonical_sql(sql, expression)
+        if canonical is None:
+            return None
+        return hashlib.sha256(
+            f"{schema_version}\0{canonical}".encode("utf-8")
+        ).hexdigest()
+
+    def get(self, key: str | None) -> dict[str, Any] | None:
+        """Returns the cached result of a query key, if any."""
+        if self._max_bytes <= 0 or key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._clock() >= entry.expire_time:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            result = entry.result
+        return copy.deepcopy(result)
+
+    def put(self, key: str | None, result: dict[str, Any]):
+        """Caches the result of a query key, if it fits the cache."""
+        if self._max_bytes <= 0 or key is None:
+            return
+        size_bytes = len(json.dumps(result, default=str))
+        if size_bytes > self._max_bytes:
+            return
+        result = copy.deepcopy(result)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.stats.size_bytes -= previous.size_bytes
+            self._entries[key] = _Entry(
+                result=result,
+                size_bytes=size_bytes,
+                expire_time=self._clock() + self._ttl_seconds,
+            )
+            self.stats.size_bytes += size_bytes
+            while self.stats.size_bytes > self._max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.stats.size_bytes -= entry.size_bytes
+        self.stats.evictions += 1
+
+
+# Shared by all the sessions of the process.
+result_cache = QueryResultCache()
@@ -0,0 +1,241 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Token-budgeted compaction of the schema DDL used in the prompts.
+
+The compaction is applied in steps, each only if the DDL is still over the
+token budget once the previous one is done:
+
+1. Long string and bytes literals of the example rows are truncated, wide
+   ARRAY and STRUCT values are collapsed, and near-identical rows are removed.
+2. Largest tables first, the example rows are cut to a single row.
+3. Largest tables first, the example rows are dropped.
+4. Largest tables first, the column descriptions are dropped.
+"""
+
+import dataclasses
+import logging
+
+from .schema_model import DatabaseSchema, SampleRows, TableSchema
+
+# Average number of characters per token of Gemini models on DDL text. Token
+# counts are estimated from it, without calling the `count_tokens` API.
+CHARS_PER_TOKEN = 4
+# Number of characters kept from string and bytes literals.
+MAX_LITERAL_CHARS = 64
+# Number of elements kept from ARRAY values and fields from STRUCT values.
+MAX_COLLECTION_ITEMS = 5
+# Rows differing from a previous row in at most this fraction of their
+# values are considered near-identical.
+NEAR_DUPLICATE_MAX_DIFF_RATIO = 0.1
+
+
+@dataclasses.dataclass(slots=True)
+class CompactSchema:
+    """The DDL of all datasets, compacted to fit a token budget.
+
+    Attributes:
+      ddl_by_dataset: The DDL statements of every dataset, by dataset ID.
+      token_count: The estimated number of tokens of the DDL of all datasets.
+      token_budget: The targeted number of tokens.
+    """
+
+    ddl_by_dataset: dict[str, str]
+    token_count: int
+    token_budget: int
+
+    @property
+    def fits(self) -> bool:
+        """Whether the DDL fits the token budget."""
+        return self.token_count <= self.token_budget
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimates the number of tokens of a text."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _split_literals(text: str) -> list[str]:
+    """Splits comma-separated SQL literals, as rendered for `VALUES`.
+
+    Commas inside quoted strings, ARRAY (`[...]`) and STRUCT (`(...)`) values
+    do not split.
+    """
+    literals = []
+    depth, start, i, in_string = 0, 0, 0, False
+    while i < len(text):
+        char = text[i]
+        if in_string:
+            if char == "\\":
+                i += 1  # Skip the escaped character.
+            elif char == "'":
+                if text[i + 1:i + 2] == "'":
+                    i += 1  # Skip the escaped quote.
+                else:
+                    in_string = False
+        elif char == "'":
+            in_string = True
+        elif char in "[(":
+            depth += 1
+        elif char in "])":
+            depth -= 1
+        elif char == "," and depth == 0:
+            literals.append(text[start:i].strip())
+            start = i + 1
+        i += 1
+    if text.strip():
+        literals.append(text[start:].strip())
+    return literals
+
+
+def _truncate_string_literal(literal: str, quote_at: int) -> str:
+    """Truncates the content of a quoted literal, keeping it valid SQL."""
+    content = literal[quote_at + 1:-1]
+    if len(content) <= MAX_LITERAL_CHARS:
+        return literal
+    content = content[:MAX_LITERAL_CHARS]
+    # Do not cut an escaped quote or backslash in half.
+    if (len(content) - len(content.rstrip("'"))) % 2:
+        content = content[:-1]
+    if (len(content) - len(content.rstrip("\\"))) % 2:
+        content = content[:-1]
+    return f"{literal[:quote_at + 1]}{content}...'"
+
+
+def _compact_literal(literal: str) -> str:
+    """Truncates long strings and collapses wide ARRAY and STRUCT values."""
+    if literal.startswith("'"):
+        return _truncate_string_literal(literal, 0)
+    if literal.startswith("b'"):
+        return _truncate_string_literal(literal, 1)
+    if literal[:1] in "[(" and len(literal) > 1:
+        items = _split_literals(literal[1:-1])
+        kept = [_compact_literal(item) for item in items[:MAX_COLLECTION_ITEMS]]
+        if len(items) > MAX_COLLECTION_ITEMS:
+            kept[-1] += f" /* {len(items) - MAX_COLLECTION_ITEMS} more */"
+        return f"{literal[0]}{', '.join(kept)}{literal[-1]}"
+    return literal
+
+
+def _is_near_duplicate(row: list[str], other: list[str]) -> bool:
+    if len(row) != len(other):
+        return False
+    num_diffs = sum(value != other_value for value, other_value in zip(row, other))
+    return num_diffs <= NEAR_DUPLICATE_MAX_DIFF_RATIO * len(row)
+
+
+def compact_sample_rows(samples: SampleRows) -> SampleRows:
+    """Compacts the literals of example rows and removes near-identical rows."""
+    kept_rows = []
+    for values in samples.values:
+        row = [_compact_literal(literal) for literal in _split_literals(values)]
+        if not any(_is_near_duplicate(row, kept) for kept in kept_rows):
+            kept_rows.append(row)
+    return SampleRows(
+        values=[", ".join(row) for row in kept_rows], error=samples.error
+    )
+
+
+def _compact_samples(table: TableSchema) -> TableSchema:
+    if table.samples is None or not table.samples.values:
+        return table
+    return dataclasses.replace(table, samples=compact_sample_rows(table.samples))
+
+
+def _keep_one_sample_row(table: TableSchema) -> TableSchema:
+    if table.samples is None or len(table.samples.values) <= 1:
+        return table
+    return dataclasses.replace(
+        table, samples=SampleRows(values=table.samples.values[:1])
+    )
+
+
+def _drop_samples(table: TableSchema) -> TableSchema:
+    if table.samples is None:
+        return table
+    return dataclasses.replace(table, samples=None)
+
+
+def _drop_descriptions(table: TableSchema) -> TableSchema:
+    if not any(column.description for column in table.columns):
+        return table
+    return dataclasses.replace(
+        table,
+        columns=[
+            dataclasses.replace(column, description=None)
+            for column in table.columns
+        ],
+    )
+
+
+def compact_schema(
+    database_schema: DatabaseSchema, token_budget: int
+) -> CompactSchema:
+    """Renders the DDL of all datasets, compacted to fit a token budget.
+
+    The model is not modified: compacted tables are copies.
+
+    Args:
+      database_schema: The schema to render.
+      token_budget: The targeted number of tokens of the DDL of all datasets.
+
+    Returns:
+      The compacted DDL, with its estimated number of tokens. The DDL may still
+      exceed the budget if the tables without example rows nor descriptions
+      do not fit.
+    """
+    tables = {
+        (dataset_id, i): table
+        for dataset_id, dataset in database_schema.datasets.items()
+        for i, table in enumerate(dataset.tables)
+    }
+    tokens = {key: estimate_tokens(table.to_ddl()) for key, table in tables.items()}
+    token_count = sum(tokens.values())
+
+    if token_count > token_budget:
+        for key, table in tables.items():
+            tables[key] = _compact_samples(table)
+            tokens[key] = estimate_tokens(tables[key].to_ddl())
+        token_count = sum(tokens.values())
+
+    for reduce in (_keep_one_sample_row, _drop_samples, _drop_descriptions):
+        if token_count <= token_budget:
+            break
+        for key in sorted(tokens, key=tokens.get, reverse=True):
+            if token_count <= token_budget:
+                break
+            reduced = reduce(tables[key])
+            if reduced is not tables[key]:
+                tables[key] = reduced
+                reduced_tokens = estimate_tokens(reduced.to_ddl())
+                token_count += reduced_tokens - tokens[key]
+                tokens[key] = reduced_tokens
+
+    ddl_by_dataset = {
+        dataset_id: "".join(
+            tables[(dataset_id, i)].to_ddl() for i in range(len(dataset.tables))
+        )
+        for dataset_id, dataset in database_schema.datasets.items()
+    }
+    compact = CompactSchema(
+        ddl_by_dataset=ddl_by_dataset,
+        token_count=sum(estimate_tokens(ddl) for ddl in ddl_by_dataset.values()),
+        token_budget=token_budget,
+    )
+    if not compact.fits:
+        logging.warning(
+            f"Schema of {compact.token_count} tokens exceeds the token budget"
+            f" of {token_budget}, even without example rows nor descriptions."
+        )
+    return compact
@@ -0,0 +1,196 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Schema linking: finds the tables and columns relevant to a question.
+
+Every table is indexed as a BM25 document made of its dataset and table
+names, column names, column descriptions, view query and example values, with
+more weight on names. The index is built once per schema, and a search only
+scores the postings of the question terms.
+"""
+
+import collections
+import dataclasses
+import math
+import re
+
+from .schema_model import DatabaseSchema, TableSchema
+
+# Number of times the tokens of each part of a table are counted.
+_TABLE_NAME_WEIGHT = 3
+_COLUMN_NAME_WEIGHT = 2
+_TEXT_WEIGHT = 1
+# Number of characters of the example rows and view query that are indexed.
+_MAX_INDEXED_TEXT_CHARS = 2000
+# Number of linked columns returned per table.
+MAX_LINKED_COLUMNS = 5
+# BM25 parameters.
+_K1 = 1.2
+_B = 0.75
+
+# Words of identifiers, e.g. `orderId` and `ORDER_ID` both give order, id.
+_WORD_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+
+def _normalize(word: str) -> str:
+    """Lowercases a word and strips plural endings."""
+    word = word.lower()
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str | None) -> list[str]:
+    """Splits a text or identifier into normalized words."""
+    if not text:
+        return []
+    return [_normalize(word) for word in _WORD_PATTERN.findall(text)]
+
+
+def _tokenize_values(text: str | None) -> list[str]:
+    """Tokenizes example values and queries, without the numbers."""
+    return [
+        token
+        for token in tokenize((text or "")[:_MAX_INDEXED_TEXT_CHARS])
+        if not token.isdigit()
+    ]
+
+
+@dataclasses.dataclass(slots=True)
+class TableLink:
+    """A table relevant to a question.
+
+    Attributes:
+      dataset_id: The dataset of the table.
+      table: The schema of the table.
+      score: The BM25 score of the table for the question.
+      columns: The names of the most relevant columns, best first.
+    """
+
+    dataset_id: str
+    table: TableSchema
+    score: float
+    columns: list[str]
+
+
+class SchemaIndex:
+    """BM25 index of the tables of a `DatabaseSchema`."""
+
+    def __init__(self, database_schema: DatabaseSchema):
+        """Indexes every table of `database_schema`."""
+        self._tables = []
+        self._column_tokens = []
+        self._doc_lengths = []
+        self._postings = collections.defaultdict(list)
+        for dataset_id, dataset in database_schema.datasets.items():
+            for table in dataset.tables:
+                self._add_table(dataset_id, table)
+        num_docs = len(self._tables)
+        self._avg_doc_length = sum(self._doc_lengths) / max(num_docs, 1)
+        self._idf = {
+            term: math.log(
+                1 + (num_docs - len(postings) + 0.5) / (len(postings) + 0.5)
+            )
+            for term, postings in self._postings.items()
+        }
+
+    def __len__(self) -> int:
+        """Returns the number of indexed tables."""
+        return len(self._tables)
+
+    def _add_table(self, dataset_id: str, table: TableSchema):
+        doc_id = len(self._tables)
+        self._tables.append((dataset_id, table))
+        column_tokens = [
+            (
+                column.name,
+                set(tokenize(column.name)),
+                set(tokenize(column.description)),
+            )
+            for column in table.columns
+        ]
+        self._column_tokens.append(column_tokens)
+
+        term_counts = collections.Counter()
+        for token in tokenize(table.table_id):
+            term_counts[token] += _TABLE_NAME_WEIGHT
+        for token in tokenize(dataset_id):
+            term_counts[token] += _TEXT_WEIGHT
+        for column in table.columns:
+            for token in tokenize(column.name):
+                term_counts[token] += _COLUMN_NAME_WEIGHT
+            for token in tokenize(column.description):
+                term_counts[token] += _TEXT_WEIGHT
+        for token in _tokenize_values(table.view_query):
+            term_counts[token] += _TEXT_WEIGHT
+        if table.samples is not None:
+            for token in _tokenize_values(" ".join(table.samples.values)):
+                term_counts[token] += _TEXT_WEIGHT
+
+        self._doc_lengths.append(sum(term_counts.values()))
+        for term, count in term_counts.items():
+            self._postings[term].append((doc_id, count))
+
+    def _link_columns(self, doc_id: int, query_terms: set[str]) -> list[str]:
+        """Returns the columns of a table matching the question, best first."""
+        scored = []
+        for name, name_tokens, description_tokens in self._column_tokens[doc_id]:
+            score = sum(
+                self._idf.get(term, 0.0)
+                * (
+                    _COLUMN_NAME_WEIGHT * (term in name_tokens)
+                    + _TEXT_WEIGHT * (term in description_tokens)
+                )
+                for term in query_terms
+            )
+            if score > 0:
+                scored.append((score, name))
+        scored.sort(key=lambda item: -item[0])
+        return [name for _, name in scored[:MAX_LINKED_COLUMNS]]
+
+    def search(self, question: str, top_k: int) -> list[TableLink]:
+        """Returns the `top_k` tables most relevant to a question.
+
+        Args:
+          question: The natural language question.
+          top_k: The maximum number of tables returned.
+
+        Returns:
+          The tables sharing at least one term with the question, best first.
+        """
+        query_terms = set(tokenize(question))
+        scores = collections.defaultdict(float)
+        for term in query_terms:
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, count in self._postings[term]:
+                length_norm = (
+                    1 - _B + _B * self._doc_lengths[doc_id] / self._avg_doc_length
+                )
+                scores[doc_id] += (
+                    idf * count * (_K1 + 1) / (count + _K1 * length_norm)
+                )
+        best = sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))[:top_k]
+        return [
+            TableLink(
+                dataset_id=self._tables[doc_id][0],
+                table=self._tables[doc_id][1],
+                score=scores[doc_id],
+                columns=self._link_columns(doc_id, query_terms),
+            )
+            for doc_id in best
+        ]
@@ -0,0 +1,290 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Structured model of the schema of BigQuery datasets.
+
+The model is built once by the schema loaders. The DDL used in the prompts is
+rendered from it on first use and memoized, and the translator gets a ready
+SQLGlot `MappingSchema`, so that neither has to parse the DDL again.
+"""
+
+import dataclasses
+from typing import Any
+
+from sqlglot.schema import MappingSchema
+
+# Legacy type names returned by the tables API, mapped to the standard SQL
+# names understood by SQLGlot.
+_STANDARD_TYPES = {
+    "INTEGER": "INT64",
+    "FLOAT": "FLOAT64",
+    "BOOLEAN": "BOOL",
+    "RECORD": "STRUCT",
+}
+
+
+@dataclasses.dataclass(slots=True)
+class ColumnSchema:
+    """A column of a table.
+
+    Attributes:
+      name: The column name.
+      field_type: The legacy type name, as returned by the tables API (e.g.
+        INTEGER, RECORD).
+      mode: NULLABLE, REQUIRED or REPEATED.
+      description: The column description, if any.
+    """
+
+    name: str
+    field_type: str
+    mode: str = "NULLABLE"
+    description: str | None = None
+
+    @property
+    def ddl_type(self) -> str:
+        """The type used in the DDL, e.g. `ARRAY<INTEGER>`."""
+        if self.mode == "REPEATED":
+            return f"ARRAY<{self.field_type}>"
+        return self.field_type
+
+    @property
+    def sqlglot_type(self) -> str:
+        """The standard SQL type used by SQLGlot, e.g. `ARRAY<INT64>`."""
+        field_type = _STANDARD_TYPES.get(self.field_type, self.field_type)
+        if self.mode == "REPEATED":
+            return f"ARRAY<{field_type}>"
+        return field_type
+
+    def render_ddl(self, with_description: bool = True) -> str:
+        """Renders the column definition of a DDL statement."""
+        col_def = f"  `{self.name}` {self.ddl_type}"
+        if with_description and self.description:
+            # Use OPTIONS for column descriptions
+            col_def += " OPTIONS(description='{}')".format(
+                self.description.replace("'", "''")
+            )
+        return col_def
+
+
+@dataclasses.dataclass(slots=True)
+class PartitioningSchema:
+    """The partitioning of a table.
+
+    Attributes:
+      column: The partitioning column, None for ingestion-time partitioning.
+      type: DAY, HOUR, MONTH or YEAR for time-unit partitioning, RANGE for
+        integer-range partitioning, None if unknown.
+    """
+
+    column: str | None
+    type: str | None = None
+
+
+@dataclasses.dataclass(slots=True)
+class SampleRows:
+    """The example rows of a table.
+
+    Attributes:
+      values: The serialized `VALUES` tuple body of every row.
+      error: Set if the rows could not be retrieved.
+    """
+
+    values: list[str] = dataclasses.field(default_factory=list)
+    error: str | None = None
+
+
+@dataclasses.dataclass(slots=True)
+class TableSchema:
+    """A table, view or BigLake Iceberg external table.
+
+    Attributes:
+      project_id: Project of the table.
+      dataset_id: Dataset of the table.
+      table_id: ID of the table.
+      table_type: TABLE, VIEW or EXTERNAL (Iceberg external tables only).
+      columns: The columns, in ordinal order.
+      view_query: The query of a view.
+      connection_id: The connection of an external table.
+      source_uris: The source URIs of an external table.
+      partitioning: The partitioning of a table, if partitioned.
+      samples: The example rows of a base table.
+    """
+
+    project_id: str
+    dataset_id: str
+    table_id: str
+    table_type: str
+    columns: list[ColumnSchema] = dataclasses.field(default_factory=list)
+    view_query: str | None = None
+    connection_id: str | None = None
+    source_uris: list[str] = dataclasses.field(default_factory=list)
+    partitioning: PartitioningSchema | None = None
+    samples: SampleRows | None = None
+    _ddl: str | None = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @property
+    def full_name(self) -> str:
+        """The `project.dataset.table` name of the table."""
+        return f"{self.project_id}.{self.dataset_id}.{self.table_id}"
+
+    @property
+    def path(self) -> str:
+        """The API path of the table, like `bigquery.TableReference.path`."""
+        return (
+            f"/projects/{self.project_id}/datasets/{self.dataset_id}"
+            f"/tables/{self.table_id}"
+        )
+
+    def _render_columns(self, with_descriptions: bool = True) -> str:
+        return ",\n".join(
+            column.render_ddl(with_descriptions) for column in self.columns
+        )
+
+    def _render_samples(self) -> str:
+        if self.samples is None:
+            return ""
+        if self.samples.error is not None:
+            return f"-- NOTE: Could not retrieve sample rows for table {self.path}.\n\n"
+        if not self.samples.values:
+            return ""
+        return "-- Example values for table `{}`:\n".format(self.full_name) + "".join(
+            "INSERT INTO `{}` VALUES ({});\n\n".format(self.full_name, values)
+            for values in self.samples.values
+        )
+
+    def _render_ddl(self) -> str:
+        if self.table_type == "VIEW":
+            return (
+                f"CREATE OR REPLACE VIEW `{self.full_name}` AS\n"
+                f"{self.view_query};\n\n"
+            )
+        if self.table_type == "EXTERNAL":
+            uris_list_str = ",\n    ".join(f"'{uri}'" for uri in self.source_uris)
+            return f"""CREATE EXTERNAL TABLE `{self.full_name}` (
+{self._render_columns(with_descriptions=False)}
+)
+WITH CONNECTION `{self.connection_id}`
+OPTIONS (
+  uris = [{uris_list_str}],
+  format = 'ICEBERG'
+);\n\n"""
+        return "CREATE OR REPLACE TABLE `{}` (\n{}\n);\n\n".format(
+            self.full_name, self._render_columns()
+        ) + self._render_samples()
+
+    def to_ddl(self) -> str:
+        """Returns the DDL statement of the table, with its example rows."""
+        if self._ddl is None:
+            self._ddl = self._render_ddl()
+        return self._ddl
+
+    def to_dict(self) -> dict[str, Any]:
+        """Returns a JSON-serializable dict, the inverse of `from_dict`."""
+        return {
+            field.name: getattr(self, field.name)
+            for field in dataclasses.fields(self)
+            if field.init
+        } | {
+            "columns": [dataclasses.asdict(column) for column in self.columns],
+            "partitioning": (
+                dataclasses.asdict(self.partitioning) if self.partitioning else None
+            ),
+            "samples": dataclasses.asdict(self.samples) if self.samples else None,
+        }
+
+    @classmethod
+    def from_dict(cls, table: dict[str, Any]) -> "TableSchema":
+        """Builds a table from a dict returned by `to_dict`."""
+        return cls(
+            **{
+                **table,
+                "columns": [ColumnSchema(**column) for column in table["columns"]],
+                "partitioning": (
+                    PartitioningSchema(**table["partitioning"])
+                    if table["partitioning"]
+                    else None
+                ),
+                "samples": (
+                    SampleRows(**table["samples"]) if table["samples"] else None
+                ),
+            }
+        )
+
+
+@dataclasses.dataclass(slots=True)
+class DatasetSchema:
+    """The tables of a dataset, in the order of the DDL.
+
+    Attributes:
+      project_id: Project of the dataset.
+      dataset_id: ID of the dataset.
+      tables: The tables, views and Iceberg external tables of the dataset.
+    """
+
+    project_id: str
+    dataset_id: str
+    tables: list[TableSchema] = dataclasses.field(default_factory=list)
+    _ddl: str | None = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def to_ddl(self) -> str:
+        """Returns the DDL statements of all the tables of the dataset."""
+        if self._ddl is None:
+            self._ddl = "".join(table.to_ddl() for table in self.tables)
+        return self._ddl
+
+
+@dataclasses.dataclass(slots=True)
+class DatabaseSchema:
+    """The schema of all the datasets used by the agents.
+
+    Attributes:
+      datasets: The datasets, by dataset ID.
+    """
+
+    datasets: dict[str, DatasetSchema] = dataclasses.field(default_factory=dict)
+    _mapping_schema: MappingSchema | None = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def to_ddl_by_dataset(self) -> dict[str, str]:
+        """Returns the DDL statements of every dataset, by dataset ID."""
+        return {
+            dataset_id: dataset.to_ddl()
+            for dataset_id, dataset in self.datasets.items()
+        }
+
+    def mapping_schema(self) -> MappingSchema:
+        """Returns the column types of every table, as a SQLGlot schema.
+
+        Tables are nested by project (the SQLGlot catalog) and dataset (the
+        SQLGlot db).
+        """
+        if self._mapping_schema is None:
+            mapping = {}
+            for dataset in self.datasets.values():
+                for table in dataset.tables:
+                    if not table.columns:
+                        # SQLGlot rejects tables without columns.
+                        continue
+                    mapping.setdefault(table.project_id, {}).setdefault(
+                        table.dataset_id, {}
+                    )[table.table_id] = {
+                        column.name: column.sqlglot_type for column in table.columns
+                    }
+            self._mapping_schema = MappingSchema(mapping, dialect="bigquery")
+        return self._mapping_schema
@@ -0,0 +1,76 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""On-disk snapshot of the per-table schema of BigQuery datasets."""
+
+import json
+import logging
+import os
+import tempfile
+
+
+class SchemaSnapshotStore:
+    """Stores the schema of every table of a dataset on disk.
+
+    There is one JSON file per (project, dataset). Each table entry holds the
+    table's `TableSchema` dict (including example rows) together with the
+    table's `last_modified_time`, so that a loader can reuse unchanged tables
+    and only re-fetch new or modified ones.
+    """
+
+    def __init__(self, snapshot_dir: str):
+        self._snapshot_dir = snapshot_dir
+
+    def _path(self, project_id: str, dataset_id: str) -> str:
+        return os.path.join(self._snapshot_dir, f"{project_id}.{dataset_id}.json")
+
+    def load(self, project_id: str, dataset_id: str) -> dict[str, dict]:
+        """Loads the snapshot of a dataset.
+
+        Args:
+            project_id: Project of the dataset.
+            dataset_id: ID of the dataset.
+
+        Returns:
+            A dict mapping table names to `{"last_modified_time": int,
+            "table": dict | None}` entries, where `table` is None for tables
+            of unsupported types. Empty if there is no usable snapshot.
+        """
+        try:
+            with open(self._path(project_id, dataset_id), encoding="utf-8") as f:
+                return json.load(f)["tables"]
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(
+                f"Ignoring unreadable schema snapshot for {project_id}.{dataset_id}: {e}"
+            )
+            return {}
+
+    def save(
+        self, project_id: str, dataset_id: str, tables: dict[str, dict]
+    ) -> None:
+        """Atomically replaces the snapshot of a dataset."""
+        os.makedirs(self._snapshot_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._snapshot_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"project": project_id, "dataset": dataset_id, "tables": tables},
+                    f,
+                )
+            os.replace(tmp_path, self._path(project_id, dataset_id))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,201 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cache of the SQL generated for the questions, by schema version.
+
+Questions are looked up by their normalized text and, optionally, among the
+near-duplicates of the cached questions: questions whose bag-of-words vectors
+are close enough and that mention the same numbers and quoted values. Only
+SQL that passed `run_bigquery_validation` is admitted.
+"""
+
+import collections
+import dataclasses
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Callable
+
+from .schema_index import tokenize
+
+# Maximum number of cached questions. 0 disables the cache.
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("BQ_SQL_CACHE_MAX_ENTRIES", "256"))
+# Lifetime of the cached questions.
+SQL_CACHE_TTL_SECONDS = float(os.getenv("BQ_SQL_CACHE_TTL_SECONDS", "86400"))
+# Minimum cosine similarity of a near-duplicate question. 0 only looks up the
+# exact questions.
+SQL_CACHE_SIMILARITY_THRESHOLD = float(
+    os.getenv("BQ_SQL_CACHE_SIMILARITY_THRESHOLD", "0")
+)
+
+# Numbers and quoted values, which change the SQL of otherwise close
+# questions, e.g. "top 5 countries" and "top 10 countries".
+_LITERAL_PATTERN = re.compile(r"\d+(?:\.\d+)?|'[^']*'|\"[^\"]*\"")
+
+
+def normalize_question(question: str) -> str:
+    """Normalizes the case, spaces and final punctuation of a question."""
+    question = unicodedata.normalize("NFKC", question).lower()
+    return " ".join(question.split()).rstrip(" ?.!")
+
+
+@dataclasses.dataclass(slots=True)
+class SqlCacheStats:
+    """Usage counters of a `SqlCache`.
+
+    Attributes:
+      exact_hits: Lookups of a cached question.
+      similar_hits: Lookups of a near-duplicate of a cached question.
+      misses: Lookups that found no cached question.
+      admissions: Validated SQL added to the cache.
+      evictions: Questions removed, as least recently used or expired.
+    """
+
+    exact_hits: int = 0
+    similar_hits: int = 0
+    misses: int = 0
+    admissions: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of lookups that found a cached question."""
+        hits = self.exact_hits + self.similar_hits
+        lookups = hits + self.misses
+        return hits / lookups if lookups else 0.0
+
+
+@dataclasses.dataclass(slots=True)
+class _Entry:
+    sql: str
+    expire_time: float
+    vector: collections.Counter
+    norm: float
+    literals: tuple[str, ...]
+
+
+def _embed(normalized_question: str):
+    """Returns the bag-of-words vector, norm and literals of a question."""
+    vector = collections.Counter(tokenize(normalized_question))
+    norm = math.sqrt(sum(count * count for count in vector.values()))
+    literals = tuple(sorted(_LITERAL_PATTERN.findall(normalized_question)))
+    return vector, norm, literals
+
+
+class SqlCache:
+    """LRU cache of validated SQL, by schema version and question."""
+
+    def __init__(
+        self,
+        max_entries: int = SQL_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = SQL_CACHE_TTL_SECONDS,
+        similarity_threshold: float = SQL_CACHE_SIMILARITY_THRESHOLD,
+        clock: Callable[[], float] = time.time,
+    ):
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._similarity_threshold = similarity_threshold
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: collections.OrderedDict[tuple[str, str], _Entry] = (
+            collections.OrderedDict()
+        )
+        self.stats = SqlCacheStats()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether SQL is cached."""
+        return self._max_entries > 0
+
+    def get(self, question: str, schema_version: str) -> str | None:
+        """Returns the cached SQL of a question, or of a near-duplicate.
+
+        Args:
+          question: The natural language question.
+          schema_version: The version of the schema the SQL must be for.
+
+        Returns:
+          The validated SQL, or None if the question is not cached.
+        """
+        if not self.enabled:
+            return None
+        normalized = normalize_question(question)
+        with self._lock:
+            self._evict_expired()
+            key = (schema_version, normalized)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats.exact_hits += 1
+                return entry.sql
+            if self._similarity_threshold > 0:
+                key = self._find_similar(schema_version, normalized)
+                if key is not None:
+                    self._entries.move_to_end(key)
+                    self.stats.similar_hits += 1
+                    return self._entries[key].sql
+            self.stats.misses += 1
+            return None
+
+    def put(self, question: str, schema_version: str, sql: str):
+        """Caches the validated SQL of a question."""
+        if not self.enabled:
+            return
+        normalized = normalize_question(question)
+        vector, norm, literals = _embed(normalized)
+        with self._lock:
+            key = (schema_version, normalized)
+            self._entries.pop(key, None)
+            self._entries[key] = _Entry(
+                sql=sql,
+                expire_time=self._clock() + self._ttl_seconds,
+                vector=vector,
+                norm=norm,
+                literals=literals,
+            )
+            self.stats.admissions += 1
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def _evict_expired(self):
+        now = self._clock()
+        expired = [
+            key for key, entry in self._entries.items() if now >= entry.expire_time
+        ]
+        for key in expired:
+            del self._entries[key]
+        self.stats.evictions += len(expired)
+
+    def _find_similar(self, schema_version, normalized):
+        """Returns the key of the closest near-duplicate question, if any."""
+        vector, norm, literals = _embed(normalized)
+        if not norm:
+            return None
+        best_key, best_similarity = None, self._similarity_threshold
+        for key, entry in self._entries.items():
+            if key[0] != schema_version or entry.literals != literals:
+                continue
+            dot = sum(count * entry.vector[term] for term, count in vector.items())
+            similarity = dot / (norm * entry.norm) if entry.norm else 0.0
+            if similarity >= best_similarity:
+                best_key, best_similarity = key, similarity
+        return best_key
+
+
+# Shared by all the sessions of the process.
+sql_cache = SqlCache()
@@ -0,0 +1,195 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Read-only guard of the validated queries.
+
+Queries are parsed once with SQLGlot, and only a single SELECT query, with or
+without a WITH clause, set operations or subqueries, is allowed to run. The
+syntax tree is kept for the later validation steps. Statements are classified
+from the tree rather than by searching for keywords in the SQL, so that
+column names like `created_at` or `is_deleted` are not mistaken for DML or
+DDL. Queries SQLGlot cannot parse are checked token by token instead.
+
+The number of rows of the queries is then capped on the same tree, in their
+outermost LIMIT clause, so that BigQuery never returns more rows than the
+tools keep.
+"""
+
+import dataclasses
+import re
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.tokens import TokenType
+
+# Statements that write data or change the schema, wherever they appear.
+_WRITE_EXPRESSIONS = (
+    exp.Alter,
+    exp.Create,
+    exp.Delete,
+    exp.Drop,
+    exp.Insert,
+    exp.Merge,
+    exp.TruncateTable,
+    exp.Update,
+)
+
+# Keywords starting the same statements, for the queries that cannot be
+# parsed and the statements parsed as commands.
+_WRITE_KEYWORDS = frozenset(
+    {"ALTER", "CREATE", "DELETE", "DROP", "INSERT", "MERGE", "TRUNCATE", "UPDATE"}
+)
+
+# Tokens whose text is data or a quoted name, never a keyword.
+_LITERAL_TOKENS = frozenset(
+    {
+        TokenType.BYTE_STRING,
+        TokenType.IDENTIFIER,
+        TokenType.RAW_STRING,
+        TokenType.STRING,
+    }
+)
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ParsedQuery:
+    """A query parsed once for all the validation steps.
+
+    Attributes:
+      sql: The SQL of the query.
+      expression: The syntax tree of the query, None if SQLGlot cannot parse
+        it.
+      error: Why the query is not allowed to run, None if it is read-only.
+    """
+
+    sql: str
+    expression: exp.Expression | None
+    error: str | None
+
+
+def _is_write(expression: exp.Expression) -> bool:
+    # Statements SQLGlot does not model are parsed as commands.
+    if isinstance(expression, exp.Command):
+        return expression.name.upper() in _WRITE_KEYWORDS
+    return isinstance(expression, _WRITE_EXPRESSIONS)
+
+
+def _statement_name(expression: exp.Expression) -> str:
+    if isinstance(expression, exp.Command):
+        return expression.name.upper()
+    return expression.key.upper()
+
+
+def _check_tokens(sql: str) -> str | None:
+    """Returns why an unparsable query is not read-only, None if it may be."""
+    try:
+        tokens = sqlglot.tokenize(sql, read="bigquery")
+    except sqlglot.errors.TokenError as e:
+        return f"The query cannot be parsed: {e}"
+    for token in tokens:
+        if (
+            token.token_type not in _LITERAL_TOKENS
+            and token.text.upper() in _WRITE_KEYWORDS
+        ):
+            return f"Contains disallowed DML/DDL operations: {token.text.upper()}."
+    return None
+
+
+def parse_query(sql: str) -> ParsedQuery:
+    """Parses a query, and checks that it only reads data.
+
+    Args:
+        sql (str): The SQL of the query.
+
+    Returns:
+        ParsedQuery: The syntax tree of the query, and why it must not run if
+            it is not a single read-only query.
+    """
+    try:
+        statements = [
+            statement
+            for statement in sqlglot.parse(sql, read="bigquery")
+            if statement is not None
+        ]
+    except sqlglot.errors.SqlglotError:
+        # BigQuery will report the syntax errors, if any.
+        return ParsedQuery(sql=sql, expression=None, error=_check_tokens(sql))
+
+    if len(statements) != 1:
+        return ParsedQuery(
+            sql=sql,
+            expression=None,
+            error="Only a single query is allowed.",
+        )
+    (expression,) = statements
+    write = next(
+        (node for node in expression.walk() if _is_write(node)), None
+    )
+    if write is not None:
+        error = f"Contains disallowed DML/DDL operations: {_statement_name(write)}."
+    elif not isinstance(expression, exp.Query):
+        error = f"Only SELECT queries are allowed, not {_statement_name(expression)}."
+    else:
+        error = None
+    return ParsedQuery(sql=sql, expression=expression, error=error)
+
+
+def _limit_value(limit: exp.Expression) -> int | None:
+    """Returns the number of rows of a LIMIT clause, None if not a literal."""
+    count = limit.expression
+    if isinstance(count, exp.Literal) and count.is_int:
+        return int(count.name)
+    return None
+
+
+def limit_rows(query: ParsedQuery, max_rows: int) -> ParsedQuery:
+    """Caps the number of rows a read-only query returns.
+
+    The LIMIT of the outermost query, which is the one of the whole set
+    operation for UNION, INTERSECT and EXCEPT queries and applies after their
+    ORDER BY, is set to the smaller of its value and `max_rows`, or added.
+    Queries with a LIMIT that is not a number are wrapped in a capped query.
+    Queries SQLGlot cannot parse get a LIMIT appended, unless they have one.
+
+    Args:
+        query (ParsedQuery): The parsed query.
+        max_rows (int): The maximum number of rows.
+
+    Returns:
+        ParsedQuery: The query returning at most `max_rows` rows.
+    """
+    if query.error is not None:
+        return query
+    if query.expression is None:
+        if re.search(r"(?i)\blimit\b", query.sql):
+            return query
+        return dataclasses.replace(query, sql=f"{query.sql} limit {max_rows}")
+
+    expression = query.expression.copy()
+    limit = expression.args.get("limit")
+    if limit is None:
+        expression.set("limit", exp.Limit(expression=exp.Literal.number(max_rows)))
+    else:
+        rows = _limit_value(limit)
+        if rows is None:
+            expression = (
+                exp.select("*")
+                .from_(expression.subquery("_capped"))
+                .limit(max_rows)
+            )
+        elif rows > max_rows:
+            limit.set("expression", exp.Literal.number(max_rows))
+    return ParsedQuery(
+        sql=expression.sql(dialect="bigquery"), expression=expression, error=None
+    )
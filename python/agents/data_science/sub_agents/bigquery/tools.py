@@ -14,20 +14,45 @@
 
 """This file contains the tools used by the database agent."""
 
+import asyncio
 import datetime
+import functools
+import hashlib
 import logging
 import os
 import re
-from decimal import Decimal # Import Decimal
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import google.auth
+import requests
+from data_science.utils.single_flight import SingleFlight
 from data_science.utils.utils import get_env_var
 from google.adk.tools import ToolContext
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import bigquery
 from google.genai import Client
 
 from .chase_sql import chase_constants
+from .prompt_layout import PromptLayout
+from .result_cache import result_cache
+from .schema_compactor import compact_schema, estimate_tokens
+from .schema_index import SchemaIndex
+from .schema_model import (
+    ColumnSchema,
+    DatabaseSchema,
+    DatasetSchema,
+    PartitioningSchema,
+    SampleRows,
+    TableSchema,
+)
+from .schema_snapshot import SchemaSnapshotStore
+from .sql_guard import limit_rows, parse_query
+from .sql_cache import sql_cache
 
 # Assume that `BQ_COMPUTE_PROJECT_ID` and `BQ_DATA_PROJECT_ID` are set in the
 # environment. See the `data_agent` README for more details.
@@ -38,11 +63,40 @@ location = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
 llm_client = Client(vertexai=True, project=vertex_project, location=location)
 
 MAX_NUM_ROWS = 80
+# Number of example rows added to the DDL of every table.
+SAMPLE_ROWS_LIMIT = 5
+# Loader used to build the schema: "PER_TABLE" calls `get_table` for every
+# table, "BULK" reads the whole dataset from INFORMATION_SCHEMA in one query.
+SCHEMA_LOADER = os.getenv("BQ_SCHEMA_LOADER", "PER_TABLE")
+# Directory of the on-disk schema snapshot. When set, the schema is loaded
+# incrementally: only new or modified tables are introspected.
+SCHEMA_SNAPSHOT_DIR = os.getenv("BQ_SCHEMA_SNAPSHOT_DIR", None)
+# Interval, in seconds, at which the database settings are rebuilt in the
+# background. 0 disables the background refresh.
+SCHEMA_REFRESH_TTL_SECONDS = float(os.getenv("BQ_SCHEMA_REFRESH_TTL_SECONDS", "0"))
+# Number of tables introspected in parallel by `get_bigquery_schema`.
+SCHEMA_MAX_WORKERS = int(os.getenv("BQ_SCHEMA_MAX_WORKERS", "8"))
+# Estimated number of tokens the DDL of all datasets is compacted to before
+# being used in the prompts. 0 disables the compaction.
+SCHEMA_TOKEN_BUDGET = int(os.getenv("BQ_SCHEMA_TOKEN_BUDGET", "0"))
+# Number of tables relevant to the question whose DDL is sent to the NL2SQL
+# models, when the datasets have more tables. 0 sends all the tables.
+SCHEMA_LINKING_TOP_K = int(os.getenv("BQ_SCHEMA_LINKING_TOP_K", "10"))
+# Bounds of the interval between two checks of a running query job, doubled
+# after each check.
+QUERY_POLL_MIN_SECONDS = 0.05
+QUERY_POLL_MAX_SECONDS = 1.0
+# Maximum number of bytes a validated query may process. Queries are dry run
+# first, and only run if they fall under it. 0 disables the limit.
+VALIDATION_MAX_BYTES_BILLED = int(
+    os.getenv("BQ_VALIDATION_MAX_BYTES_BILLED", str(10 * 1024**3))
+)
 
 
 def _serialize_value_for_sql(value):
     """Serializes a Python value from a pandas DataFrame into a BigQuery SQL literal."""
-    if pd.isna(value):
+    # `pd.isna` is element-wise on arrays, so only test scalars.
+    if not isinstance(value, (list, np.ndarray, dict)) and pd.isna(value):
         return "NULL"
     if isinstance(value, str):
         # Escape single quotes and backslashes for SQL strings.
@@ -62,195 +116,1106 @@ def _serialize_value_for_sql(value):
     return str(value)
 
 
+def _serialize_str_for_sql(value):
+    return "'{}'".format(value.replace('\\', '\\\\').replace('\'', '\'\''))
+
+
+def _serialize_temporal_for_sql(value):
+    return "'{}'".format(value)
+
+
+def _serialize_float_for_sql(value):
+    # NaN values are rendered as NULL, like `pd.isna` does.
+    return "NULL" if value != value else str(value)
+
+
+def _get_column_serializer(arrow_type):
+    """Returns the function serializing the values of an Arrow column."""
+    if pa.types.is_floating(arrow_type):
+        return _serialize_float_for_sql
+    if pa.types.is_boolean(arrow_type) or pa.types.is_decimal(arrow_type):
+        return str
+    if pa.types.is_timestamp(arrow_type) or pa.types.is_date(arrow_type):
+        # TIMESTAMP, DATETIME and DATE values need to be quoted.
+        return _serialize_temporal_for_sql
+    # BYTES, TIME, ARRAY, STRUCT, etc.
+    return _serialize_value_for_sql
+
+
+def _serialize_column_for_sql(column):
+    """Serializes an Arrow column into BigQuery SQL literals.
+
+    STRING and INTEGER columns are formatted with vectorized Arrow compute
+    kernels. Other columns are converted to Python objects once, then
+    formatted with a serializer chosen once for the column type.
+
+    Args:
+        column (pa.ChunkedArray): The column to serialize.
+
+    Returns:
+        list[str]: The SQL literal of every value, "NULL" for null values.
+    """
+    if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+        # Escape backslashes and single quotes, then quote.
+        escaped = pc.replace_substring(column, "\\", "\\\\")
+        escaped = pc.replace_substring(escaped, "'", "''")
+        literals = pc.binary_join_element_wise("'", escaped, "'", "")
+    elif pa.types.is_integer(column.type):
+        literals = pc.cast(column, pa.string())
+    else:
+        serializer = _get_column_serializer(column.type)
+        return [
+            "NULL" if value is None else serializer(value)
+            for value in column.to_pylist()
+        ]
+    return pc.fill_null(literals, "NULL").to_pylist()
+
+
+def _serialize_rows_for_sql(rows):
+    """Serializes every row of an Arrow table into comma-separated SQL literals.
+
+    The output is the same as `_serialize_value_for_sql` applied to every value
+    of the rows of `rows.to_pandas()` (with the BigQuery dtypes), but the table
+    is formatted column by column, without going through pandas.
+
+    Args:
+        rows (pa.Table): The rows to serialize.
+
+    Returns:
+        list[str]: The `VALUES` tuple body of every row.
+    """
+    columns = [_serialize_column_for_sql(column) for column in rows.columns]
+    return [", ".join(row) for row in zip(*columns)]
+
+
 database_settings = None
 bq_client = None
+# Database settings, structured schemas and schema linking indexes of the
+# latest schemas, by schema version. The session state only holds a reference
+# to the settings (see `database_settings_ref`): consumers look the settings up
+# with `resolve_database_settings`, the schema with `get_database_schema` and
+# the index with `get_schema_index`.
+_database_settings_snapshots = {}
+_database_schemas = {}
+_schema_indexes = {}
+_MAX_DATABASE_SCHEMAS = 2
+# Guards the registries above and the swap of `database_settings`, which the
+# background refresh and the first callers may do concurrently.
+_database_settings_lock = threading.Lock()
+_refresh_stop_event = None
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+# Set once the warm-up is over, whether it succeeded or not.
+_warmup_done = threading.Event()
+# Concurrent first calls share a single client creation / settings build.
+_bq_client_flight = SingleFlight()
+_database_settings_flight = SingleFlight()
+
+
+def _bq_http_session(credentials):
+    """Returns the HTTP session of the BigQuery client.
+
+    The session keeps a connection per introspection worker in its pool
+    (urllib3 keeps 10 by default), so that connections are reused, not
+    reopened.
 
+    Args:
+        credentials (google.auth.credentials.Credentials): The credentials
+            authorizing the requests.
 
-def get_bq_client():
-    """Get BigQuery client."""
+    Returns:
+        AuthorizedSession: The session to pass to `bigquery.Client`.
+    """
+    session = AuthorizedSession(credentials)
+    session.mount(
+        "https://",
+        requests.adapters.HTTPAdapter(pool_maxsize=max(SCHEMA_MAX_WORKERS, 10)),
+    )
+    return session
+
+
+def _bq_credentials():
+    """Returns the credentials of the BigQuery client.
+
+    Returns:
+        google.auth.credentials.Credentials: The Application Default
+            Credentials, scoped for BigQuery.
+    """
+    credentials, _ = google.auth.default(scopes=bigquery.Client.SCOPE)
+    return credentials
+
+
+def _init_bq_client():
     global bq_client
+    # Checked again, as a previous flight may have completed in the meantime.
     if bq_client is None:
+        credentials = _bq_credentials()
         bq_client = bigquery.Client(
-            project=get_env_var("BQ_COMPUTE_PROJECT_ID"))
+            project=get_env_var("BQ_COMPUTE_PROJECT_ID"),
+            credentials=credentials,
+            # `_http` is documented as private by google-cloud-bigquery, but
+            # is the only way to give the client a pooled session. The
+            # version is pinned in pyproject.toml for that reason.
+            _http=_bq_http_session(credentials),
+        )
     return bq_client
 
 
-def get_database_settings():
-    """Get database settings."""
+def get_bq_client():
+    """Get BigQuery client."""
+    client = bq_client
+    if client is None:
+        client = _bq_client_flight.do(_init_bq_client)
+    return client
+
+
+def _init_database_settings():
     global database_settings
+    # Checked again, as a previous flight may have completed in the meantime.
     if database_settings is None:
         database_settings = update_database_settings()
+        start_database_settings_refresh()
     return database_settings
 
 
+def get_database_settings():
+    """Get database settings.
+
+    The settings are built on the first call. Concurrent first calls wait
+    for a single build instead of each introspecting the datasets.
+    """
+    settings = database_settings
+    if settings is None:
+        settings = _database_settings_flight.do(_init_database_settings)
+    return settings
+
+
+async def get_database_settings_async():
+    """Get database settings without blocking the event loop.
+
+    Same as `get_database_settings`, but the first build runs in a worker
+    thread and shares its in-flight build with threaded callers.
+    """
+    settings = database_settings
+    if settings is None:
+        settings = await _database_settings_flight.do_async(
+            _init_database_settings
+        )
+    return settings
+
+
+def start_warmup():
+    """Warms the database agent up in a background thread.
+
+    Builds the database settings (or loads them from the schema snapshot),
+    which opens the BigQuery connections, and opens the connection to
+    Vertex AI used by the NL2SQL model. A first turn arriving meanwhile
+    waits for the same settings build instead of starting another one. Does
+    nothing if the warm-up was already started.
+    """
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is not None:
+            return
+        _warmup_thread = threading.Thread(
+            target=_warm_up, name="bq-warmup", daemon=True
+        )
+        _warmup_thread.start()
+
+
+def _warm_up():
+    try:
+        get_database_settings()
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logging.warning(f"Warm-up of the database settings failed: {e}")
+    try:
+        nl2sql_model = os.getenv("BASELINE_NL2SQL_MODEL")
+        if nl2sql_model:
+            llm_client.models.get(model=nl2sql_model)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logging.warning(f"Warm-up of the Vertex AI connection failed: {e}")
+    _warmup_done.set()
+    logging.info(f"Warm-up done, ready: {is_ready()}.")
+
+
+def is_ready():
+    """Returns whether the warm-up is over and the settings are built."""
+    return _warmup_done.is_set() and database_settings is not None
+
+
+def wait_until_ready(timeout=None):
+    """Waits for the warm-up started by `start_warmup`.
+
+    Args:
+        timeout (float): Maximum number of seconds to wait. Waits until the
+            warm-up is over by default.
+
+    Returns:
+        bool: Whether the agent is ready, see `is_ready`.
+    """
+    _warmup_done.wait(timeout)
+    return is_ready()
+
+
+def start_database_settings_refresh(ttl_seconds=None):
+    """Starts rebuilding the database settings in the background.
+
+    The settings are rebuilt every `ttl_seconds` by a daemon thread and
+    swapped in atomically once complete, so callers of
+    `get_database_settings` keep getting the previous settings meanwhile and
+    never wait for the introspection. Does nothing if a refresh is already
+    running or if `ttl_seconds` is not positive.
+
+    Args:
+        ttl_seconds (float): Refresh interval. Defaults to
+            `SCHEMA_REFRESH_TTL_SECONDS` (env `BQ_SCHEMA_REFRESH_TTL_SECONDS`).
+    """
+    global _refresh_stop_event
+    if ttl_seconds is None:
+        ttl_seconds = SCHEMA_REFRESH_TTL_SECONDS
+    if ttl_seconds <= 0 or _refresh_stop_event is not None:
+        return
+    _refresh_stop_event = threading.Event()
+    threading.Thread(
+        target=_refresh_database_settings,
+        args=(ttl_seconds, _refresh_stop_event),
+        name="bq-database-settings-refresh",
+        daemon=True,
+    ).start()
+
+
+def stop_database_settings_refresh():
+    """Stops the background refresh of the database settings, if running."""
+    global _refresh_stop_event
+    if _refresh_stop_event is not None:
+        _refresh_stop_event.set()
+        _refresh_stop_event = None
+
+
+def _refresh_database_settings(ttl_seconds, stop_event):
+    """Rebuilds the database settings every `ttl_seconds` until stopped."""
+    while not stop_event.wait(ttl_seconds):
+        try:
+            previous_version = (database_settings or {}).get("schema_version")
+            new_version = update_database_settings()["schema_version"]
+            if new_version != previous_version:
+                logging.info(f"Database schema updated to version {new_version}.")
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logging.warning(f"Background refresh of database settings failed: {e}")
+
+
 def update_database_settings():
-    """Update database settings."""
+    """Update database settings.
+
+    The settings are built in full before being assigned to the module
+    global, so concurrent readers see either the previous or the new settings.
+    """
     global database_settings
     data_project_id = get_env_var("BQ_DATA_PROJECT_ID")
     compute_project_id = get_env_var("BQ_COMPUTE_PROJECT_ID")
     bq_dataset_ids_str = get_env_var("BQ_DATASET_IDS")
     bq_dataset_ids = [ds.strip() for ds in bq_dataset_ids_str.split(",")]
 
-    all_ddl_schemas = {}
+    if SCHEMA_SNAPSHOT_DIR:
+        schema_loader = functools.partial(
+            get_bigquery_schema_incremental,
+            store=SchemaSnapshotStore(SCHEMA_SNAPSHOT_DIR),
+        )
+    elif SCHEMA_LOADER == "BULK":
+        schema_loader = get_bigquery_schema_bulk
+    else:
+        schema_loader = get_bigquery_schema
+
+    database_schema = DatabaseSchema()
     for dataset_id in bq_dataset_ids:
-        ddl_schema = get_bigquery_schema(
+        database_schema.datasets[dataset_id] = schema_loader(
             dataset_id=dataset_id,
             data_project_id=data_project_id,
             client=get_bq_client(),
             compute_project_id=compute_project_id
         )
-        all_ddl_schemas[dataset_id] = ddl_schema
+    all_ddl_schemas = database_schema.to_ddl_by_dataset()
+    schema_version = _get_schema_version(all_ddl_schemas)
+    if SCHEMA_TOKEN_BUDGET > 0:
+        compact = compact_schema(database_schema, SCHEMA_TOKEN_BUDGET)
+        all_ddl_schemas = compact.ddl_by_dataset
+        schema_token_count = compact.token_count
+    else:
+        schema_token_count = sum(
+            estimate_tokens(ddl) for ddl in all_ddl_schemas.values()
+        )
+    logging.info(f"Database schema is about {schema_token_count} tokens.")
 
-    database_settings = {
+    settings = {
         "bq_project_id": data_project_id,
         "bq_dataset_ids": bq_dataset_ids,
         "all_bq_ddl_schemas": all_ddl_schemas,
+        # Changes whenever any dataset's DDL changes.
+        "schema_version": schema_version,
+        # Estimated number of tokens of `all_bq_ddl_schemas`.
+        "schema_token_count": schema_token_count,
         # Include ChaseSQL-specific constants.
         **chase_constants.chase_sql_constants_dict,
     }
-    return database_settings
+    schema_index = SchemaIndex(database_schema)
+    # Registered before the settings are swapped in, so that the schema of the
+    # current settings can always be looked up.
+    with _database_settings_lock:
+        _register_database_schema(
+            schema_version, database_schema, schema_index, settings
+        )
+        database_settings = settings
+    return settings
+
+
+def _register_database_schema(
+    schema_version, database_schema, schema_index, settings
+):
+    """Registers settings, with their schema and index, under their version.
+
+    Called with `_database_settings_lock` held.
+    """
+    registries = (
+        _database_settings_snapshots,
+        _schema_indexes,
+        _database_schemas,
+    )
+    for registry in registries:
+        registry.pop(schema_version, None)
+    _database_settings_snapshots[schema_version] = settings
+    _schema_indexes[schema_version] = schema_index
+    _database_schemas[schema_version] = database_schema
+    while len(_database_schemas) > _MAX_DATABASE_SCHEMAS:
+        oldest_version = next(iter(_database_schemas))
+        for registry in registries:
+            del registry[oldest_version]
+
+
+def _get_registered(registry, settings):
+    """Looks up the entry of `registry` for database settings."""
+    if settings is None:
+        settings = get_database_settings()
+    with _database_settings_lock:
+        entry = registry.get(settings.get("schema_version"))
+        if entry is None and database_settings is not None:
+            # The current settings are always registered.
+            entry = registry[database_settings["schema_version"]]
+    if entry is None:
+        # No settings were built yet in this process.
+        get_database_settings()
+        return _get_registered(registry, settings)
+    return entry
+
+
+def database_settings_ref(settings):
+    """Returns the reference to database settings kept in the session state.
+
+    The reference only holds the schema version, the content hash of the
+    schema, so that the size of the session state does not grow with the
+    datasets. `resolve_database_settings` returns the settings back.
+
+    Args:
+        settings (dict): Database settings, from `get_database_settings`.
+
+    Returns:
+        dict: The reference to the settings.
+    """
+    return {"schema_version": settings["schema_version"]}
+
+
+def resolve_database_settings(settings=None):
+    """Returns the database settings a session state refers to.
+
+    Args:
+        settings (dict): A reference from `database_settings_ref`, or database
+            settings, e.g. from the session state. Defaults to the current
+            settings.
+
+    Returns:
+        dict: The settings of the referenced schema version, or the current
+            settings if it is no longer available (e.g. a reference from
+            another process).
+    """
+    if settings is not None and "all_bq_ddl_schemas" in settings:
+        # Settings stored by value, e.g. in sessions created before references.
+        if "schema_version" not in settings:
+            # Stored before the schema versions, which hash the DDL.
+            return {
+                **settings,
+                "schema_version": _get_schema_version(
+                    settings["all_bq_ddl_schemas"]
+                ),
+            }
+        return settings
+    return _get_registered(_database_settings_snapshots, settings)
+
+
+def get_database_schema(settings=None):
+    """Returns the structured schema of database settings.
+
+    Args:
+        settings (dict): Database settings, e.g. from the session state.
+            Defaults to the current settings.
+
+    Returns:
+        DatabaseSchema: The schema the settings were built from, or the
+            current schema if it is no longer available (e.g. settings built
+            by another process).
+    """
+    return _get_registered(_database_schemas, settings)
+
+
+def get_schema_index(settings=None):
+    """Returns the schema linking index of database settings.
+
+    Args:
+        settings (dict): Database settings, e.g. from the session state.
+            Defaults to the current settings.
+
+    Returns:
+        SchemaIndex: The index of the schema the settings were built from, or
+            of the current schema if it is no longer available.
+    """
+    return _get_registered(_schema_indexes, settings)
+
+
+def get_relevant_schema(question, settings):
+    """Returns the DDL of the tables relevant to a question.
+
+    When the datasets have more than `SCHEMA_LINKING_TOP_K` tables (env
+    `BQ_SCHEMA_LINKING_TOP_K`), only the DDL of the best matching tables of
+    the schema linking index is returned, compacted to the token budget if
+    any. Otherwise, or if no table matches, the DDL of the datasets named in
+    the question, or of all datasets, is returned.
+
+    Args:
+        question (str): Natural language question.
+        settings (dict): Database settings or a reference to them, e.g. from
+            the session state.
+
+    Returns:
+        str: The DDL statements of the relevant tables.
+    """
+    schema_index = get_schema_index(settings)
+    if 0 < SCHEMA_LINKING_TOP_K < len(schema_index):
+        links = schema_index.search(question, SCHEMA_LINKING_TOP_K)
+        if links:
+            database_schema = get_database_schema(settings)
+            linked_schema = DatabaseSchema()
+            for dataset_id, dataset in database_schema.datasets.items():
+                tables = [
+                    link.table for link in links if link.dataset_id == dataset_id
+                ]
+                if tables:
+                    linked_schema.datasets[dataset_id] = DatasetSchema(
+                        project_id=dataset.project_id,
+                        dataset_id=dataset_id,
+                        tables=tables,
+                    )
+            logging.info(
+                "Tables linked to the question: "
+                + ", ".join(
+                    f"{link.table.full_name} ({', '.join(link.columns)})"
+                    for link in links
+                )
+            )
+            if SCHEMA_TOKEN_BUDGET > 0:
+                ddl_by_dataset = compact_schema(
+                    linked_schema, SCHEMA_TOKEN_BUDGET
+                ).ddl_by_dataset
+            else:
+                ddl_by_dataset = linked_schema.to_ddl_by_dataset()
+            return "\n".join(ddl_by_dataset.values())
+
+    settings = resolve_database_settings(settings)
+    all_bq_ddl_schemas = settings["all_bq_ddl_schemas"]
+    # Fall back to the datasets named in the question, or to all of them.
+    relevant_schemas = [
+        schema_ddl
+        for dataset_id, schema_ddl in all_bq_ddl_schemas.items()
+        if dataset_id.lower() in question.lower()
+    ] or list(all_bq_ddl_schemas.values())
+    return "\n".join(relevant_schemas)
+
+
+def _get_schema_version(all_ddl_schemas):
+    """Returns a short content hash of the DDL of all datasets."""
+    digest = hashlib.sha256()
+    for dataset_id, ddl_schema in all_ddl_schemas.items():
+        digest.update(f"{dataset_id}\0{ddl_schema}\0".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _column_from_field(field):
+    """Builds a `ColumnSchema` from a `bigquery.SchemaField`."""
+    return ColumnSchema(
+        name=field.name,
+        field_type=field.field_type,
+        mode=field.mode,
+        description=field.description,
+    )
+
+
+def _partitioning_from_table_obj(table_obj):
+    """Returns the partitioning of a table returned by `get_table`."""
+    time_partitioning = getattr(table_obj, "time_partitioning", None)
+    if time_partitioning is not None:
+        return PartitioningSchema(time_partitioning.field, time_partitioning.type_)
+    range_partitioning = getattr(table_obj, "range_partitioning", None)
+    if range_partitioning is not None:
+        return PartitioningSchema(range_partitioning.field, "RANGE")
+    return None
+
+
+def _map_concurrently(func, items, max_workers):
+    """Applies `func` to `items` with at most `max_workers` threads.
+
+    Results are returned in the order of `items`, independently of the order
+    in which the workers finish.
+    """
+    if max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
+def _sample_query(table_ref):
+    return f"SELECT * FROM `{table_ref}` LIMIT {SAMPLE_ROWS_LIMIT}"
+
+
+def _query_sample_rows(client, table_ref):
+    """Reads example rows of a table with a query job."""
+    return client.query(_sample_query(table_ref)).to_arrow()
+
+
+def _list_sample_rows(client, table_ref, fields):
+    """Reads example rows of a table with the (free) tabledata.list API."""
+    return client.list_rows(
+        table_ref, selected_fields=fields, max_results=SAMPLE_ROWS_LIMIT
+    ).to_arrow()
+
+
+def _safe_call(func, *args):
+    """Returns the result of `func(*args)`, or the exception it raised."""
+    try:
+        return func(*args)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        return e
+
+
+def _script_sample_rows(client, table_refs, max_workers):
+    """Reads example rows of many tables with a single BigQuery script job.
+
+    Falls back to one query job per table if the script fails, so that a
+    single unreadable table does not prevent sampling the others.
+    """
+    queries = [_sample_query(table_ref) for table_ref in table_refs]
+    try:
+        script_job = client.query(";\n".join(queries) + ";")
+        script_job.result()
+        frames = {
+            child_job.query.strip().rstrip(";"): child_job.to_arrow()
+            for child_job in client.list_jobs(parent_job=script_job)
+        }
+        return [frames[query] for query in queries]
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logging.warning(f"Sample rows script failed, querying tables one by one: {e}")
+        return _map_concurrently(
+            lambda table_ref: _safe_call(_query_sample_rows, client, table_ref),
+            table_refs,
+            max_workers,
+        )
+
+
+def _collect_sample_rows(client, sample_sources, max_workers):
+    """Fetches example rows for many tables with as few jobs as possible.
+
+    Standard tables are read with `list_rows`, which runs no query job and is
+    not billed. BigLake tables (e.g. BigQuery tables for Apache Iceberg) must
+    be read with a query: they are all sampled by one multi-statement script
+    job. Tables failing `list_rows` are retried with the query path.
+
+    Args:
+        client (bigquery.Client): A BigQuery client.
+        sample_sources (list): `(table_ref, fields, requires_query)` tuples,
+            where `fields` is the table schema.
+        max_workers (int): Maximum number of tables listed in parallel.
+
+    Returns:
+        list: An Arrow table of example rows, or the exception raised while
+            reading them, for every table of `sample_sources`.
+    """
+    results = [None] * len(sample_sources)
+    listed_indices = [
+        i for i, (_, _, requires_query) in enumerate(sample_sources)
+        if not requires_query
+    ]
+    listed_rows = _map_concurrently(
+        lambda i: _safe_call(
+            _list_sample_rows, client, sample_sources[i][0], sample_sources[i][1]
+        ),
+        listed_indices,
+        max_workers,
+    )
+    queried_indices = [
+        i for i, (_, _, requires_query) in enumerate(sample_sources)
+        if requires_query
+    ]
+    for i, rows in zip(listed_indices, listed_rows):
+        if isinstance(rows, Exception):
+            queried_indices.append(i)
+        else:
+            results[i] = rows
+
+    if queried_indices:
+        queried_rows = _script_sample_rows(
+            client,
+            [sample_sources[i][0] for i in queried_indices],
+            max_workers,
+        )
+        for i, rows in zip(queried_indices, queried_rows):
+            results[i] = rows
+    return results
+
+
+def _get_sample_rows(table_ref, rows):
+    """Serializes the example rows of a table.
+
+    Args:
+        table_ref (bigquery.TableReference): The sampled table.
+        rows (pa.Table | Exception): The example rows, or the exception
+            raised while reading them.
+
+    Returns:
+        SampleRows: The serialized rows, or the error if the rows could not
+            be retrieved.
+    """
+    try:
+        if isinstance(rows, Exception):
+            raise rows
+        return SampleRows(values=_serialize_rows_for_sql(rows))
+    except Exception as e:
+        logging.warning(
+            f"Could not retrieve sample rows for table {table_ref.path}: {e}"
+        )
+        return SampleRows(error=str(e))
+
+
+def _table_schema_from_table_obj(table_ref, table_obj):
+    """Builds the schema of a table returned by `get_table`.
+
+    Args:
+        table_ref (bigquery.TableReference): The table to describe.
+        table_obj (bigquery.Table): The table metadata.
+
+    Returns:
+        TableSchema: The schema of the table, without example rows, or None
+            if the table type is not supported.
+    """
+    table = TableSchema(
+        project_id=table_ref.project,
+        dataset_id=table_ref.dataset_id,
+        table_id=table_ref.table_id,
+        table_type=table_obj.table_type,
+        columns=[_column_from_field(field) for field in table_obj.schema],
+    )
+    if table_obj.table_type == "VIEW":
+        table.view_query = table_obj.view_query
+        return table
+    elif table_obj.table_type == "EXTERNAL":
+        if (
+            table_obj.external_data_configuration
+            and table_obj.external_data_configuration.source_format
+            == "ICEBERG"
+        ):
+            config = table_obj.external_data_configuration
+            table.connection_id = config.connection_id
+            table.source_uris = list(config.source_uris)
+            return table
+        # Skip other external tables.
+        return None
+    elif table_obj.table_type == "TABLE":
+        table.partitioning = _partitioning_from_table_obj(table_obj)
+        return table
+    # Skip other types like MATERIALIZED_VIEW, SNAPSHOT etc.
+    return None
+
+
+def _get_table_schemas(client, table_refs, max_workers):
+    """Builds the schema, with example rows, of the given tables.
+
+    Table metadata is fetched with one `get_table` call per table, with at
+    most `max_workers` calls in parallel, then example rows of all base
+    tables are collected with `_collect_sample_rows`.
+
+    Args:
+        client (bigquery.Client): A BigQuery client.
+        table_refs (list[bigquery.TableReference]): The tables to describe.
+        max_workers (int): Maximum number of tables introspected in parallel.
+
+    Returns:
+        list[TableSchema]: The schema of every table, in the order of
+            `table_refs`, None for tables of unsupported types.
+    """
+    table_objs = _map_concurrently(client.get_table, table_refs, max_workers)
+    tables = [
+        _table_schema_from_table_obj(table_ref, table_obj)
+        for table_ref, table_obj in zip(table_refs, table_objs)
+    ]
+    sampled = [
+        (table_ref, table_obj, table)
+        for table_ref, table_obj, table in zip(table_refs, table_objs, tables)
+        if table_obj.table_type == "TABLE"
+    ]
+    sample_rows = _collect_sample_rows(
+        client,
+        [
+            (
+                table_ref,
+                table_obj.schema,
+                getattr(table_obj, "biglake_configuration", None) is not None,
+            )
+            for table_ref, table_obj, _ in sampled
+        ],
+        max_workers,
+    )
+    for (table_ref, _, table), rows in zip(sampled, sample_rows):
+        table.samples = _get_sample_rows(table_ref, rows)
+    return tables
 
 
 def get_bigquery_schema(dataset_id,
                         data_project_id,
                         client=None,
-                        compute_project_id=None):
-    """Retrieves schema and generates DDL with example values for a BigQuery dataset.
+                        compute_project_id=None,
+                        max_workers=None):
+    """Retrieves the schema, with example values, of a BigQuery dataset.
+
+    Tables are introspected concurrently (metadata lookup and sample rows) by
+    a bounded pool of workers. Tables are always kept in table name order,
+    independently of the order in which the workers finish.
 
     Args:
         dataset_id (str): The ID of the BigQuery dataset (e.g., 'my_dataset').
         data_project_id (str): Project used for BQ data.
         client (bigquery.Client): A BigQuery client.
         compute_project_id (str): Project used for BQ compute.
+        max_workers (int): Maximum number of tables introspected in parallel.
+            Defaults to `SCHEMA_MAX_WORKERS` (env `BQ_SCHEMA_MAX_WORKERS`).
 
     Returns:
-        str: A string containing the generated DDL statements.
+        DatasetSchema: The schema of the dataset. `to_ddl()` renders the
+            DDL statements.
     """
 
     if client is None:
         client = bigquery.Client(project=compute_project_id)
+    if max_workers is None:
+        max_workers = SCHEMA_MAX_WORKERS
 
     # dataset_ref = client.dataset(dataset_id)
     dataset_ref = bigquery.DatasetReference(data_project_id, dataset_id)
 
-    ddl_statements = ""
-
     # Query INFORMATION_SCHEMA to robustly list tables. This is the recommended
     # approach when a dataset may contain BigLake tables like Apache Iceberg,
     # as the tables.list API can fail in those cases.
     info_schema_query = f"""
         SELECT table_name
         FROM `{data_project_id}.{dataset_id}.INFORMATION_SCHEMA.TABLES`
+        ORDER BY table_name
     """
     query_job = client.query(info_schema_query)
+    table_refs = [
+        dataset_ref.table(table_row.table_name)
+        for table_row in query_job.result()
+    ]
+
+    dataset = DatasetSchema(
+        project_id=data_project_id,
+        dataset_id=dataset_id,
+        tables=[
+            table
+            for table in _get_table_schemas(client, table_refs, max_workers)
+            if table is not None
+        ],
+    )
 
-    for table_row in query_job.result():
-        table_ref = dataset_ref.table(table_row.table_name)
-        table_obj = client.get_table(table_ref)
+    print(f"\nDDL Statements for {dataset_id}:\n{dataset.to_ddl()}")
+    return dataset
+
+
+# BigQuery standard SQL type names, as reported by INFORMATION_SCHEMA, mapped
+# to the legacy names returned by the tables API.
+_LEGACY_FIELD_TYPES = {
+    "INT64": "INTEGER",
+    "FLOAT64": "FLOAT",
+    "BOOL": "BOOLEAN",
+    "STRUCT": "RECORD",
+}
+
+# Table types reported by INFORMATION_SCHEMA.TABLES, mapped to the table types
+# returned by the tables API. Other types (e.g. MATERIALIZED VIEW, SNAPSHOT)
+# are skipped, as they are by `get_bigquery_schema`.
+_TABLE_TYPES = {
+    "BASE TABLE": "TABLE",
+    "CLONE": "TABLE",
+    "VIEW": "VIEW",
+    "EXTERNAL": "EXTERNAL",
+}
+
+
+def _schema_field_from_column(column_name, data_type, description):
+    """Builds a `bigquery.SchemaField` from an INFORMATION_SCHEMA column."""
+    mode = "NULLABLE"
+    if data_type.startswith("ARRAY<") and data_type.endswith(">"):
+        data_type = data_type[len("ARRAY<"):-1]
+        mode = "REPEATED"
+    # Drop type parameters, e.g. STRING(10), NUMERIC(10, 2) or STRUCT<...>.
+    base_type = re.match(r"\w+", data_type).group(0).upper()
+    return bigquery.SchemaField(
+        column_name,
+        _LEGACY_FIELD_TYPES.get(base_type, base_type),
+        mode=mode,
+        description=description,
+    )
 
-        if table_obj.table_type == "VIEW":
-            view_query = table_obj.view_query
-            ddl_statements += (
-                f"CREATE OR REPLACE VIEW `{table_ref}` AS\n{view_query};\n\n"
-            )
-            continue
-        elif table_obj.table_type == "EXTERNAL":
-            if (
-                table_obj.external_data_configuration
-                and table_obj.external_data_configuration.source_format
-                == "ICEBERG"
-            ):
-                config = table_obj.external_data_configuration
-                uris_list_str = ",\n    ".join(
-                    [f"'{uri}'" for uri in config.source_uris]
-                )
 
-                # Build column definitions from schema
-                column_defs = []
-                for field in table_obj.schema:
-                    col_type = field.field_type
-                    if field.mode == "REPEATED":
-                        col_type = f"ARRAY<{col_type}>"
-                    column_defs.append(f"  `{field.name}` {col_type}")
-                columns_str = ",\n".join(column_defs)
-
-                ddl_statements += f"""CREATE EXTERNAL TABLE `{table_ref}` (
-{columns_str}
-)
-WITH CONNECTION `{config.connection_id}`
-OPTIONS (
-  uris = [{uris_list_str}],
-  format = 'ICEBERG'
-);\n\n"""
-            # Skip DDL generation for other external tables.
-            continue
-        elif table_obj.table_type == "TABLE":
-            column_defs = []
-            for field in table_obj.schema:
-                col_type = field.field_type
-                if field.mode == "REPEATED":
-                    col_type = f"ARRAY<{col_type}>"
-                col_def = f"  `{field.name}` {col_type}"
-                if field.description:
-                    # Use OPTIONS for column descriptions
-                    col_def += (
-                        " OPTIONS(description='"
-                        "{}".format(field.description.replace('\'', '\'\'')) + "')"
-                    )
-                column_defs.append(col_def)
+def _parse_option_value(option_value):
+    """Parses a string or string array value from INFORMATION_SCHEMA.TABLE_OPTIONS."""
+    if option_value is None:
+        return None
+    if option_value.startswith("["):
+        return re.findall(r'"((?:[^"\\]|\\.)*)"', option_value)
+    return option_value.strip('"')
+
+
+def get_bigquery_schema_bulk(dataset_id,
+                             data_project_id,
+                             client=None,
+                             compute_project_id=None,
+                             max_workers=None):
+    """Generates the same DDL as `get_bigquery_schema` from INFORMATION_SCHEMA.
+
+    All table types, columns, column types, modes and descriptions, view
+    definitions and external table options of the dataset are read with a
+    single INFORMATION_SCHEMA query, instead of one `get_table` call per table.
+    Example rows of the base tables are collected with `_collect_sample_rows`.
+
+    Args:
+        dataset_id (str): The ID of the BigQuery dataset (e.g., 'my_dataset').
+        data_project_id (str): Project used for BQ data.
+        client (bigquery.Client): A BigQuery client.
+        compute_project_id (str): Project used for BQ compute.
+        max_workers (int): Maximum number of tables listed in parallel.
+            Defaults to `SCHEMA_MAX_WORKERS` (env `BQ_SCHEMA_MAX_WORKERS`).
+
+    Returns:
+        DatasetSchema: The schema of the dataset. `to_ddl()` renders the
+            DDL statements.
+    """
+
+    if client is None:
+        client = bigquery.Client(project=compute_project_id)
+    if max_workers is None:
+        max_workers = SCHEMA_MAX_WORKERS
 
-            ddl_statement = (
-                "CREATE OR REPLACE TABLE `{}` (\n{}\n);\n\n".format(
-                    table_ref, ",\n".join(column_defs)
+    dataset_ref = bigquery.DatasetReference(data_project_id, dataset_id)
+    info_schema = f"`{data_project_id}.{dataset_id}.INFORMATION_SCHEMA"
+
+    # One row per column. The connection of an external table is only exposed
+    # in its DDL, so the DDL is selected for external tables only. `format` is
+    # set on external tables, `table_format` on BigLake managed tables.
+    info_schema_query = f"""
+        SELECT
+          t.table_name,
+          t.table_type,
+          IF(t.table_type = 'EXTERNAL', t.ddl, NULL) AS ddl,
+          v.view_definition,
+          fmt.option_value AS format,
+          uris.option_value AS uris,
+          c.column_name,
+          c.data_type,
+          c.is_partitioning_column,
+          p.description
+        FROM {info_schema}.TABLES` AS t
+        LEFT JOIN {info_schema}.VIEWS` AS v
+          ON v.table_name = t.table_name
+        LEFT JOIN {info_schema}.TABLE_OPTIONS` AS fmt
+          ON fmt.table_name = t.table_name
+          AND fmt.option_name IN ('format', 'table_format')
+        LEFT JOIN {info_schema}.TABLE_OPTIONS` AS uris
+          ON uris.table_name = t.table_name AND uris.option_name = 'uris'
+        LEFT JOIN {info_schema}.COLUMNS` AS c
+          ON c.table_name = t.table_name
+        LEFT JOIN {info_schema}.COLUMN_FIELD_PATHS` AS p
+          ON p.table_name = c.table_name AND p.field_path = c.column_name
+        ORDER BY t.table_name, c.ordinal_position
+    """
+
+    tables = {}
+    for row in client.query(info_schema_query).result():
+        table_type = _TABLE_TYPES.get(row.table_type)
+        if table_type is None:
+            continue
+        if row.table_name not in tables:
+            tables[row.table_name] = {
+                "row": row, "type": table_type, "fields": [], "partitioning": None
+            }
+        if row.column_name is not None:
+            tables[row.table_name]["fields"].append(
+                _schema_field_from_column(
+                    row.column_name, row.data_type, row.description
                 )
             )
-
-            # Add example values if available by running a query. This is more
-            # robust than list_rows, especially for BigLake tables like Iceberg.
-            try:
-                sample_query = f"SELECT * FROM `{table_ref}` LIMIT 5"
-                rows = client.query(sample_query).to_dataframe()
-
-                if not rows.empty:
-                    ddl_statement += "-- Example values for table `{}`:\n".format(table_ref)
-                    for _, row in rows.iterrows():
-                        values_str = ", ".join(
-                            _serialize_value_for_sql(v) for v in row.values
-                        )
-                        ddl_statement += (
-                            "INSERT INTO `{}` VALUES ({});\n\n".format(table_ref, values_str)
-                        )
-            except Exception as e:
-                logging.warning(
-                    f"Could not retrieve sample rows for table {table_ref.path}: {e}"
+            if row.is_partitioning_column == "YES":
+                # The partitioning type is not exposed by INFORMATION_SCHEMA.
+                tables[row.table_name]["partitioning"] = PartitioningSchema(
+                    row.column_name
                 )
-                ddl_statement += f"-- NOTE: Could not retrieve sample rows for table {table_ref.path}.\n\n"
 
-            ddl_statements += ddl_statement
+    table_schemas = []
+    sample_sources = []
+    sampled_tables = []
+    for table_name, table in tables.items():
+        table_ref = dataset_ref.table(table_name)
+        row = table["row"]
+        table_schema = TableSchema(
+            project_id=data_project_id,
+            dataset_id=dataset_id,
+            table_id=table_name,
+            table_type=table["type"],
+            columns=[_column_from_field(field) for field in table["fields"]],
+        )
+        if table["type"] == "VIEW":
+            table_schema.view_query = row.view_definition
+        elif table["type"] == "EXTERNAL":
+            if _parse_option_value(row.format) != "ICEBERG":
+                continue
+            connection = re.search(r"WITH CONNECTION `([^`]+)`", row.ddl or "")
+            table_schema.connection_id = connection.group(1) if connection else None
+            table_schema.source_uris = _parse_option_value(row.uris) or []
         else:
-            # Skip other types like MATERIALIZED_VIEW, SNAPSHOT etc.
-            continue
+            table_schema.partitioning = table["partitioning"]
+            sample_sources.append(
+                (
+                    table_ref,
+                    table["fields"],
+                    _parse_option_value(row.format) == "ICEBERG",
+                )
+            )
+            sampled_tables.append(table_schema)
+        table_schemas.append(table_schema)
 
-    print(f"\nDDL Statements for {dataset_id}:\n{ddl_statements}")
-    return ddl_statements
+    sample_rows = _collect_sample_rows(client, sample_sources, max_workers)
+    for (table_ref, _, _), table_schema, rows in zip(
+        sample_sources, sampled_tables, sample_rows
+    ):
+        table_schema.samples = _get_sample_rows(table_ref, rows)
 
+    dataset = DatasetSchema(
+        project_id=data_project_id, dataset_id=dataset_id, tables=table_schemas
+    )
 
-def initial_bq_nl2sql(
-    question: str,
-    tool_context: ToolContext,
-) -> str:
-    """Generates an initial SQL query from a natural language question.
+    print(f"\nDDL Statements for {dataset_id}:\n{dataset.to_ddl()}")
+    return dataset
+
+
+def get_bigquery_schema_incremental(dataset_id,
+                                    data_project_id,
+                                    client=None,
+                                    compute_project_id=None,
+                                    max_workers=None,
+                                    store=None):
+    """Retrieves the schema of a dataset, reusing an on-disk snapshot.
+
+    A single metadata query lists every table with its last modification
+    time. Tables whose modification time matches the snapshot reuse their
+    stored schema, while new or modified tables are introspected (in
+    parallel) like `get_bigquery_schema` does. Dropped tables are removed
+    from the snapshot.
 
     Args:
-        question (str): Natural language question.
-        tool_context (ToolContext): The tool context to use for generating the SQL
-          query.
+        dataset_id (str): The ID of the BigQuery dataset (e.g., 'my_dataset').
+        data_project_id (str): Project used for BQ data.
+        client (bigquery.Client): A BigQuery client.
+        compute_project_id (str): Project used for BQ compute.
+        max_workers (int): Maximum number of tables introspected in parallel.
+            Defaults to `SCHEMA_MAX_WORKERS` (env `BQ_SCHEMA_MAX_WORKERS`).
+        store (SchemaSnapshotStore): The snapshot store. Defaults to a store
+            in `SCHEMA_SNAPSHOT_DIR` (env `BQ_SCHEMA_SNAPSHOT_DIR`).
 
     Returns:
-        str: An SQL statement to answer this question.
+        DatasetSchema: The schema of the dataset. `to_ddl()` renders the
+            DDL statements.
     """
 
-    prompt_template = """
+    if client is None:
+        client = bigquery.Client(project=compute_project_id)
+    if max_workers is None:
+        max_workers = SCHEMA_MAX_WORKERS
+    if store is None:
+        store = SchemaSnapshotStore(SCHEMA_SNAPSHOT_DIR)
+
+    dataset_ref = bigquery.DatasetReference(data_project_id, dataset_id)
+
+    # `__TABLES__` exposes the last modification time of every table, which
+    # also changes when the schema (or the view query) changes.
+    metadata_query = f"""
+        SELECT table_id, last_modified_time
+        FROM `{data_project_id}.{dataset_id}.__TABLES__`
+        ORDER BY table_id
+    """
+    last_modified_times = {
+        row.table_id: row.last_modified_time
+        for row in client.query(metadata_query).result()
+    }
+
+    cached_tables = store.load(data_project_id, dataset_id)
+    changed_table_ids = [
+        table_id
+        for table_id, last_modified_time in last_modified_times.items()
+        if table_id not in cached_tables
+        or cached_tables[table_id]["last_modified_time"] != last_modified_time
+        # Entries of snapshots written before the structured schema.
+        or "table" not in cached_tables[table_id]
+    ]
+    changed_tables = _get_table_schemas(
+        client,
+        [dataset_ref.table(table_id) for table_id in changed_table_ids],
+        max_workers,
+    )
+
+    tables = {
+        table_id: cached_tables.get(table_id)
+        for table_id in last_modified_times
+    }
+    for table_id, table in zip(changed_table_ids, changed_tables):
+        tables[table_id] = {
+            "last_modified_time": last_modified_times[table_id],
+            "table": table.to_dict() if table is not None else None,
+        }
+    if changed_table_ids or len(tables) != len(cached_tables):
+        store.save(data_project_id, dataset_id, tables)
+
+    logging.info(
+        f"Schema snapshot for {dataset_id}: {len(changed_table_ids)} of"
+        f" {len(tables)} tables introspected."
+    )
+    dataset = DatasetSchema(
+        project_id=data_project_id,
+        dataset_id=dataset_id,
+        tables=[
+            TableSchema.from_dict(table["table"])
+            for table in tables.values()
+            if table["table"] is not None
+        ],
+    )
+
+    print(f"\nDDL Statements for {dataset_id}:\n{dataset.to_ddl()}")
+    return dataset
+
+
+BASELINE_PROMPT_TEMPLATE = """
 You are a BigQuery SQL expert tasked with answering user's questions about BigQuery tables by generating SQL queries in the GoogleSql dialect.  Your task is to write a Bigquery SQL query that answers the following question while using the provided context.
 
 **Guidelines:**
@@ -281,30 +1246,78 @@ The database structure is defined by the following table schemas (possibly with
 
    """
 
-    all_bq_ddl_schemas = tool_context.state["database_settings"]["all_bq_ddl_schemas"]
-    bq_project_id = tool_context.state["database_settings"]["bq_project_id"]
-
-    # Infer the relevant schema based on the question
-    relevant_schemas = []
-    found_explicit_dataset = False
-    for dataset_id, schema_ddl in all_bq_ddl_schemas.items():
-        if dataset_id.lower() in question.lower():
-            relevant_schemas.append(schema_ddl)
-            found_explicit_dataset = True
-    
-    if not found_explicit_dataset:
-        # If no specific dataset is inferred, provide all schemas.
-        for dataset_id, schema_ddl in all_bq_ddl_schemas.items():
-            relevant_schemas.append(schema_ddl)
-
-    relevant_schema = "\n".join(relevant_schemas)
-    # Store the consolidated schema for other agents that might need it.
-    tool_context.state["database_settings"]["bq_ddl_schema"] = relevant_schema
-
-    prompt = prompt_template.format(
-        MAX_NUM_ROWS=MAX_NUM_ROWS, SCHEMA=relevant_schema, QUESTION=question
+# Compiled once, so that every prompt starts with the same instructions.
+BASELINE_PROMPT_LAYOUT = PromptLayout.compile(
+    BASELINE_PROMPT_TEMPLATE, MAX_NUM_ROWS=MAX_NUM_ROWS
+)
+
+
+def get_cached_sql(question, tool_context):
+    """Returns the cached SQL of a question, if any.
+
+    On a miss, the question is recorded in the session state, so that the SQL
+    generated for it is cached once `run_bigquery_validation` validates it.
+
+    Args:
+        question (str): Natural language question.
+        tool_context (ToolContext): The tool context of the NL2SQL tool.
+
+    Returns:
+        str: The validated SQL of the question or of a near-duplicate, or None.
+    """
+    schema_version = resolve_database_settings(
+        tool_context.state["database_settings"]
+    )["schema_version"]
+    sql = sql_cache.get(question, schema_version)
+    if sql is not None:
+        logging.info(f"Reusing the cached SQL of the question: {question}")
+        tool_context.state["sql_query"] = sql
+        tool_context.state["sql_cache_candidate"] = None
+    elif sql_cache.enabled:
+        tool_context.state["sql_cache_candidate"] = {
+            "question": question,
+            "schema_version": schema_version,
+        }
+    return sql
+
+
+def _admit_to_sql_cache(sql_string, tool_context):
+    """Caches validated SQL for the question it was generated for."""
+    candidate = tool_context.state.get("sql_cache_candidate")
+    if candidate:
+        sql_cache.put(
+            candidate["question"], candidate["schema_version"], sql_string
+        )
+        tool_context.state["sql_cache_candidate"] = None
+
+
+def initial_bq_nl2sql(
+    question: str,
+    tool_context: ToolContext,
+) -> str:
+    """Generates an initial SQL query from a natural language question.
+
+    Args:
+        question (str): Natural language question.
+        tool_context (ToolContext): The tool context to use for generating the SQL
+          query.
+
+    Returns:
+        str: An SQL statement to answer this question.
+    """
+    # Repeated questions skip the generation.
+    cached_sql = get_cached_sql(question, tool_context)
+    if cached_sql is not None:
+        return cached_sql
+
+    # Infer the relevant schema based on the question. It stays local to this
+    # call: the session state only holds a reference to the settings.
+    relevant_schema = get_relevant_schema(
+        question, tool_context.state["database_settings"]
     )
 
+    prompt = BASELINE_PROMPT_LAYOUT.render(relevant_schema, question)
+
     response = llm_client.models.generate_content(
         model=os.getenv("BASELINE_NL2SQL_MODEL"),
         contents=prompt,
@@ -322,108 +1335,290 @@ The database structure is defined by the following table schemas (possibly with
     return sql
 
 
-def run_bigquery_validation(
-    sql_string: str,
-    tool_context: ToolContext,
-) -> str:
-    """Validates BigQuery SQL syntax and functionality.
+def _cleanup_sql(sql_string):
+    """Processes the SQL string to get a printable, valid SQL string."""
 
-    This function validates the provided SQL string by attempting to execute it
-    against BigQuery in dry-run mode. It performs the following checks:
+    # 1. Remove backslashes escaping double quotes
+    sql_string = sql_string.replace('\\"', '"')
 
-    1. **SQL Cleanup:**  Preprocesses the SQL string using a `cleanup_sql`
-    function
-    2. **DML/DDL Restriction:**  Rejects any SQL queries containing DML or DDL
-       statements (e.g., UPDATE, DELETE, INSERT, CREATE, ALTER) to ensure
-       read-only operations.
-    3. **Syntax and Execution:** Sends the cleaned SQL to BigQuery for validation.
-       If the query is syntactically correct and executable, it retrieves the
-       results.
-    4. **Result Analysis:**  Checks if the query produced any results. If so, it
-       formats the first few rows of the result set for inspection.
+    # 2. Remove backslashes before newlines (the key fix for this issue)
+    sql_string = sql_string.replace("\\\n", "\n")  # Corrected regex
 
-    Args:
-        sql_string (str): The SQL query string to validate.
-        tool_context (ToolContext): The tool context to use for validation.
+
+    # 4. Replace escaped newlines (those not preceded by a backslash)
+    sql_string = sql_string.replace("\\n", "\n")
+
+    return sql_string
+
+
+def _start_validation(generated_sql, tool_context):
+    """Cleans up a query, and answers it if it need not run.
 
     Returns:
-        str: A message indicating the validation outcome. This includes:
-             - "Valid SQL. Results: ..." if the query is valid and returns data.
-             - "Valid SQL. Query executed successfully (no results)." if the query
-                is valid but returns no data.
-             - "Invalid SQL: ..." if the query is invalid, along with the error
-                message from BigQuery.
+        tuple: The cleaned-up SQL, its result cache key, and its result if
+            the query is disallowed or cached, else None.
     """
+    logging.info("Validating SQL: %s", generated_sql)
+    sql_string = _cleanup_sql(generated_sql)
+
+    # More restrictive check for BigQuery - only run read-only queries. The
+    # query is parsed once, for all the steps below.
+    query = parse_query(sql_string)
+    if query.error is not None:
+        return sql_string, None, {
+            "query_result": None,
+            "error_message": f"Invalid SQL: {query.error}",
+        }
+
+    # Add or lower the limit clause, so that BigQuery only returns the rows
+    # that are kept.
+    query = limit_rows(query, MAX_NUM_ROWS)
+    sql_string = query.sql
+    logging.info("Validating SQL (after cleanup): %s", sql_string)
 
-    def cleanup_sql(sql_string):
-        """Processes the SQL string to get a printable, valid SQL string."""
+    # Queries that already ran on the same schema, e.g. retried by the agent,
+    # are answered from memory.
+    schema_version = resolve_database_settings(
+        tool_context.state.get("database_settings")
+    )["schema_version"]
+    cache_key = result_cache.key(sql_string, schema_version, query.expression)
+    cached_result = result_cache.get(cache_key)
+    if cached_result is not None:
+        if cached_result["query_result"] is not None:
+            tool_context.state["query_result"] = cached_result["query_result"]
+        _admit_to_sql_cache(generated_sql, tool_context)
+        return sql_string, cache_key, cached_result
+    return sql_string, cache_key, None
+
+
+def _fetch_results(query_job):
+    """Returns the results of a query job, bounded to `MAX_NUM_ROWS` rows."""
+    # Only the rows that are kept are downloaded, in a single page, however
+    # large the result set is. Its size is still reported by `total_rows`.
+    return query_job.result(max_results=MAX_NUM_ROWS, page_size=MAX_NUM_ROWS)
+
+
+def _column_to_json(column):
+    """Converts an Arrow column of query results to JSON values.
+
+    DATE, DATETIME and TIMESTAMP values are formatted as "%Y-%m-%d" strings
+    once for the whole column. NUMERIC and BIGNUMERIC values are converted with
+    `float`, value by value, as Arrow's cast to float64 is not correctly
+    rounded (e.g. 3.75 becomes 3.7500000000000004). Other values are converted
+    as they are, like the rows of the BigQuery `RowIterator`.
 
-        # 1. Remove backslashes escaping double quotes
-        sql_string = sql_string.replace('\\"', '"')
+    Args:
+        column (pa.ChunkedArray): The column to convert.
 
-        # 2. Remove backslashes before newlines (the key fix for this issue)
-        sql_string = sql_string.replace("\\\n", "\n")  # Corrected regex
+    Returns:
+        list: The JSON value of every row, None for null values.
+    """
+    if pa.types.is_decimal(column.type):
+        return [
+            None if value is None else float(value)  # Convert Decimal to float
+            for value in column.to_pylist()
+        ]
+    if pa.types.is_date(column.type):
+        column = pc.cast(column, pa.string())
+    elif pa.types.is_timestamp(column.type):
+        column = pc.strftime(column, format="%Y-%m-%d")
+    if column.null_count == 0 and (
+        pa.types.is_integer(column.type)
+        or pa.types.is_floating(column.type)
+        or pa.types.is_boolean(column.type)
+    ):
+        # Much faster than `to_pylist` for the columns NumPy can hold.
+        return column.to_numpy().tolist()
+    return column.to_pylist()
 
 
-        # 4. Replace escaped newlines (those not preceded by a backslash)
-        sql_string = sql_string.replace("\\n", "\n")
+def _rows_from_arrow(table):
+    """Converts an Arrow table of query results to JSON rows, column-wise."""
+    names = table.column_names
+    columns = [_column_to_json(column) for column in table.columns]
+    return [dict(zip(names, values)) for values in zip(*columns)]
 
-        # 5. Add limit clause if not present
-        if "limit" not in sql_string.lower():
-            sql_string = sql_string + " limit " + str(MAX_NUM_ROWS)
 
-        return sql_string
+def _rows_from_results(results):
+    """Converts query results to JSON rows, None if they have no schema."""
+    if not results.schema:
+        return None
+    # Results are fetched in a single bounded page, which the BigQuery
+    # Storage Read API would not speed up, so no client is created for it.
+    table = results.to_arrow(create_bqstorage_client=False)
+    return _rows_from_arrow(table.slice(0, MAX_NUM_ROWS))
 
-    logging.info("Validating SQL: %s", sql_string)
-    sql_string = cleanup_sql(sql_string)
-    logging.info("Validating SQL (after cleanup): %s", sql_string)
 
+def _finish_validation(
+    generated_sql, cache_key, rows, total_rows, tool_context
+):
+    """Returns the result of a query that ran, and caches it."""
     final_result = {"query_result": None, "error_message": None}
-
-    # More restrictive check for BigQuery - disallow DML and DDL
-    if re.search(
-        r"(?i)(update|delete|drop|insert|create|alter|truncate|merge)", sql_string
-    ):
+    if rows is not None:
+        final_result["query_result"] = rows
+        # The query may have returned more rows than are kept.
+        final_result["total_rows"] = total_rows
+        tool_context.state["query_result"] = rows
+    else:
         final_result["error_message"] = (
-            "Invalid SQL: Contains disallowed DML/DDL operations."
+            "Valid SQL. Query executed successfully (no results)."
         )
-        return final_result
+    result_cache.put(cache_key, final_result)
+    _admit_to_sql_cache(generated_sql, tool_context)
+    return final_result
 
-    try:
-        query_job = get_bq_client().query(sql_string)
-        results = query_job.result()  # Get the query results
-
-        if results.schema:  # Check if query returned data
-            rows = [
-                {
-                    key: (
-                        float(value)  # Convert Decimal to float
-                        if isinstance(value, Decimal)
-                        else value.strftime("%Y-%m-%d")
-                        if isinstance(value, datetime.date)
-                        else value
-                    )
-                    for (key, value) in row.items()
-                }
-                for row in results
-            ][
-                :MAX_NUM_ROWS
-            ]  # Convert BigQuery RowIterator to list of dicts
-            # return f"Valid SQL. Results: {rows}"
-            final_result["query_result"] = rows
 
-            tool_context.state["query_result"] = rows
+def _dry_run_job_config():
+    return bigquery.QueryJobConfig(dry_run=True, use_query_cache=True)
+
+
+def _query_job_config():
+    # Queries missing the in-memory cache can still hit the BigQuery one, and
+    # BigQuery fails the queries over the limit rather than billing them.
+    job_config = bigquery.QueryJobConfig(use_query_cache=True)
+    if VALIDATION_MAX_BYTES_BILLED > 0:
+        job_config.maximum_bytes_billed = VALIDATION_MAX_BYTES_BILLED
+    return job_config
+
+
+def _check_query_cost(dry_run_job):
+    """Returns the result of a dry-run query over the bytes limit, if any."""
+    bytes_processed = dry_run_job.total_bytes_processed or 0
+    if not 0 < VALIDATION_MAX_BYTES_BILLED < bytes_processed:
+        return None
+    return {
+        "query_result": None,
+        "error_message": (
+            f"Query too expensive: it would process {bytes_processed} bytes,"
+            f" more than the limit of {VALIDATION_MAX_BYTES_BILLED} bytes."
+            " Narrow it down: select only the needed columns, filter on the"
+            " partitioning or clustering columns, or aggregate over a smaller"
+            " range."
+        ),
+        "total_bytes_processed": bytes_processed,
+        "maximum_bytes_billed": VALIDATION_MAX_BYTES_BILLED,
+    }
 
-        else:
-            final_result["error_message"] = (
-                "Valid SQL. Query executed successfully (no results)."
-            )
 
+def run_bigquery_validation_sync(
+    sql_string: str,
+    tool_context: ToolContext,
+) -> str:
+    """Validates BigQuery SQL syntax and functionality, blocking until done.
+
+    Same checks and outcome as `run_bigquery_validation`, for callers that
+    do not run an event loop.
+
+    Args:
+        sql_string (str): The SQL query string to validate.
+        tool_context (ToolContext): The tool context to use for validation.
+
+    Returns:
+        str: A message indicating the validation outcome, as returned by
+            `run_bigquery_validation`.
+    """
+    sql_to_run, cache_key, final_result = _start_validation(
+        sql_string, tool_context
+    )
+    if final_result is not None:
+        return final_result
+
+    try:
+        client = get_bq_client()
+        final_result = _check_query_cost(
+            client.query(sql_to_run, job_config=_dry_run_job_config())
+        )
+        if final_result is None:
+            query_job = client.query(sql_to_run, job_config=_query_job_config())
+            results = _fetch_results(query_job)  # Get the query results
+            rows = _rows_from_results(results)
+            final_result = _finish_validation(
+                sql_string, cache_key, rows, results.total_rows, tool_context
+            )
     except (
         Exception
     ) as e:  # Catch generic exceptions from BigQuery  # pylint: disable=broad-exception-caught
-        final_result["error_message"] = f"Invalid SQL: {e}"
+        final_result = {"query_result": None, "error_message": f"Invalid SQL: {e}"}
+
+    print("\n run_bigquery_validation_sync final_result: \n", final_result)
+
+    return final_result
+
+
+async def run_bigquery_validation(
+    sql_string: str,
+    tool_context: ToolContext,
+) -> str:
+    """Validates BigQuery SQL syntax and functionality, without blocking.
+
+    The parsing and the BigQuery calls run in worker threads, and the query
+    job is polled with `asyncio.sleep` between checks, so that the event loop
+    keeps serving the other sessions while the query runs.
+
+    This function validates the provided SQL string in BigQuery dry-run mode,
+    then executes it if it is within budget. It performs the following checks:
+
+    1. **SQL Cleanup:**  Preprocesses the SQL string using a `cleanup_sql`
+    function
+    2. **DML/DDL Restriction:**  Parses the SQL, and rejects anything but a
+       single SELECT query, e.g. DML or DDL statements (UPDATE, DELETE,
+       INSERT, CREATE, ALTER), to ensure read-only operations. The LIMIT of
+       the query is then capped to `MAX_NUM_ROWS` rows.
+    3. **Syntax and Cost:** Sends the cleaned SQL to BigQuery as a dry run,
+       which reports the syntax and semantic errors and the number of bytes
+       the query would process, without running it.
+    4. **Execution:** If the query is valid and processes at most
+       `VALIDATION_MAX_BYTES_BILLED` bytes, runs it and retrieves the results.
+    5. **Result Analysis:**  Checks if the query produced any results. If so, it
+       fetches and formats only the first `MAX_NUM_ROWS` rows of the result
+       set for inspection, and reports its size in `total_rows`.
+
+    Args:
+        sql_string (str): The SQL query string to validate.
+        tool_context (ToolContext): The tool context to use for validation.
+
+    Returns:
+        str: A message indicating the validation outcome. This includes:
+             - "Valid SQL. Results: ..." if the query is valid and returns data.
+             - "Valid SQL. Query executed successfully (no results)." if the query
+                is valid but returns no data.
+             - "Invalid SQL: ..." if the query is invalid, along with the error
+                message from BigQuery.
+             - "Query too expensive: ..." if the query would process more
+                bytes than allowed, along with `total_bytes_processed` and
+                `maximum_bytes_billed`.
+    """
+    # The parsing may also wait for the database settings to be built.
+    sql_to_run, cache_key, final_result = await asyncio.to_thread(
+        _start_validation, sql_string, tool_context
+    )
+    if final_result is not None:
+        return final_result
+
+    try:
+        client = await asyncio.to_thread(get_bq_client)
+        final_result = _check_query_cost(
+            await asyncio.to_thread(
+                client.query, sql_to_run, job_config=_dry_run_job_config()
+            )
+        )
+        if final_result is None:
+            query_job = await asyncio.to_thread(
+                client.query, sql_to_run, job_config=_query_job_config()
+            )
+            poll_seconds = QUERY_POLL_MIN_SECONDS
+            while not await asyncio.to_thread(query_job.done):
+                await asyncio.sleep(poll_seconds)
+                poll_seconds = min(poll_seconds * 2, QUERY_POLL_MAX_SECONDS)
+            # The job is done, but its rows are fetched by pages.
+            results = await asyncio.to_thread(_fetch_results, query_job)
+            rows = await asyncio.to_thread(_rows_from_results, results)
+            final_result = _finish_validation(
+                sql_string, cache_key, rows, results.total_rows, tool_context
+            )
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        final_result = {"query_result": None, "error_message": f"Invalid SQL: {e}"}
 
-    print("\n run_bigquery_validation final_result: \n", final_result)
+    logging.info("run_bigquery_validation final_result: %s", final_result)
 
     return final_result
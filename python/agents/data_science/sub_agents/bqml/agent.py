@@ -29,12 +29,16 @@ from .prompts import return_instructions_bqml
 
 
 from data_science.sub_agents.bigquery.agent import database_agent as bq_db_agent
+from data_science.sub_agents.bigquery.agent import database_agent_request
 from data_science.sub_agents.bigquery.tools import (
-    get_database_settings as get_bq_database_settings,
+    database_settings_ref as bq_database_settings_ref,
+    get_database_settings_async as get_bq_database_settings_async,
+    resolve_database_settings as resolve_bq_database_settings,
 )
+from data_science.utils.instruction_cache import instruction_cache
 
 
-def setup_before_agent_call(callback_context: CallbackContext):
+async def setup_before_agent_call(callback_context: CallbackContext):
     """Setup the agent."""
 
     # setting up database settings in session.state
@@ -43,22 +47,24 @@ def setup_before_agent_call(callback_context: CallbackContext):
         db_settings["use_database"] = "BigQuery"
         callback_context.state["all_db_settings"] = db_settings
 
-    # setting up schema in instruction
+    # setting up the reference to the database settings the instruction is
+    # rendered from
     if callback_context.state["all_db_settings"]["use_database"] == "BigQuery":
-        # Ensure database_settings is initialized and contains bq_ddl_schema
-        db_settings = get_bq_database_settings()
-        callback_context.state["database_settings"] = db_settings
-        schema = db_settings["all_bq_ddl_schemas"] # Use all_bq_ddl_schemas directly
-        # The bqml agent expects a single schema string, so we need to consolidate
-        # all_bq_ddl_schemas into a single string.
-        consolidated_schema = ""
-        for dataset_id, ddl_schema in schema.items():
-            consolidated_schema += f"{ddl_schema}\n"
-        schema = consolidated_schema
-
-        callback_context._invocation_context.agent.instruction = (
-            return_instructions_bqml()
-            + f"""
+        callback_context.state["database_settings"] = bq_database_settings_ref(
+            await get_bq_database_settings_async()
+        )
+
+
+def render_bqml_instruction(database_settings):
+    """Renders the BQML instruction, with the schema of all datasets."""
+    schema = database_settings["all_bq_ddl_schemas"]
+    # The bqml agent expects a single schema string, so we need to consolidate
+    # all_bq_ddl_schemas into a single string.
+    schema = "".join(f"{ddl_schema}\n" for ddl_schema in schema.values())
+
+    return (
+        return_instructions_bqml()
+        + f"""
 
    </BQML Reference for this query>
     
@@ -66,7 +72,7 @@ def setup_before_agent_call(callback_context: CallbackContext):
     {schema}
     </The BigQuery schema of the relevant data with a few sample rows>
     """
-        )
+    )
 
 
 async def call_db_agent(
@@ -86,7 +92,7 @@ async def call_db_agent(
     )
     agent_tool = AgentTool(agent=database_agent)
     db_agent_output = await agent_tool.run_async(
-        args={"request": question}, tool_context=tool_context
+        args=database_agent_request(question), tool_context=tool_context
     )
     tool_context.state["db_agent_output"] = db_agent_output
     return db_agent_output
@@ -95,7 +101,13 @@ async def call_db_agent(
 root_agent = Agent(
     model=os.getenv("BQML_AGENT_MODEL"),
     name="bq_ml_agent",
-    instruction=return_instructions_bqml(),
+    # Rendered once per schema version, see `InstructionCache`.
+    instruction=instruction_cache.provider(
+        "bq_ml_agent",
+        render_bqml_instruction,
+        return_instructions_bqml,
+        resolve=resolve_bq_database_settings,
+    ),
     before_agent_callback=setup_before_agent_call,
     tools=[execute_bqml_code, check_bq_models, call_db_agent, rag_response],
 )
@@ -23,6 +23,7 @@ from google.adk.tools import ToolContext
 from google.adk.tools.agent_tool import AgentTool
 
 from .sub_agents import ds_agent, db_agent
+from .sub_agents.bigquery.agent import database_agent_request
 
 
 async def call_db_agent(
@@ -38,11 +39,7 @@ async def call_db_agent(
     agent_tool = AgentTool(agent=db_agent)
 
     db_agent_output = await agent_tool.run_async(
-        args={
-            "request": question,
-            "all_bq_ddl_schemas": tool_context.state["database_settings"]["all_bq_ddl_schemas"],
-            "bq_project_id": tool_context.state["database_settings"]["bq_project_id"],
-        },
+        args=database_agent_request(question),
         tool_context=tool_context
     )
     tool_context.state["db_agent_output"] = db_agent_output
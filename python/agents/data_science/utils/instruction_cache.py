@@ -0,0 +1,110 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cache of the agent instructions rendered from the database schema."""
+
+import collections
+import threading
+from typing import Any, Callable
+
+from google.adk.agents.readonly_context import ReadonlyContext
+
+
+class InstructionCache:
+    """Renders the instruction of each agent once per schema version.
+
+    Instructions embedding the schema only change with the schema, so they
+    are kept by (agent name, schema version) and reused across turns and
+    sessions. The version is the one of the settings the instruction is
+    rendered from, which may differ from the one the session refers to if
+    that version is no longer available. The least recently used entries are
+    evicted first.
+    """
+
+    def __init__(self, max_entries: int = 8):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._instructions: collections.OrderedDict[tuple[str, str], str] = (
+            collections.OrderedDict()
+        )
+
+    def get(
+        self,
+        agent_name: str,
+        database_settings: dict[str, Any],
+        render: Callable[[dict[str, Any]], str],
+        resolve: Callable[[dict[str, Any]], dict[str, Any]] | None = None,
+    ) -> str:
+        """Returns the instruction of an agent for database settings.
+
+        Args:
+            agent_name: The name of the agent.
+            database_settings: The database settings the instruction is
+                rendered from.
+            render: Renders the instruction from the database settings. Only
+                called if the instruction is not cached yet.
+            resolve: Returns the settings `database_settings` refers to, e.g.
+                from a reference in the session state. Defaults to using
+                `database_settings` as they are.
+
+        Returns:
+            The rendered instruction.
+        """
+        if resolve is not None:
+            database_settings = resolve(database_settings)
+        key = (agent_name, database_settings["schema_version"])
+        with self._lock:
+            instruction = self._instructions.get(key)
+            if instruction is not None:
+                self._instructions.move_to_end(key)
+                return instruction
+        instruction = render(database_settings)
+        with self._lock:
+            self._instructions[key] = instruction
+            while len(self._instructions) > self._max_entries:
+                self._instructions.popitem(last=False)
+        return instruction
+
+    def provider(
+        self,
+        agent_name: str,
+        render: Callable[[dict[str, Any]], str],
+        default: Callable[[], str],
+        resolve: Callable[[dict[str, Any]], dict[str, Any]] | None = None,
+    ) -> Callable[[ReadonlyContext], str]:
+        """Returns an ADK instruction provider backed by the cache.
+
+        Args:
+            agent_name: The name of the agent.
+            render: Renders the instruction from the database settings.
+            default: Returns the instruction used when the session state has
+                no database settings.
+            resolve: Returns the settings the session state refers to.
+
+        Returns:
+            A function returning the instruction for the database settings
+            of the session state.
+        """
+
+        def instruction_provider(context: ReadonlyContext) -> str:
+            database_settings = context.state.get("database_settings")
+            if not database_settings:
+                return default()
+            return self.get(agent_name, database_settings, render, resolve)
+
+        return instruction_provider
+
+
+# Shared by all the agents.
+instruction_cache = InstructionCache()
@@ -0,0 +1,83 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Deduplication of concurrent calls to expensive functions."""
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Callable
+
+
+class SingleFlight:
+    """Ensures that at most one call of a function is in flight at a time.
+
+    The first caller (the leader) runs the function, and every caller that
+    arrives while it is running waits for, and shares, the leader's result or
+    exception. Once the call completes, the next caller starts a new one.
+    Threads use `do` and coroutines use `do_async`; both share the same
+    in-flight call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._future: concurrent.futures.Future | None = None
+
+    def _join(self) -> tuple[concurrent.futures.Future, bool]:
+        """Returns the in-flight future, and whether the caller must run it."""
+        with self._lock:
+            if self._future is not None:
+                return self._future, False
+            self._future = concurrent.futures.Future()
+            return self._future, True
+
+    def _run(self, func: Callable[[], Any], future: concurrent.futures.Future):
+        try:
+            future.set_result(func())
+        except BaseException as e:  # pylint: disable=broad-exception-caught
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._future = None
+
+    def do(self, func: Callable[[], Any]) -> Any:
+        """Runs `func`, or waits for the call already in flight.
+
+        Args:
+            func: The function to run, without arguments.
+
+        Returns:
+            The result of the in-flight call.
+        """
+        future, is_leader = self._join()
+        if is_leader:
+            self._run(func, future)
+        return future.result()
+
+    async def do_async(self, func: Callable[[], Any]) -> Any:
+        """Like `do`, but never blocks the event loop.
+
+        The leader runs `func` in the loop's default executor, and every
+        caller awaits the shared result.
+
+        Args:
+            func: The (blocking) function to run, without arguments.
+
+        Returns:
+            The result of the in-flight call.
+        """
+        future, is_leader = self._join()
+        if is_leader:
+            asyncio.get_running_loop().run_in_executor(None, self._run, func, future)
+        return await asyncio.wrap_future(future)
@@ -17,9 +17,14 @@
 import logging
 import os
 
+# The agent is only pickled here: warm it up on the Agent Engine replicas,
+# not on the machine running the deployment.
+os.environ.setdefault("WARMUP_ON_STARTUP", "0")
+
 import vertexai
 from absl import app, flags
 from data_science.agent import root_agent
+from data_science.sub_agents.bigquery import tools as bq_tools
 from dotenv import load_dotenv
 from google.api_core import exceptions as google_exceptions
 from google.cloud import storage
@@ -39,6 +44,8 @@ flags.DEFINE_bool("delete", False, "Delete an existing agent.")
 flags.mark_bool_flags_as_mutual_exclusive(["create", "delete"])
 
 AGENT_WHL_FILE = "data_science-0.1-py3-none-any.whl"
+# Maximum time a replica waits for the warm-up before taking traffic.
+WARMUP_TIMEOUT_SECONDS = 600
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -122,9 +129,22 @@ def setup_staging_bucket(
     return f"gs://{bucket_name}"
 
 
+class WarmAdkApp(AdkApp):
+    """`AdkApp` whose replicas only take traffic once warmed up."""
+
+    def set_up(self):
+        """Sets up the ADK application, then waits for the warm-up."""
+        super().set_up()
+        bq_tools.start_warmup()
+        if not bq_tools.wait_until_ready(timeout=WARMUP_TIMEOUT_SECONDS):
+            logging.warning(
+                "Warm-up not complete, the first turns may be slower."
+            )
+
+
 def create(env_vars: dict[str, str]) -> None:
     """Creates and deploys the agent."""
-    adk_app = AdkApp(
+    adk_app = WarmAdkApp(
         agent=root_agent,
         enable_tracing=False,
     )
@@ -0,0 +1,228 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-memory fake of the BigQuery client used by the unit tests."""
+
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import pyarrow as pa
+from google.cloud import bigquery
+
+LEGACY_FIELD_TYPES = {
+    "INT64": "INTEGER",
+    "FLOAT64": "FLOAT",
+    "BOOL": "BOOLEAN",
+    "STRUCT": "RECORD",
+}
+
+
+class FakeTable:
+    """Minimal stand-in for `bigquery.Table`."""
+
+    def __init__(
+        self,
+        table_id,
+        table_type="TABLE",
+        schema=None,
+        rows=None,
+        view_query=None,
+        external_data_configuration=None,
+        biglake_configuration=None,
+    ):
+        self.table_id = table_id
+        self.table_type = table_type
+        self.schema = schema or []
+        self.rows = rows or []
+        self.view_query = view_query
+        self.external_data_configuration = external_data_configuration
+        self.biglake_configuration = biglake_configuration
+        # Set to make `list_rows` or sample queries fail on this table.
+        self.list_rows_error = None
+        self.query_error = None
+        self.last_modified_time = 1
+
+
+class FakeQueryJob:
+    """Minimal stand-in for `bigquery.QueryJob`."""
+
+    def __init__(self, rows=None, arrow=None, query=None, children=None):
+        self._rows = rows or []
+        self._arrow = arrow
+        self.query = query
+        self.children = children or []
+
+    def result(self):
+        return self._rows
+
+    def to_arrow(self):
+        return self._arrow
+
+
+class FakeBigQueryClient:
+    """Fake BigQuery client serving a single dataset of synthetic tables.
+
+    Every API call sleeps for `latency` seconds to simulate a network round
+    trip, and is counted in `calls` so tests can assert on the number of
+    requests issued.
+    """
+
+    def __init__(
+        self,
+        num_tables=10,
+        latency=0.0,
+        project="fake-project",
+        dataset="fake_dataset",
+    ):
+        self.project = project
+        self.dataset = dataset
+        self.latency = latency
+        self.calls = {"query": 0, "get_table": 0, "list_rows": 0, "list_jobs": 0}
+        self._lock = threading.Lock()
+        self.tables = {}
+        for i in range(num_tables):
+            table_id = f"table_{i:04d}"
+            self.tables[table_id] = FakeTable(
+                table_id,
+                schema=[
+                    bigquery.SchemaField("id", "INTEGER"),
+                    bigquery.SchemaField(
+                        "name", "STRING", description="The user's name"
+                    ),
+                    bigquery.SchemaField("score", "FLOAT"),
+                ],
+                rows=[
+                    {"id": j, "name": f"name_{j}", "score": j / 2}
+                    for j in range(5)
+                ],
+            )
+
+    def add_table(self, table):
+        self.tables[table.table_id] = table
+
+    def _record(self, method):
+        with self._lock:
+            self.calls[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _info_schema_rows(self):
+        """Returns one INFORMATION_SCHEMA row per table column."""
+        standard_types = {v: k for k, v in LEGACY_FIELD_TYPES.items()}
+        info_schema_table_types = {"TABLE": "BASE TABLE"}
+        rows = []
+        for table_id in sorted(self.tables):
+            table = self.tables[table_id]
+            config = table.external_data_configuration
+            table_row = {
+                "table_name": table_id,
+                "table_type": info_schema_table_types.get(
+                    table.table_type, table.table_type
+                ),
+                "ddl": None,
+                "view_definition": table.view_query,
+                "format": None,
+                "uris": None,
+            }
+            if config is not None:
+                table_row["ddl"] = (
+                    f"CREATE EXTERNAL TABLE `{table_id}`\n"
+                    f"WITH CONNECTION `{config.connection_id}`"
+                )
+                table_row["format"] = f'"{config.source_format}"'
+                table_row["uris"] = (
+                    "[" + ", ".join(f'"{uri}"' for uri in config.source_uris) + "]"
+                )
+            if not table.schema:
+                rows.append(
+                    SimpleNamespace(
+                        **table_row,
+                        column_name=None,
+                        data_type=None,
+                        is_partitioning_column=None,
+                        description=None,
+                    )
+                )
+            for field in table.schema:
+                data_type = standard_types.get(field.field_type, field.field_type)
+                if field.mode == "REPEATED":
+                    data_type = f"ARRAY<{data_type}>"
+                rows.append(
+                    SimpleNamespace(
+                        **table_row,
+                        column_name=field.name,
+                        data_type=data_type,
+                        is_partitioning_column="NO",
+                        description=field.description,
+                    )
+                )
+        return rows
+
+    def query(self, sql, job_config=None):  # pylint: disable=unused-argument
+        self._record("query")
+        if "INFORMATION_SCHEMA.COLUMNS" in sql:
+            return FakeQueryJob(rows=self._info_schema_rows())
+        if "__TABLES__" in sql:
+            return FakeQueryJob(
+                rows=[
+                    SimpleNamespace(
+                        table_id=table_id,
+                        last_modified_time=self.tables[table_id].last_modified_time,
+                    )
+                    for table_id in sorted(self.tables)
+                ]
+            )
+        if "INFORMATION_SCHEMA.TABLES" in sql:
+            return FakeQueryJob(
+                rows=[
+                    SimpleNamespace(table_name=table_id)
+                    for table_id in sorted(self.tables)
+                ]
+            )
+        statements = [s.strip() for s in sql.split(";") if s.strip()]
+        if len(statements) > 1:
+            # Multi-statement script: one child job per statement.
+            return FakeQueryJob(
+                children=[self._sample_query_job(s) for s in statements]
+            )
+        return self._sample_query_job(sql)
+
+    def _sample_query_job(self, sql):
+        match = re.fullmatch(r"SELECT \* FROM `[^`]*\.([^`.]+)` LIMIT 5", sql)
+        if not match:
+            raise ValueError(f"Unsupported query: {sql}")
+        table = self.tables[match.group(1)]
+        if table.query_error is not None:
+            raise table.query_error
+        return FakeQueryJob(arrow=pa.Table.from_pylist(table.rows[:5]), query=sql)
+
+    def list_jobs(self, parent_job=None):
+        self._record("list_jobs")
+        # Child jobs are listed most recent first.
+        return list(reversed(parent_job.children))
+
+    def list_rows(self, table, selected_fields=None, max_results=None):
+        self._record("list_rows")
+        fake_table = self.tables[table.table_id]
+        if fake_table.list_rows_error is not None:
+            raise fake_table.list_rows_error
+        columns = [field.name for field in selected_fields]
+        rows = pa.Table.from_pylist(fake_table.rows[:max_results]).select(columns)
+        return FakeQueryJob(arrow=rows)
+
+    def get_table(self, table_ref):
+        self._record("get_table")
+        return self.tables[table_ref.table_id]
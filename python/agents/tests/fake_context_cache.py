@@ -0,0 +1,81 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-memory fake of the Vertex AI context caches used by the unit tests."""
+
+from data_science.sub_agents.bigquery.chase_sql.context_cache import (
+    CachedPrefix,
+)
+
+
+class FakeClock:
+    """A clock only moved forward by the tests."""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeContextCacheBackend:
+    """Stores the cached prefixes in memory and expires them on `clock`."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.caches = {}
+        self.available = True
+        self.calls = {"create": 0, "renew": 0, "delete": 0}
+
+    def _get(self, name):
+        cache = self.caches.get(name)
+        if cache is None or self.clock() >= cache["expire_time"]:
+            raise KeyError(f"Cached content {name} not found")
+        return cache
+
+    def create(self, model_name, prefix, ttl_seconds):
+        self.calls["create"] += 1
+        if not self.available:
+            raise RuntimeError("Context caching is not supported")
+        name = f"cachedContents/{self.calls['create']}"
+        self.caches[name] = {
+            "model_name": model_name,
+            "prefix": prefix,
+            "expire_time": self.clock() + ttl_seconds,
+        }
+        return CachedPrefix(
+            name=name, expire_time=self.caches[name]["expire_time"]
+        )
+
+    def renew(self, name, ttl_seconds):
+        self.calls["renew"] += 1
+        cache = self._get(name)
+        cache["expire_time"] = self.clock() + ttl_seconds
+        return cache["expire_time"]
+
+    def delete(self, name):
+        self.calls["delete"] += 1
+        self._get(name)
+        del self.caches[name]
+
+    def live_caches(self):
+        """Returns the names of the caches that have not expired."""
+        return [
+            name
+            for name, cache in self.caches.items()
+            if self.clock() < cache["expire_time"]
+        ]
@@ -0,0 +1,200 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test cases for the non-blocking validation of the queries."""
+
+import asyncio
+import os
+import sys
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pyarrow as pa
+
+from data_science.sub_agents.bigquery import agent, tools
+from data_science.sub_agents.bigquery.prompts import VALIDATION_TOOL_NAME
+from data_science.sub_agents.bigquery.result_cache import QueryResultCache
+
+LATENCY_SECONDS = 0.3
+SESSIONS = 8
+
+
+class SlowQueryJob:
+    """Query job done `LATENCY_SECONDS` after its submission."""
+
+    total_bytes_processed = 1024
+
+    def __init__(self, rows):
+        self._rows = rows
+        self._done_time = time.monotonic() + LATENCY_SECONDS
+
+    def done(self):
+        return time.monotonic() >= self._done_time
+
+    def result(self, **kwargs):
+        time.sleep(max(0.0, self._done_time - time.monotonic()))
+        results = mock.MagicMock()
+        results.schema = ["n"]
+        results.total_rows = len(self._rows)
+        results.to_arrow.side_effect = lambda **kwargs: pa.Table.from_pylist(
+            self._rows
+        )
+        return results
+
+
+class TestRunBigQueryValidationAsync(unittest.TestCase):
+    """Test cases for `run_bigquery_validation`."""
+
+    def setUp(self):
+        """Set up for test methods."""
+        self.client = mock.Mock()
+        self.client.query.side_effect = lambda sql, job_config: SlowQueryJob(
+            [{"n": len(sql)}]
+        )
+        for name, value in (
+            ("get_bq_client", mock.Mock(return_value=self.client)),
+            ("result_cache", QueryResultCache()),
+        ):
+            patcher = mock.patch.object(tools, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _context():
+        settings = {"all_bq_ddl_schemas": {}, "schema_version": "v1"}
+        return SimpleNamespace(state={"database_settings": settings})
+
+    def test_sessions_validate_concurrently(self):
+        """N sessions take about the latency of one query, not N times it."""
+
+        async def validate_all():
+            return await asyncio.gather(*(
+                tools.run_bigquery_validation(
+                    f"SELECT {i} AS n", self._context()
+                )
+                for i in range(SESSIONS)
+            ))
+
+        start = time.monotonic()
+        results = asyncio.run(validate_all())
+        elapsed = time.monotonic() - start
+
+        self.assertLess(elapsed, 3 * LATENCY_SECONDS)
+        # One dry run and one run per session.
+        self.assertEqual(self.client.query.call_count, 2 * SESSIONS)
+        for i, result in enumerate(results):
+            self.assertIsNone(result["error_message"])
+            self.assertEqual(
+                result["query_result"],
+                [{"n": len(f"SELECT {i} AS n LIMIT {tools.MAX_NUM_ROWS}")}],
+            )
+
+    def test_event_loop_is_not_blocked(self):
+        """Other coroutines run while a query is running."""
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def validate_while_ticking():
+            ticker = asyncio.create_task(tick())
+            result = await tools.run_bigquery_validation(
+                "SELECT 1 AS n", self._context()
+            )
+            ticker.cancel()
+            return result
+
+        result = asyncio.run(validate_while_ticking())
+        self.assertIsNotNone(result["query_result"])
+        self.assertGreater(len(ticks), 5)
+
+    def test_settings_load_does_not_block(self):
+        """Other coroutines run while the database settings are loaded."""
+        resolve = tools.resolve_database_settings
+
+        def slow_resolve(settings):
+            time.sleep(LATENCY_SECONDS)
+            return resolve(settings)
+
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def validate_while_ticking():
+            ticker = asyncio.create_task(tick())
+            await asyncio.sleep(0)
+            start = time.monotonic()
+            result = await tools.run_bigquery_validation(
+                "SELECT 1 AS n", self._context()
+            )
+            ticker.cancel()
+            return start, result
+
+        with mock.patch.object(
+            tools, "resolve_database_settings", side_effect=slow_resolve
+        ):
+            start, result = asyncio.run(validate_while_ticking())
+        self.assertIsNotNone(result["query_result"])
+        # The loop ticked while the settings were being loaded.
+        self.assertGreater(
+            len([t for t in ticks if t < start + LATENCY_SECONDS]), 5
+        )
+
+    def test_results_match_the_blocking_validation(self):
+        """Both tools return and cache the same results."""
+        context = self._context()
+        async_result = asyncio.run(
+            tools.run_bigquery_validation("SELECT 1 AS n", context)
+        )
+        self.assertEqual(
+            context.state["query_result"],
+            [{"n": len(f"SELECT 1 AS n LIMIT {tools.MAX_NUM_ROWS}")}],
+        )
+        self.assertEqual(
+            tools.run_bigquery_validation_sync("SELECT 1 AS n", self._context()),
+            async_result,
+        )
+        self.assertEqual(self.client.query.call_count, 2)
+
+    def test_errors_are_reported(self):
+        """Failed and disallowed queries are reported as invalid."""
+        self.client.query.side_effect = RuntimeError("Syntax error")
+        result = asyncio.run(
+            tools.run_bigquery_validation("SELEC 1", self._context())
+        )
+        self.assertEqual(result["error_message"], "Invalid SQL: Syntax error")
+
+        result = asyncio.run(
+            tools.run_bigquery_validation("DROP TABLE t", self._context())
+        )
+        self.assertIn("disallowed DML/DDL", result["error_message"])
+
+    def test_prompt_names_the_agent_tool(self):
+        """The instruction names the validation tool the agent has."""
+        tool_names = {tool.__name__ for tool in agent.database_agent.tools}
+        self.assertEqual(VALIDATION_TOOL_NAME, "run_bigquery_validation")
+        self.assertIn(VALIDATION_TOOL_NAME, tool_names)
+        self.assertIn(VALIDATION_TOOL_NAME, agent.database_agent.instruction)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test cases for the row-bounded fetch of the validated query results."""
+
+import asyncio
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pyarrow as pa
+
+from data_science.sub_agents.bigquery import tools
+from data_science.sub_agents.bigquery.result_cache import QueryResultCache
+
+TOTAL_ROWS = 1_000_000
+SQL = "SELECT n FROM `p.d.numbers` LIMIT 1000000"
+
+
+class FakeRowIterator:
+    """Stand-in for a `RowIterator` over a large result set.
+
+    Like BigQuery, it only downloads the rows up to `max_results`, and counts
+    them, so tests can assert on how many rows were downloaded.
+    """
+
+    schema = ["n"]
+    total_rows = TOTAL_ROWS
+
+    def __init__(self, max_results=None):
+        self._max_results = max_results or TOTAL_ROWS
+        self.fetched = 0
+
+    def to_arrow(self, **kwargs):
+        num_rows = min(self._max_results, TOTAL_ROWS)
+        self.fetched += num_rows
+        return pa.table({"n": pa.array(range(num_rows), type=pa.int64())})
+
+
+class TestBoundedFetch(unittest.TestCase):
+    """Test cases for the bounded fetch in `run_bigquery_validation`."""
+
+    def setUp(self):
+        """Set up for test methods."""
+        self.results = None
+        self.client = mock.Mock()
+        self.client.query.return_value.total_bytes_processed = 1024
+        self.client.query.return_value.done.return_value = True
+        self.client.query.return_value.result.side_effect = self._result
+        for name, value in (
+            ("get_bq_client", mock.Mock(return_value=self.client)),
+            ("result_cache", QueryResultCache()),
+        ):
+            patcher = mock.patch.object(tools, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _result(self, **kwargs):
+        self.results = FakeRowIterator(kwargs.get("max_results"))
+        return self.results
+
+    @staticmethod
+    def _context():
+        settings = {"all_bq_ddl_schemas": {}, "schema_version": "v1"}
+        return SimpleNamespace(state={"database_settings": settings})
+
+    def _assert_bounded(self, result):
+        self.assertEqual(len(result["query_result"]), tools.MAX_NUM_ROWS)
+        self.assertEqual(result["query_result"][-1], {"n": tools.MAX_NUM_ROWS - 1})
+        self.assertEqual(result["total_rows"], TOTAL_ROWS)
+        self.assertLessEqual(self.results.fetched, tools.MAX_NUM_ROWS)
+        self.client.query.return_value.result.assert_called_once_with(
+            max_results=tools.MAX_NUM_ROWS, page_size=tools.MAX_NUM_ROWS
+        )
+
+    def test_only_the_kept_rows_are_fetched(self):
+        """Large results are cut at the cap, and their size is reported."""
+        self._assert_bounded(tools.run_bigquery_validation_sync(SQL, self._context()))
+
+    def test_async_validation_fetch_is_bounded(self):
+        """The non-blocking validation fetches the same bounded rows."""
+        self._assert_bounded(
+            asyncio.run(tools.run_bigquery_validation(SQL, self._context()))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,246 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test cases for the context caches of the CHASE-SQL prompts."""
+
+import os
+import sys
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fake_context_cache import FakeClock, FakeContextCacheBackend
+from data_science.sub_agents.bigquery import tools
+from data_science.sub_agents.bigquery.chase_sql import chase_db_tools
+from data_science.sub_agents.bigquery.chase_sql.context_cache import (
+    ContextCacheManager,
+)
+from data_science.sub_agents.bigquery.schema_compactor import estimate_tokens
+
+TTL_SECONDS = 3600
+PREFIX = "Instructions and examples. " * 100
+
+
+class ContextCacheTestCase(unittest.TestCase):
+    """Runs each test against a fresh fake cache service."""
+
+    def setUp(self):
+        """Set up for test methods."""
+        self.clock = FakeClock()
+        self.backend = FakeContextCacheBackend(self.clock)
+        self.manager = ContextCacheManager(
+            self.backend,
+            ttl_seconds=TTL_SECONDS,
+            renew_before_seconds=300,
+            retry_seconds=600,
+            clock=self.clock,
+        )
+
+    def get_cache_name(self, schema_version="v1", model_name="m"):
+        return self.manager.get_cache_name(
+            model_name=model_name,
+            template_name="dc",
+            schema_version=schema_version,
+            render_prefix=lambda: f"{PREFIX}{schema_version}",
+        )
+
+
+class TestContextCacheManager(ContextCacheTestCase):
+    """Test cases for the lifecycle of the caches."""
+
+    def test_calls_on_the_same_schema_hit_one_cache(self):
+        """The prefix is cached once, and later calls only send the question."""
+        names = {self.get_cache_name() for _ in range(10)}
+        self.assertEqual(len(names), 1)
+        self.assertEqual(self.backend.calls["create"], 1)
+        self.assertEqual(self.manager.stats.hits, 9)
+        self.assertAlmostEqual(self.manager.stats.hit_rate, 0.9)
+        self.assertEqual(
+            self.manager.stats.saved_tokens, 9 * estimate_tokens(f"{PREFIX}v1")
+        )
+
+    def test_models_get_their_own_cache(self):
+        """Caches are bound to a model."""
+        self.assertNotEqual(
+            self.get_cache_name(model_name="a"), self.get_cache_name(model_name="b")
+        )
+
+    def test_cache_is_renewed_before_expiry(self):
+        """A cache used close to its expiry is renewed, not recreated."""
+        name = self.get_cache_name()
+        self.clock.advance(TTL_SECONDS - 100)
+        self.assertEqual(self.get_cache_name(), name)
+        self.assertEqual(self.backend.calls["renew"], 1)
+        self.clock.advance(200)
+        self.assertEqual(self.get_cache_name(), name)
+        self.assertEqual(self.backend.calls["create"], 1)
+        self.assertEqual(self.backend.live_caches(), [name])
+
+    def test_expired_cache_is_recreated(self):
+        """A cache unused until its expiry is created again."""
+        name = self.get_cache_name()
+        self.clock.advance(TTL_SECONDS)
+        self.assertNotEqual(self.get_cache_name(), name)
+        self.assertEqual(self.backend.calls["create"], 2)
+
+    def test_schema_change_replaces_the_cache(self):
+        """The cache of the previous schema is deleted."""
+        old_name = self.get_cache_name("v1")
+        new_name = self.get_cache_name("v2")
+        self.assertNotEqual(old_name, new_name)
+        self.assertEqual(self.backend.live_caches(), [new_name])
+        self.assertTrue(self.backend.caches[new_name]["prefix"].endswith("v2"))
+        self.assertEqual(self.manager.stats.invalidations, 1)
+
+    def test_unavailable_caching_falls_back_to_full_prompts(self):
+        """Creation is retried only after a while if it failed."""
+        self.backend.available = False
+        self.assertIsNone(self.get_cache_name())
+        self.assertIsNone(self.get_cache_name())
+        self.assertEqual(self.backend.calls["create"], 1)
+        self.assertEqual(self.manager.stats.fallbacks, 2)
+
+        self.backend.available = True
+        self.clock.advance(600)
+        self.assertIsNotNone(self.get_cache_name())
+        self.assertEqual(self.backend.calls["create"], 2)
+
+    def test_slow_creation_only_holds_up_its_prefix(self):
+        """Other prefixes are served while a cache is created."""
+        create = self.backend.create
+        creating, release = threading.Event(), threading.Event()
+
+        def slow_create(model_name, prefix, ttl_seconds):
+            if model_name == "slow":
+                creating.set()
+                release.wait(5)
+            return create(model_name, prefix, ttl_seconds)
+
+        with mock.patch.object(self.backend, "create", side_effect=slow_create):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                slow = [
+                    executor.submit(self.get_cache_name, model_name="slow")
+                    for _ in range(2)
+                ]
+                self.assertTrue(creating.wait(5))
+                # Not held up by the lock while the other call is in flight.
+                self.assertIsNotNone(self.get_cache_name(model_name="fast"))
+                release.set()
+                names = {future.result() for future in slow}
+        self.assertEqual(len(names), 1)
+        self.assertEqual(self.backend.calls["create"], 2)
+
+    def test_disabled_caching_does_not_call_the_service(self):
+        """A TTL of 0 disables the caching."""
+        manager = ContextCacheManager(self.backend, ttl_seconds=0)
+        self.assertIsNone(
+            manager.get_cache_name("m", "dc", "v1", lambda: PREFIX)
+        )
+        self.assertEqual(self.backend.calls["create"], 0)
+
+
+class TestChaseContextCache(ContextCacheTestCase):
+    """Test cases for the caching of the CHASE-SQL prompts."""
+
+    def setUp(self):
+        """Set up for test methods."""
+        super().setUp()
+        self.gemini_model = mock.Mock()
+        self.gemini_model.return_value.call_parallel.return_value = ["SELECT 1"]
+        for target, name, value in (
+            (chase_db_tools, "context_cache", self.manager),
+            (chase_db_tools, "GeminiModel", self.gemini_model),
+            (tools, "get_relevant_schema", mock.Mock(return_value="LINKED;")),
+        ):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.settings = {
+            "bq_data_project_id": "p",
+            "bq_dataset_id": "ds",
+            "all_bq_ddl_schemas": {"ds": "CREATE TABLE t;"},
+            "schema_version": "v1",
+            "transpile_to_bigquery": False,
+            "process_input_errors": True,
+            "process_tool_output_errors": True,
+            "number_of_candidates": 1,
+            "model": "m",
+            "temperature": 0.5,
+            "generate_sql_type": "dc",
+        }
+
+    def _sent_prompts(self):
+        return self.gemini_model.return_value.call_parallel.call_args.args[0]
+
+    def test_only_the_question_is_sent_with_a_cache(self):
+        """The instructions and schema are read from the cache."""
+        context = SimpleNamespace(state={"database_settings": self.settings})
+        chase_db_tools.initial_bq_nl2sql("How many rows?", context)
+
+        layout = chase_db_tools.PROMPT_LAYOUTS["dc"]
+        cache_name = self.backend.live_caches()[0]
+        self.assertIn("CREATE TABLE t;", self.backend.caches[cache_name]["prefix"])
+        self.assertEqual(
+            self._sent_prompts(),
+            [layout.render_question("How many rows?")],
+        )
+        self.gemini_model.assert_any_call(
+            model_name="m", temperature=0.5, cache_name=cache_name
+        )
+        self.assertLess(
+            estimate_tokens(self._sent_prompts()[0]),
+            estimate_tokens(layout.static_prefix) / 10,
+        )
+
+    def test_full_prompt_is_sent_without_a_cache(self):
+        """Without a cache, the prompt has the schema linked to the question."""
+        self.backend.available = False
+        context = SimpleNamespace(state={"database_settings": self.settings})
+        chase_db_tools.initial_bq_nl2sql("How many rows?", context)
+
+        (prompt,) = self._sent_prompts()
+        self.assertIn("LINKED;", prompt)
+        self.assertTrue(
+            prompt.rstrip().endswith(
+                "generating the SQL with Recursive Divide-and-Conquer."
+            )
+        )
+
+    def test_large_schemas_are_linked_instead_of_cached(self):
+        """Schemas over the token limit are linked to the question."""
+        self.settings["schema_token_count"] = (
+            chase_db_tools.CONTEXT_CACHE_MAX_SCHEMA_TOKENS + 1
+        )
+        context = SimpleNamespace(state={"database_settings": self.settings})
+        chase_db_tools.initial_bq_nl2sql("How many rows?", context)
+
+        (prompt,) = self._sent_prompts()
+        self.assertIn("LINKED;", prompt)
+        self.assertEqual(self.backend.calls["create"], 0)
+
+        # Unless linking is disabled, and all the tables are sent anyway.
+        with mock.patch.object(tools, "SCHEMA_LINKING_TOP_K", 0):
+            chase_db_tools.initial_bq_nl2sql("How many rows?", context)
+        self.assertEqual(
+            self._sent_prompts(),
+            [chase_db_tools.PROMPT_LAYOUTS["dc"].render_question("How many rows?")],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,536 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test cases for the lifecycle of the BigQuery database settings."""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pyarrow as pa
+
+from fake_bigquery import FakeBigQueryClient, FakeTable
+from data_science import tools as root_tools
+from data_science.sub_agents import db_agent
+from data_science.sub_agents.bigquery import tools
+from data_science.sub_agents.bigquery.agent import setup_before_agent_call
+from data_science.sub_agents.bigquery.result_cache import QueryResultCache
+from data_science.sub_agents.bigquery.schema_compactor import estimate_tokens
+from data_science.sub_agents.bigquery.sql_cache import SqlCache
+
+
+class DatabaseSettingsTestCase(unittest.TestCase):
+    """Runs each test against a fresh fake BigQuery client."""
+
+    def setUp(self):
+        """Set up for test methods."""
+        self.client = FakeBigQueryClient(num_tables=3, dataset="test")
+        env = mock.patch.dict(
+            os.environ,
+            {
+                "BQ_DATA_PROJECT_ID": self.client.project,
+                "BQ_COMPUTE_PROJECT_ID": self.client.project,
+                "BQ_DATASET_IDS": self.client.dataset,
+            },
+        )
+        env.start()
+        self.addCleanup(env.stop)
+        for name, value in (
+            ("bq_client", self.client),
+            ("_bq_credentials", mock.Mock(return_value=mock.Mock())),
+            ("database_settings", None),
+            ("_database_settings_snapshots", {}),
+            ("_database_schemas", {}),
+            ("_schema_indexes", {}),
+            ("SCHEMA_SNAPSHOT_DIR", None),
+            ("sql_cache", SqlCache(max_entries=8)),
+            ("result_cache", QueryResultCache()),
+        ):
+            patcher = mock.patch.object(tools, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(tools.stop_database_settings_refresh)
+
+
+class TestDatabaseSettingsRefresh(DatabaseSettingsTestCase):
+    """Test cases for the TTL-based background refresh."""
+
+    def test_refresh_is_disabled_by_default(self):
+        """Without a TTL, the settings are built once and never refreshed."""
+        with mock.patch.object(tools, "SCHEMA_REFRESH_TTL_SECONDS", 0):
+            tools.get_database_settings()
+        self.assertIsNone(tools._refresh_stop_event)
+
+    def test_background_refresh_swaps_in_new_tables(self):
+        """New tables show up after a TTL without blocking readers."""
+        with mock.patch.object(tools, "SCHEMA_REFRESH_TTL_SECONDS", 0.05):
+            settings = tools.get_database_settings()
+        self.assertNotIn("new_view", settings["all_bq_ddl_schemas"]["test"])
+
+        self.client.add_table(
+            FakeTable("new_view", table_type="VIEW", view_query="SELECT 1")
+        )
+        deadline = time.monotonic() + 5
+        while tools.get_database_settings() is settings:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+        new_settings = tools.get_database_settings()
+        self.assertIn("new_view", new_settings["all_bq_ddl_schemas"]["test"])
+        self.assertNotEqual(
+            settings["schema_version"], new_settings["schema_version"]
+        )
+        # The settings handed out before the swap are left untouched.
+        self.assertNotIn("new_view", settings["all_bq_ddl_schemas"]["test"])
+        # And so is their structured schema.
+        self.assertEqual(
+            tools.get_database_schema(settings).to_ddl_by_dataset(),
+            settings["all_bq_ddl_schemas"],
+        )
+        self.assertEqual(
+            tools.get_database_schema().to_ddl_by_dataset(),
+            new_settings["all_bq_ddl_schemas"],
+        )
+
+    def test_failed_refresh_keeps_previous_settings(self):
+        """A failing rebuild keeps serving the previous settings."""
+        with mock.patch.object(tools, "SCHEMA_REFRESH_TTL_SECONDS", 0.02):
+            settings = tools.get_database_settings()
+        with mock.patch.object(
+            self.client, "query", side_effect=RuntimeError("unavailable")
+        ):
+            time.sleep(0.1)
+            self.assertIs(tools.get_database_settings(), settings)
+
+
+class TestSchemaTokenBudget(DatabaseSettingsTestCase):
+    """Test cases for the compaction of the schema in the settings."""
+
+    def test_settings_report_schema_token_count(self):
+        """The settings report the token count of the DDL they hold."""
+        settings = tools.get_database_settings()
+        self.assertEqual(
+            settings["schema_token_count"],
+            tools.estimate_tokens(settings["all_bq_ddl_schemas"]["test"]),
+        )
+
+    def test_schema_is_compacted_to_budget(self):
+        """A token budget compacts the DDL, not the structured schema."""
+        full_settings = tools.update_database_settings()
+        budget = full_settings["schema_token_count"] // 2
+        with mock.patch.object(tools, "SCHEMA_TOKEN_BUDGET", budget):
+            settings = tools.update_database_settings()
+        self.assertLessEqual(settings["schema_token_count"], budget)
+        self.assertEqual(settings["schema_version"], full_settings["schema_version"])
+        self.assertEqual(
+            tools.get_database_schema(settings).to_ddl_by_dataset(),
+            full_settings["all_bq_ddl_schemas"],
+        )
+
+
+class TestSchemaLinking(DatabaseSettingsTestCase):
+    """Test cases for the relevant schema sent to the NL2SQL models."""
+
+    def test_only_linked_tables_are_sent(self):
+        """Large datasets are narrowed down to the tables of the question."""
+        settings = tools.get_database_settings()
+        with mock.patch.object(tools, "SCHEMA_LINKING_TOP_K", 1):
+            ddl = tools.get_relevant_schema("Scores of table_0001", settings)
+        self.assertIn("CREATE OR REPLACE TABLE `fake-project.test.table_0001`", ddl)
+        self.assertNotIn("table_0000", ddl)
+        self.assertNotIn("table_0002", ddl)
+
+    def test_small_or_unlinked_schemas_are_sent_in_full(self):
+        """All tables are sent if they fit top-k or if none is linked."""
+        settings = tools.get_database_settings()
+        full_ddl = settings["all_bq_ddl_schemas"]["test"]
+        with mock.patch.object(tools, "SCHEMA_LINKING_TOP_K", 3):
+            self.assertEqual(
+                tools.get_relevant_schema("Scores of table_0001", settings),
+                full_ddl,
+            )
+        with mock.patch.object(tools, "SCHEMA_LINKING_TOP_K", 2):
+            self.assertEqual(
+                tools.get_relevant_schema("Hello", settings), full_ddl
+            )
+
+
+class TestSessionState(DatabaseSettingsTestCase):
+    """Test cases for the database settings referred to by session states."""
+
+    def test_session_state_does_not_grow_with_the_schema(self):
+        """Sessions only hold the schema version, whatever the schema size."""
+        context = SimpleNamespace(state={})
+        asyncio.run(setup_before_agent_call(context))
+        small_state = json.dumps(context.state)
+
+        self.client = FakeBigQueryClient(num_tables=50, dataset="test")
+        with (
+            mock.patch.object(tools, "bq_client", self.client),
+            mock.patch.object(tools, "database_settings", None),
+        ):
+            context = SimpleNamespace(state={})
+            asyncio.run(setup_before_agent_call(context))
+            self.assertEqual(len(json.dumps(context.state)), len(small_state))
+            self.assertEqual(
+                tools.resolve_database_settings(
+                    context.state["database_settings"]
+                ),
+                tools.get_database_settings(),
+            )
+
+    def test_unknown_versions_resolve_to_the_current_settings(self):
+        """References from another process fall back to the current settings."""
+        settings = tools.get_database_settings()
+        self.assertIs(
+            tools.resolve_database_settings({"schema_version": "unknown"}),
+            settings,
+        )
+        # Settings stored by value are used as they are.
+        by_value = dict(settings)
+        self.assertIs(tools.resolve_database_settings(by_value), by_value)
+
+    def test_sessions_get_the_schema_of_their_question(self):
+        """The relevant schema of a question is neither shared nor stored."""
+        settings = tools.get_database_settings()
+        llm_client = mock.Mock()
+        llm_client.models.generate_content.return_value = SimpleNamespace(
+            text="SELECT 1"
+        )
+        contexts = [
+            SimpleNamespace(
+                state={"database_settings": tools.database_settings_ref(settings)}
+            )
+            for _ in range(2)
+        ]
+        with (
+            mock.patch.object(tools, "llm_client", llm_client),
+            mock.patch.object(tools, "SCHEMA_LINKING_TOP_K", 1),
+        ):
+            tools.initial_bq_nl2sql("Scores of table_0000", contexts[0])
+            tools.initial_bq_nl2sql("Scores of table_0002", contexts[1])
+
+        first, second = (
+            call.kwargs["contents"]
+            for call in llm_client.models.generate_content.call_args_list
+        )
+        self.assertIn("table_0000", first)
+        self.assertNotIn("table_0002", first)
+        self.assertIn("table_0002", second)
+        self.assertNotIn("table_0000", second)
+        for context in contexts:
+            self.assertEqual(
+                context.state["database_settings"],
+                tools.database_settings_ref(settings),
+            )
+
+
+class TestDatabaseAgentRequest(DatabaseSettingsTestCase):
+    """Token accounting of the calls of the root agent to the database agent."""
+
+    def _db_agent_input_tokens(self, question):
+        """Returns the tokens of the input and session of the database agent."""
+        agent_tool = mock.Mock()
+        agent_tool.return_value.run_async = mock.AsyncMock(return_value="ok")
+        settings_ref = tools.database_settings_ref(tools.get_database_settings())
+        context = SimpleNamespace(
+            state={
+                "all_db_settings": {"use_database": "BigQuery"},
+                "database_settings": settings_ref,
+            }
+        )
+        with mock.patch.object(root_tools, "AgentTool", agent_tool):
+            asyncio.run(root_tools.call_db_agent(question, context))
+        args = agent_tool.return_value.run_async.call_args.kwargs["args"]
+        # Without an input schema, `AgentTool` sends the request as the user
+        # message, and copies the session state into the session of the agent.
+        self.assertIsNone(db_agent.input_schema)
+        user_message = args["request"]
+        agent_state = json.dumps(context.state)
+        self.assertNotIn("CREATE", user_message + agent_state)
+        return estimate_tokens(user_message) + estimate_tokens(agent_state)
+
+    def test_schema_is_not_sent_to_the_database_agent(self):
+        """The input of the database agent does not grow with the schema."""
+        small_tokens = self._db_agent_input_tokens("How many rows?")
+
+        self.client = FakeBigQueryClient(num_tables=50, dataset="test")
+        with (
+            mock.patch.object(tools, "bq_client", self.client),
+            mock.patch.object(tools, "database_settings", None),
+        ):
+            large_tokens = self._db_agent_input_tokens("How many rows?")
+            schema_tokens = tools.get_database_settings()["schema_token_count"]
+        self.assertEqual(large_tokens, small_tokens)
+        self.assertLess(large_tokens, 0.01 * schema_tokens)
+
+
+class TestSqlCache(DatabaseSettingsTestCase):
+    """Test cases for the reuse of the SQL of repeated questions."""
+
+    def setUp(self):
+        """Set up for test methods."""
+        super().setUp()
+        self.settings_ref = tools.database_settings_ref(
+            tools.get_database_settings()
+        )
+        self.llm_client = mock.Mock()
+        self.llm_client.models.generate_content.return_value = SimpleNamespace(
+            text="SELECT country FROM `fake-project.test.table_0000`"
+        )
+        self.results = mock.MagicMock()
+        self.results.schema = ["country"]
+        self.results.total_rows = 1
+        self.results.to_arrow.return_value = pa.table({"country": ["MX"]})
+        validation_client = mock.Mock()
+        validation_client.query.return_value.result.return_value = self.results
+        validation_client.query.return_value.total_bytes_processed = 1024
+        for name, value in (
+            ("llm_client", self.llm_client),
+            ("get_bq_client", mock.Mock(return_value=validation_client)),
+        ):
+            patcher = mock.patch.object(tools, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _answer(self, question):
+        """Generates and validates the SQL of a question in a new session."""
+        context = SimpleNamespace(state={"database_settings": self.settings_ref})
+        sql = tools.initial_bq_nl2sql(question, context)
+        result = tools.run_bigquery_validation_sync(sql, context)
+        return sql, result
+
+    def test_validated_sql_is_reused(self):
+        """Repeated questions skip the generation."""
+        sql, result = self._answer("What countries are in test?")
+        self.assertEqual(result["query_result"], [{"country": "MX"}])
+        self.assertEqual(self._answer("what countries are in test")[0], sql)
+        self.assertEqual(self.llm_client.models.generate_content.call_count, 1)
+        self.assertEqual(tools.sql_cache.stats.exact_hits, 1)
+
+    def test_sessions_with_settings_stored_by_value(self):
+        """Settings stored before the schema versions are still served."""
+        self.settings_ref = {
+            key: value
+            for key, value in tools.get_database_settings().items()
+            if key != "schema_version"
+        }
+        sql, result = self._answer("What countries are in test?")
+        self.assertEqual(result["query_result"], [{"country": "MX"}])
+        self.assertEqual(self._answer("What countries are in test?")[0], sql)
+        self.assertEqual(self.llm_client.models.generate_content.call_count, 1)
+
+    def test_invalid_sql_is_not_cached(self):
+        """SQL failing the validation is generated again."""
+        self.results.to_arrow.side_effect = RuntimeError("Unrecognized name")
+        self.assertIn("Invalid SQL", self._answer("Countries?")[1]["error_message"])
+        self._answer("Countries?")
+        self.assertEqual(self.llm_client.models.generate_content.call_count, 2)
+        self.assertEqual(tools.sql_cache.stats.admissions, 0)
+
+
+class TestWarmup(DatabaseSettingsTestCase):
+    """Test cases for the startup warm-up."""
+
+    def setUp(self):
+        """Set up for test methods."""
+        super().setUp()
+        self.client.latency = 0.01
+        self.llm_client = mock.Mock()
+        for name, value in (
+            ("_warmup_thread", None),
+            ("_warmup_done", threading.Event()),
+            ("llm_client", self.llm_client),
+        ):
+            patcher = mock.patch.object(tools, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_warmup_builds_settings_in_background(self):
+        """The warm-up builds the settings the first turn then reuses."""
+        self.assertFalse(tools.is_ready())
+        with mock.patch.dict(os.environ, {"BASELINE_NL2SQL_MODEL": "m"}):
+            tools.start_warmup()
+            tools.start_warmup()
+            # A first turn during the warm-up joins its settings build.
+            settings = tools.get_database_settings()
+            self.assertTrue(tools.wait_until_ready(timeout=5))
+        self.assertIs(tools.get_database_settings(), settings)
+        self.assertEqual(self.client.calls["get_table"], len(self.client.tables))
+        self.llm_client.models.get.assert_called_once_with(model="m")
+
+    def test_failed_warmup_is_not_ready(self):
+        """A failed warm-up completes, but does not report ready."""
+        with mock.patch.object(
+            tools, "update_database_settings", side_effect=RuntimeError("down")
+        ):
+            tools.start_warmup()
+            self.assertFalse(tools.wait_until_ready(timeout=5))
+        self.assertTrue(tools._warmup_done.is_set())
+        self.assertIsNotNone(tools.get_database_settings())
+        self.assertTrue(tools.is_ready())
+
+
+class TestSingleFlightInitialization(DatabaseSettingsTestCase):
+    """Stress tests for the lazy initialization on a cold instance."""
+
+    NUM_SESSIONS = 50
+
+    def setUp(self):
+        """Set up for test methods."""
+        super().setUp()
+        self.client.latency = 0.01
+
+    def _count_introspections(self):
+        # Every introspection lists the tables of the dataset exactly once.
+        return self.client.calls["get_table"] // len(self.client.tables)
+
+    def test_concurrent_threads_share_one_introspection(self):
+        """Concurrent threaded first calls run a single introspection."""
+        with ThreadPoolExecutor(max_workers=self.NUM_SESSIONS) as executor:
+            futures = [
+                executor.submit(tools.get_database_settings)
+                for _ in range(self.NUM_SESSIONS)
+            ]
+            settings = [future.result() for future in futures]
+        self.assertEqual(self._count_introspections(), 1)
+        self.assertTrue(all(s is settings[0] for s in settings))
+
+    def test_concurrent_first_turns_share_one_introspection(self):
+        """Concurrent first turns of the database agent share one build."""
+        contexts = [SimpleNamespace(state={}) for _ in range(self.NUM_SESSIONS)]
+
+        async def run_first_turns():
+            await asyncio.gather(
+                *(setup_before_agent_call(context) for context in contexts)
+            )
+
+        asyncio.run(run_first_turns())
+        self.assertEqual(self._count_introspections(), 1)
+        settings_ref = tools.database_settings_ref(tools.get_database_settings())
+        self.assertTrue(
+            all(c.state["database_settings"] == settings_ref for c in contexts)
+        )
+
+    def test_threads_and_coroutines_share_one_introspection(self):
+        """Threaded and asyncio callers join the same in-flight build."""
+
+        async def run_coroutines():
+            return await asyncio.gather(
+                *(tools.get_database_settings_async() for _ in range(10))
+            )
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            futures = [
+                executor.submit(tools.get_database_settings) for _ in range(10)
+            ]
+            settings = asyncio.run(run_coroutines())
+            settings += [future.result() for future in futures]
+        self.assertEqual(self._count_introspections(), 1)
+        self.assertTrue(all(s is settings[0] for s in settings))
+
+    def test_concurrent_threads_share_one_client(self):
+        """Concurrent first calls create a single BigQuery client."""
+
+        def make_client(*args, **kwargs):  # pylint: disable=unused-argument
+            time.sleep(0.05)
+            return self.client
+
+        with mock.patch.object(tools, "bq_client", None), mock.patch.object(
+            tools.bigquery, "Client", side_effect=make_client
+        ) as client_factory:
+            with ThreadPoolExecutor(max_workers=self.NUM_SESSIONS) as executor:
+                clients = list(
+                    executor.map(
+                        lambda _: tools.get_bq_client(), range(self.NUM_SESSIONS)
+                    )
+                )
+        self.assertEqual(client_factory.call_count, 1)
+        self.assertTrue(all(c is self.client for c in clients))
+        self.assertIs(
+            client_factory.call_args.kwargs["credentials"],
+            tools._bq_credentials.return_value,
+        )
+
+    def test_concurrent_updates_keep_the_registries_consistent(self):
+        """Refreshes racing with each other and with readers evict cleanly."""
+        versions = iter(range(1000))
+        with mock.patch.object(
+            tools, "_get_schema_version", side_effect=lambda _: f"v{next(versions)}"
+        ):
+            with ThreadPoolExecutor(max_workers=self.NUM_SESSIONS) as executor:
+                futures = [
+                    executor.submit(tools.update_database_settings)
+                    for _ in range(20)
+                ] + [
+                    executor.submit(
+                        tools.get_schema_index, {"schema_version": "v0"}
+                    )
+                    for _ in range(20)
+                ]
+                for future in futures:
+                    future.result()
+        registered = set(tools._database_schemas)
+        self.assertLessEqual(len(registered), tools._MAX_DATABASE_SCHEMAS)
+        self.assertEqual(set(tools._schema_indexes), registered)
+        self.assertEqual(set(tools._database_settings_snapshots), registered)
+        self.assertIn(tools.database_settings["schema_version"], registered)
+
+    def test_settings_are_published_once_registered(self):
+        """Callers never get settings whose schema is not registered yet."""
+        build_index = tools.SchemaIndex
+        index_started = threading.Event()
+
+        def slow_index(database_schema):
+            index_started.set()
+            time.sleep(0.2)
+            return build_index(database_schema)
+
+        with mock.patch.object(tools, "SchemaIndex", side_effect=slow_index):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                build = executor.submit(tools.get_database_settings)
+                self.assertTrue(index_started.wait(5))
+                self.assertIsNone(tools.database_settings)
+                settings = tools.get_database_settings()
+                self.assertIs(build.result(), settings)
+        self.assertEqual(self._count_introspections(), 1)
+        self.assertIs(
+            tools.resolve_database_settings(
+                tools.database_settings_ref(settings)
+            ),
+            settings,
+        )
+        self.assertIsNotNone(tools.get_schema_index(settings))
+
+    def test_failed_build_is_retried_by_next_caller(self):
+        """An exception is shared by waiters, and the next call retries."""
+        with mock.patch.object(
+            tools, "update_database_settings", side_effect=RuntimeError("boom")
+        ):
+            with self.assertRaises(RuntimeError):
+                tools.get_database_settings()
+        self.assertIsNotNone(tools.get_database_settings())
+
+
+if __name__ == "__main__":
+    unittest.main()
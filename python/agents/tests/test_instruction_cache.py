@@ -0,0 +1,119 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test cases for the instruction cache."""
+
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from data_science import agent as root_agent_module
+from data_science.sub_agents.bqml import agent as bqml_agent_module
+from data_science.utils.instruction_cache import InstructionCache
+
+
+def _make_settings(schema_version, ddl="CREATE TABLE t (x INT64);"):
+    return {"schema_version": schema_version, "all_bq_ddl_schemas": {"ds": ddl}}
+
+
+class TestInstructionCache(unittest.TestCase):
+    """Test cases for `InstructionCache`."""
+
+    def setUp(self):
+        """Set up for test methods."""
+        self.cache = InstructionCache(max_entries=2)
+        self.render = mock.Mock(
+            side_effect=lambda settings: f"schema {settings['schema_version']}"
+        )
+
+    def test_instruction_is_rendered_once_per_version(self):
+        """Turns and sessions on the same schema reuse the instruction."""
+        provider = self.cache.provider("agent", self.render, lambda: "default")
+        for _ in range(3):
+            for settings in (_make_settings("v1"), _make_settings("v1")):
+                self.assertEqual(
+                    provider(SimpleNamespace(state={"database_settings": settings})),
+                    "schema v1",
+                )
+        self.assertEqual(self.render.call_count, 1)
+
+        provider(SimpleNamespace(state={"database_settings": _make_settings("v2")}))
+        self.assertEqual(self.render.call_count, 2)
+
+    def test_agents_are_cached_separately(self):
+        """Each agent gets its own instruction for the same schema."""
+        settings = _make_settings("v1")
+        self.cache.get("a", settings, self.render)
+        self.cache.get("b", settings, lambda _: "other")
+        self.assertEqual(self.cache.get("a", settings, self.render), "schema v1")
+        self.assertEqual(self.cache.get("b", settings, self.render), "other")
+        self.assertEqual(self.render.call_count, 1)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """Only `max_entries` instructions are kept."""
+        for version in ("v1", "v2", "v1", "v3"):
+            self.cache.get("agent", _make_settings(version), self.render)
+        self.assertEqual(self.render.call_count, 3)
+        self.cache.get("agent", _make_settings("v1"), self.render)
+        self.assertEqual(self.render.call_count, 3)
+        self.cache.get("agent", _make_settings("v2"), self.render)
+        self.assertEqual(self.render.call_count, 4)
+
+    def test_instruction_is_cached_under_the_resolved_version(self):
+        """A fallback to other settings does not cache them under the old key."""
+        snapshots = {"v2": _make_settings("v2")}
+
+        def resolve(reference):
+            # "v1" is no longer available, and resolves to the current "v2".
+            return snapshots.get(reference["schema_version"], snapshots["v2"])
+
+        provider = self.cache.provider(
+            "agent", self.render, lambda: "default", resolve=resolve
+        )
+        old = SimpleNamespace(state={"database_settings": {"schema_version": "v1"}})
+        self.assertEqual(provider(old), "schema v2")
+
+        # Once "v1" is available again, it is rendered from its own settings.
+        snapshots["v1"] = _make_settings("v1")
+        self.assertEqual(provider(old), "schema v1")
+        new = SimpleNamespace(state={"database_settings": {"schema_version": "v2"}})
+        self.assertEqual(provider(new), "schema v2")
+        self.assertEqual(self.render.call_count, 2)
+
+    def test_default_instruction_without_settings(self):
+        """Sessions without database settings get the default instruction."""
+        provider = self.cache.provider("agent", self.render, lambda: "default")
+        self.assertEqual(provider(SimpleNamespace(state={})), "default")
+        self.render.assert_not_called()
+
+
+class TestAgentInstructions(unittest.TestCase):
+    """Test cases for the instructions of the root and BQML agents."""
+
+    def test_instructions_embed_the_schema(self):
+        """The root and BQML instructions embed the DDL of all datasets."""
+        settings = _make_settings("v-test", ddl="CREATE TABLE `p.ds.t` (x INT64);")
+        context = SimpleNamespace(state={"database_settings": settings})
+        for agent in (root_agent_module.root_agent, bqml_agent_module.root_agent):
+            instruction = agent.instruction(context)
+            self.assertIn("CREATE TABLE `p.ds.t` (x INT64);", instruction)
+            self.assertIs(agent.instruction(context), instruction)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test cases for the prefix-stable layout of the NL2SQL prompts."""
+
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from data_science.sub_agents.bigquery import tools
+from data_science.sub_agents.bigquery.chase_sql import chase_db_tools
+from data_science.sub_agents.bigquery.chase_sql.dc_prompt_template import (
+    DC_PROMPT_TEMPLATE,
+)
+from data_science.sub_agents.bigquery.chase_sql.qp_prompt_template import (
+    QP_PROMPT_TEMPLATE,
+)
+from data_science.sub_agents.bigquery.prompt_layout import PromptLayout
+
+SCHEMA = "CREATE TABLE `p.ds.t` (\n  `x` INT64\n);\n"
+QUESTION = "How many rows have x = {1}?"
+
+
+class TestPromptLayout(unittest.TestCase):
+    """Test cases for `PromptLayout`."""
+
+    def test_prompts_are_unchanged(self):
+        """The compiled layouts render the same prompts as the templates."""
+        project = chase_db_tools.BQ_DATA_PROJECT_ID
+        cases = (
+            (
+                tools.BASELINE_PROMPT_LAYOUT,
+                tools.BASELINE_PROMPT_TEMPLATE,
+                {"MAX_NUM_ROWS": tools.MAX_NUM_ROWS},
+            ),
+            (
+                chase_db_tools.PROMPT_LAYOUTS["dc"],
+                DC_PROMPT_TEMPLATE,
+                {"BQ_DATA_PROJECT_ID": project},
+            ),
+            (
+                chase_db_tools.PROMPT_LAYOUTS["qp"],
+                QP_PROMPT_TEMPLATE,
+                {"BQ_DATA_PROJECT_ID": project},
+            ),
+        )
+        for layout, template, constants in cases:
+            self.assertEqual(
+                layout.render(SCHEMA, QUESTION),
+                template.format(SCHEMA=SCHEMA, QUESTION=QUESTION, **constants),
+            )
+
+    def test_prompts_share_their_static_prefix(self):
+        """Prompts of other schemas and questions start with the same text."""
+        layout = chase_db_tools.PROMPT_LAYOUTS["dc"]
+        first = layout.render(SCHEMA, QUESTION)
+        second = layout.render("CREATE TABLE `p.ds.u` (y INT64);", "Count u")
+        self.assertTrue(first.startswith(layout.static_prefix))
+        self.assertTrue(second.startswith(layout.static_prefix))
+        self.assertNotIn("{BQ_DATA_PROJECT_ID}", layout.static_prefix)
+        self.assertGreater(len(layout.static_prefix), 0.9 * len(first))
+
+    def test_placeholders_in_values_are_not_replaced(self):
+        """A schema or question containing placeholders is sent verbatim."""
+        layout = PromptLayout.compile("Use {A}.\n{SCHEMA}\nQ: {QUESTION}\n", A="a")
+        self.assertEqual(
+            layout.render("{QUESTION}", "{SCHEMA}"),
+            "Use a.\n{QUESTION}\nQ: {SCHEMA}\n",
+        )
+
+    def test_schema_must_come_before_the_question(self):
+        """Templates without a stable prefix are rejected."""
+        with self.assertRaises(ValueError):
+            PromptLayout.compile("{QUESTION}\n{SCHEMA}")
+
+
+if __name__ == "__main__":
+    unittest.main()
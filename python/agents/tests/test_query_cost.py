@@ -0,0 +1,132 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test cases for the dry run and bytes limit of the validated queries."""
+
+import asyncio
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pyarrow as pa
+
+from data_science.sub_agents.bigquery import tools
+from data_science.sub_agents.bigquery.result_cache import QueryResultCache
+
+MAX_BYTES_BILLED = 1000
+SQL = "SELECT country FROM `p.d.orders` LIMIT 10"
+
+
+class TestQueryCost(unittest.TestCase):
+    """Test cases for the two phases of the query validation."""
+
+    def setUp(self):
+        """Set up for test methods."""
+        self.bytes_processed = 100
+        self.dry_run_error = None
+        self.client = mock.Mock()
+        self.client.query.side_effect = self._query
+        self.results = mock.MagicMock()
+        self.results.schema = ["country"]
+        self.results.total_rows = 1
+        self.results.to_arrow.return_value = pa.table({"country": ["MX"]})
+        for name, value in (
+            ("get_bq_client", mock.Mock(return_value=self.client)),
+            ("result_cache", QueryResultCache()),
+            ("VALIDATION_MAX_BYTES_BILLED", MAX_BYTES_BILLED),
+        ):
+            patcher = mock.patch.object(tools, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _query(self, sql, job_config):
+        """Runs a fake query job, or a dry run of it."""
+        job = mock.Mock()
+        if job_config.dry_run:
+            if self.dry_run_error:
+                raise self.dry_run_error
+            job.total_bytes_processed = self.bytes_processed
+        else:
+            job.done.return_value = True
+            job.result.return_value = self.results
+        return job
+
+    def _executed_job_configs(self):
+        return [
+            call.kwargs["job_config"]
+            for call in self.client.query.call_args_list
+            if not call.kwargs["job_config"].dry_run
+        ]
+
+    def _validate(self, sql=SQL):
+        settings = {"all_bq_ddl_schemas": {}, "schema_version": "v1"}
+        context = SimpleNamespace(state={"database_settings": settings})
+        return tools.run_bigquery_validation_sync(sql, context)
+
+    def test_queries_within_budget_run_with_the_limit(self):
+        """Cheap queries are dry run, then run with a bytes limit."""
+        result = self._validate()
+        self.assertEqual(result["query_result"], [{"country": "MX"}])
+        self.assertEqual(self.client.query.call_count, 2)
+        (job_config,) = self._executed_job_configs()
+        self.assertEqual(job_config.maximum_bytes_billed, MAX_BYTES_BILLED)
+
+    def test_over_budget_queries_do_not_run(self):
+        """Expensive queries return a structured message instead of rows."""
+        self.bytes_processed = 5 * MAX_BYTES_BILLED
+        result = self._validate()
+        self.assertIsNone(result["query_result"])
+        self.assertTrue(result["error_message"].startswith("Query too expensive"))
+        self.assertIn("Narrow it down", result["error_message"])
+        self.assertEqual(result["total_bytes_processed"], 5 * MAX_BYTES_BILLED)
+        self.assertEqual(result["maximum_bytes_billed"], MAX_BYTES_BILLED)
+        self.assertEqual(self._executed_job_configs(), [])
+
+        # The agent can narrow the query down once the budget allows it.
+        self.bytes_processed = MAX_BYTES_BILLED
+        self.assertIsNotNone(self._validate()["query_result"])
+
+    def test_invalid_queries_only_dry_run(self):
+        """Errors reported by the dry run do not cost a run."""
+        self.dry_run_error = RuntimeError("Unrecognized name: cuntry")
+        result = self._validate()
+        self.assertEqual(
+            result["error_message"], "Invalid SQL: Unrecognized name: cuntry"
+        )
+        self.assertEqual(self.client.query.call_count, 1)
+
+    def test_async_validation_checks_the_cost(self):
+        """The non-blocking validation also dry runs the queries first."""
+        self.bytes_processed = 5 * MAX_BYTES_BILLED
+        settings = {"all_bq_ddl_schemas": {}, "schema_version": "v1"}
+        context = SimpleNamespace(state={"database_settings": settings})
+        result = asyncio.run(tools.run_bigquery_validation(SQL, context))
+        self.assertTrue(result["error_message"].startswith("Query too expensive"))
+        self.assertEqual(self._executed_job_configs(), [])
+
+    def test_limit_can_be_disabled(self):
+        """A limit of 0 runs all the valid queries, without a bytes limit."""
+        self.bytes_processed = 5 * MAX_BYTES_BILLED
+        with mock.patch.object(tools, "VALIDATION_MAX_BYTES_BILLED", 0):
+            self.assertIsNotNone(self._validate()["query_result"])
+        (job_config,) = self._executed_job_configs()
+        self.assertIsNone(job_config.maximum_bytes_billed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test cases for the cache of the query results."""
+
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pyarrow as pa
+
+from fake_context_cache import FakeClock
+from data_science.sub_agents.bigquery import tools
+from data_science.sub_agents.bigquery.result_cache import (
+    QueryResultCache,
+    canonical_sql,
+)
+
+SQL = (
+    "SELECT o.country, COUNT(*) AS n FROM `p.d.orders` AS o"
+    " WHERE o.status = 'shipped' GROUP BY o.country"
+)
+
+
+class TestCanonicalSql(unittest.TestCase):
+    """Test cases for `canonical_sql`."""
+
+    def test_reformatted_queries_are_equal(self):
+        """Spaces, keyword case and table aliases do not matter."""
+        reformatted = """
+            select x.country,   count(*) as n
+            from `p.d.orders` x
+            where x.status = 'shipped'
+            group by x.country
+        """
+        self.assertEqual(canonical_sql(reformatted), canonical_sql(SQL))
+
+    def test_table_aliases_are_case_insensitive(self):
+        """Aliases differing in case only are renamed together."""
+        mixed_case = SQL.replace("AS o", "AS O").replace("o.status", "O.status")
+        self.assertEqual(canonical_sql(mixed_case), canonical_sql(SQL))
+        self.assertNotIn("O.", canonical_sql(mixed_case))
+
+    def test_different_queries_differ(self):
+        """Literals and result column names matter."""
+        self.assertNotEqual(
+            canonical_sql(SQL.replace("'shipped'", "'SHIPPED'")),
+            canonical_sql(SQL),
+        )
+        self.assertNotEqual(
+            canonical_sql(SQL.replace("AS n", "AS total")), canonical_sql(SQL)
+        )
+
+    def test_non_deterministic_queries_are_not_cached(self):
+        """Queries using the current time or random values are not cached."""
+        for sql in (
+            "SELECT * FROM `p.d.t` WHERE d = CURRENT_DATE()",
+            "SELECT RAND() AS r",
+            "SELECT GENERATE_UUID() AS id",
+        ):
+            self.assertIsNone(canonical_sql(sql), sql)
+
+
+class TestQueryResultCache(unittest.TestCase):
+    """Test cases for `QueryResultCache`."""
+
+    def setUp(self):
+        """Set up for test methods."""
+        self.clock = FakeClock()
+        self.result = {"query_result": [{"n": 1}], "error_message": None}
+
+    def test_schema_version_is_part_of_the_key(self):
+        """Results of another schema version are not reused."""
+        self.assertNotEqual(
+            QueryResultCache.key(SQL, "v1"), QueryResultCache.key(SQL, "v2")
+        )
+
+    def test_least_recently_used_results_are_evicted_by_size(self):
+        """The cache holds at most `max_bytes` of results."""
+        # Room for two results of 72 bytes.
+        cache = QueryResultCache(max_bytes=150, clock=self.clock)
+        result = {"query_result": [{"x": "a" * 20}], "error_message": None}
+        for key in ("a", "b", "a", "c"):
+            if cache.get(key) is None:
+                cache.put(key, result)
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertLessEqual(cache.stats.size_bytes, 150)
+
+        cache.put("big", {"query_result": [{"x": "a" * 200}]})
+        self.assertIsNone(cache.get("big"))
+
+    def test_sessions_get_their_own_copy(self):
+        """Changing a returned or cached result leaves the cache unchanged."""
+        cache = QueryResultCache(clock=self.clock)
+        cache.put("a", self.result)
+        self.result["query_result"].append({"n": 2})
+        first = cache.get("a")
+        first["query_result"][0]["n"] = 3
+        self.assertEqual(
+            cache.get("a"), {"query_result": [{"n": 1}], "error_message": None}
+        )
+
+    def test_results_expire(self):
+        """Results are evicted after their TTL."""
+        cache = QueryResultCache(ttl_seconds=60, clock=self.clock)
+        cache.put("a", self.result)
+        self.clock.advance(59)
+        self.assertEqual(cache.get("a"), self.result)
+        self.clock.advance(1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats.size_bytes, 0)
+
+
+class TestValidationResultCache(unittest.TestCase):
+    """Test cases for the results reused by `run_bigquery_validation`."""
+
+    def setUp(self):
+        """Set up for test methods."""
+        self.client = mock.Mock()
+        results = mock.MagicMock()
+        results.schema = ["country", "n"]
+        results.total_rows = 1
+        results.to_arrow.return_value = pa.table({"country": ["MX"], "n": [3]})
+        self.client.query.return_value.result.return_value = results
+        self.client.query.return_value.total_bytes_processed = 1024
+        for name, value in (
+            ("get_bq_client", mock.Mock(return_value=self.client)),
+            ("result_cache", QueryResultCache()),
+        ):
+            patcher = mock.patch.object(tools, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _validate(self, sql, schema_version="v1"):
+        settings = {"all_bq_ddl_schemas": {}, "schema_version": schema_version}
+        context = SimpleNamespace(state={"database_settings": settings})
+        return tools.run_bigquery_validation_sync(sql, context), context
+
+    def test_retried_queries_are_answered_from_memory(self):
+        """Reformatted queries of the same schema run once."""
+        first, _ = self._validate(SQL)
+        retried, context = self._validate(
+            SQL.lower().replace("as o", "t").replace("o.", "t.")
+        )
+        self.assertEqual(retried, first)
+        self.assertEqual(context.state["query_result"], first["query_result"])
+        # One dry run and one run.
+        self.assertEqual(self.client.query.call_count, 2)
+        job_config = self.client.query.call_args.kwargs["job_config"]
+        self.assertTrue(job_config.use_query_cache)
+
+        self._validate(SQL, schema_version="v2")
+        self.assertEqual(self.client.query.call_count, 4)
+
+    def test_failed_queries_are_not_cached(self):
+        """Errors are not cached, as they may be transient."""
+        self.client.query.side_effect = RuntimeError("Quota exceeded")
+        self.assertIn("Invalid SQL", self._validate(SQL)[0]["error_message"])
+        self._validate(SQL)
+        self.assertEqual(self.client.query.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test cases and microbenchmark for the query results conversion."""
+
+import datetime
+import decimal
+import os
+import sys
+import time
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pyarrow as pa
+
+from data_science.sub_agents.bigquery import tools
+
+_UTC = datetime.timezone.utc
+
+# One generator of (type, values) per BigQuery column type.
+_COLUMN_KINDS = [
+    lambda n: (pa.int64(), [None if i % 3 == 0 else i * 7 for i in range(n)]),
+    lambda n: (pa.int64(), [i for i in range(n)]),
+    lambda n: (pa.float64(), [None if i % 4 == 0 else i / 4 for i in range(n)]),
+    lambda n: (pa.float64(), [i / 3 for i in range(n)]),
+    lambda n: (pa.string(), [None if i % 5 == 0 else f"it's {i}" for i in range(n)]),
+    lambda n: (pa.bool_(), [None if i % 3 == 0 else bool(i % 2) for i in range(n)]),
+    lambda n: (pa.bool_(), [bool(i % 2) for i in range(n)]),
+    lambda n: (
+        pa.date32(),
+        [None if i % 7 == 0 else datetime.date(2024, 1, 1 + i % 28) for i in range(n)],
+    ),
+    lambda n: (
+        pa.timestamp("us", tz="UTC"),
+        [datetime.datetime(2024, 1, 1, i % 24, 0, 0, tzinfo=_UTC) for i in range(n)],
+    ),
+    lambda n: (
+        pa.timestamp("us"),
+        [None if i % 2 else datetime.datetime(2024, 3, 1, i % 24) for i in range(n)],
+    ),
+    lambda n: (
+        pa.decimal128(38, 9),
+        [None if i % 6 == 0 else decimal.Decimal(f"{i}.1") / 4 for i in range(n)],
+    ),
+    lambda n: (pa.time64("us"), [datetime.time(i % 24, 30) for i in range(n)]),
+    lambda n: (pa.list_(pa.int64()), [[i, i + 1] for i in range(n)]),
+    lambda n: (
+        pa.struct([("a", pa.int64()), ("b", pa.string())]),
+        [None if i % 3 == 0 else {"a": i, "b": f"x{i}"} for i in range(n)],
+    ),
+]
+
+
+def _make_table(num_columns, num_rows):
+    """Returns a synthetic Arrow table cycling through the column types."""
+    columns, fields = [], []
+    for i in range(num_columns):
+        arrow_type, values = _COLUMN_KINDS[i % len(_COLUMN_KINDS)](num_rows)
+        columns.append(pa.array(values, type=arrow_type))
+        fields.append(pa.field(f"col_{i}", arrow_type))
+    return pa.Table.from_arrays(columns, schema=pa.schema(fields))
+
+
+def _legacy_rows_from_results(rows):
+    """The former row-wise conversion of the `RowIterator` rows."""
+    return [
+        {
+            key: (
+                float(value)  # Convert Decimal to float
+                if isinstance(value, decimal.Decimal)
+                else value.strftime("%Y-%m-%d")
+                if isinstance(value, datetime.date)
+                else value
+            )
+            for (key, value) in row.items()
+        }
+        for row in rows
+    ]
+
+
+class TestResultConversion(unittest.TestCase):
+    """Test cases for `_rows_from_arrow`."""
+
+    def test_matches_row_wise_conversion(self):
+        """The columnar output matches the row-wise one."""
+        table = _make_table(num_columns=len(_COLUMN_KINDS) * 2, num_rows=50)
+        self.assertEqual(
+            tools._rows_from_arrow(table),
+            _legacy_rows_from_results(table.to_pylist()),
+        )
+
+    def test_converts_bigquery_types(self):
+        """NUMERIC values become floats and dates ISO strings, nulls None."""
+        table = pa.table(
+            {
+                "amount": pa.array(
+                    [decimal.Decimal("1.5"), None], type=pa.decimal128(38, 9)
+                ),
+                "day": pa.array([datetime.date(2024, 5, 17), None]),
+                "n": pa.array([3, None], type=pa.int64()),
+            }
+        )
+        self.assertEqual(
+            tools._rows_from_arrow(table),
+            [
+                {"amount": 1.5, "day": "2024-05-17", "n": 3},
+                {"amount": None, "day": None, "n": None},
+            ],
+        )
+
+    def test_benchmark_large_result(self):
+        """Columnar conversion of 10k rows x 50 columns beats the row-wise one.
+
+        Both sides start from the same Arrow table: the row-wise conversion
+        first builds the Python rows, as the `RowIterator` rows had to be.
+        """
+        table = _make_table(num_columns=50, num_rows=10_000)
+        timings = {}
+        for name, convert in (
+            ("row-wise", lambda: _legacy_rows_from_results(table.to_pylist())),
+            ("columnar", lambda: tools._rows_from_arrow(table)),
+        ):
+            # Best of 5 runs, to be robust to other load on the machine.
+            runs = []
+            for _ in range(5):
+                start = time.perf_counter()
+                convert()
+                runs.append(time.perf_counter() - start)
+            timings[name] = min(runs)
+        print(
+            f"\nConverting {table.num_rows} rows x {table.num_columns} columns:"
+            f" row-wise={timings['row-wise'] * 1000:.1f}ms,"
+            f" columnar={timings['columnar'] * 1000:.1f}ms"
+        )
+        self.assertLess(timings["columnar"], timings["row-wise"])
+
+
+if __name__ == "__main__":
+    unittest.main()
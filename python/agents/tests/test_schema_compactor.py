@@ -0,0 +1,168 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test cases for the token-budgeted schema compaction."""
+
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from data_science.sub_agents.bigquery import schema_compactor
+from data_science.sub_agents.bigquery.schema_model import (
+    ColumnSchema,
+    DatabaseSchema,
+    DatasetSchema,
+    SampleRows,
+    TableSchema,
+)
+
+
+def _make_table(table_id, num_columns=4, long_value="x" * 300):
+    """Returns a table with described columns and five wide example rows."""
+    return TableSchema(
+        project_id="p",
+        dataset_id="d",
+        table_id=table_id,
+        table_type="TABLE",
+        columns=[
+            ColumnSchema(f"col_{i}", "STRING", description=f"Column {i} " * 10)
+            for i in range(num_columns)
+        ],
+        samples=SampleRows(
+            values=[
+                ", ".join(
+                    [f"'{long_value}{j}'", f"[{', '.join(str(k) for k in range(50))}]"]
+                    + [f"'v{i}'" for i in range(num_columns - 2)]
+                )
+                for j in range(5)
+            ]
+        ),
+    )
+
+
+def _make_schema(num_tables=10, **kwargs):
+    return DatabaseSchema(
+        {
+            "d": DatasetSchema(
+                "p",
+                "d",
+                [_make_table(f"t{i:02d}", **kwargs) for i in range(num_tables)],
+            )
+        }
+    )
+
+
+class TestLiteralCompaction(unittest.TestCase):
+    """Test cases for the compaction of example rows."""
+
+    def test_split_respects_quotes_and_nesting(self):
+        """Commas in strings, arrays and structs do not split literals."""
+        self.assertEqual(
+            schema_compactor._split_literals(
+                "'a, b''c', [1, 2], (3, 'd)'), NULL, b'\\\\', ''"
+            ),
+            ["'a, b''c'", "[1, 2]", "(3, 'd)')", "NULL", "b'\\\\'", "''"],
+        )
+
+    def test_long_literals_are_truncated(self):
+        """Long strings are cut without breaking escape sequences."""
+        max_chars = schema_compactor.MAX_LITERAL_CHARS
+        literal = "'" + "a" * (max_chars - 1) + "''tail'"
+        self.assertEqual(
+            schema_compactor._compact_literal(literal),
+            "'" + "a" * (max_chars - 1) + "...'",
+        )
+        literal = "b'" + "a" * (max_chars - 1) + "\\\\tail'"
+        self.assertEqual(
+            schema_compactor._compact_literal(literal),
+            "b'" + "a" * (max_chars - 1) + "...'",
+        )
+        self.assertEqual(schema_compactor._compact_literal("'short'"), "'short'")
+
+    def test_wide_arrays_and_structs_are_collapsed(self):
+        """Only the first elements of ARRAY and STRUCT values are kept."""
+        self.assertEqual(
+            schema_compactor._compact_literal("[1, 2, 3, 4, 5, 6, 7]"),
+            "[1, 2, 3, 4, 5 /* 2 more */]",
+        )
+        self.assertEqual(
+            schema_compactor._compact_literal("(1, ['a', 'b'], 3)"),
+            "(1, ['a', 'b'], 3)",
+        )
+
+    def test_near_identical_rows_are_removed(self):
+        """Rows differing in at most 10% of their values are dropped."""
+        rows = [", ".join(["1"] * 10 + [str(i)]) for i in range(3)]
+        rows.append(", ".join(["2"] * 11))
+        self.assertEqual(
+            schema_compactor.compact_sample_rows(SampleRows(values=rows)).values,
+            [rows[0], rows[3]],
+        )
+
+
+class TestSchemaCompaction(unittest.TestCase):
+    """Test cases for `compact_schema`."""
+
+    def test_schema_within_budget_is_unchanged(self):
+        """The DDL is left as is when it fits the budget."""
+        schema = _make_schema(num_tables=2)
+        compact = schema_compactor.compact_schema(schema, token_budget=10**6)
+        self.assertEqual(compact.ddl_by_dataset, schema.to_ddl_by_dataset())
+        self.assertTrue(compact.fits)
+
+    def test_schema_is_compacted_to_budget(self):
+        """Literal compaction alone is enough for moderately large schemas."""
+        schema = _make_schema()
+        full_tokens = schema_compactor.estimate_tokens(schema.datasets["d"].to_ddl())
+        compact = schema_compactor.compact_schema(
+            schema, token_budget=full_tokens // 2
+        )
+        ddl = compact.ddl_by_dataset["d"]
+        self.assertTrue(compact.fits)
+        self.assertEqual(compact.token_count, schema_compactor.estimate_tokens(ddl))
+        self.assertIn("/* 45 more */", ddl)
+        self.assertIn("OPTIONS(description=", ddl)
+        self.assertNotIn("x" * 100, ddl)
+        # The model is left untouched.
+        self.assertIn("x" * 300, schema.datasets["d"].to_ddl())
+
+    def test_samples_then_descriptions_are_dropped(self):
+        """Tighter budgets drop example rows before descriptions."""
+        schema = _make_schema(num_tables=20, num_columns=30)
+        tables = schema.datasets["d"].tables
+        without_samples = schema_compactor.compact_schema(
+            schema,
+            token_budget=sum(
+                schema_compactor.estimate_tokens(
+                    schema_compactor._drop_samples(table).to_ddl()
+                )
+                for table in tables
+            ),
+        )
+        ddl = without_samples.ddl_by_dataset["d"]
+        self.assertTrue(without_samples.fits)
+        self.assertNotIn("INSERT INTO", ddl)
+        self.assertIn("OPTIONS(description=", ddl)
+
+        minimal = schema_compactor.compact_schema(schema, token_budget=1)
+        self.assertFalse(minimal.fits)
+        self.assertNotIn("OPTIONS(description=", minimal.ddl_by_dataset["d"])
+        self.assertIn("`col_29` STRING", minimal.ddl_by_dataset["d"])
+        self.assertLess(minimal.token_count, without_samples.token_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
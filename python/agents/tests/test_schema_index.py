@@ -0,0 +1,166 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test cases and benchmark for the schema linking index."""
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from data_science.sub_agents.bigquery.schema_index import SchemaIndex, tokenize
+from data_science.sub_agents.bigquery.schema_model import (
+    ColumnSchema,
+    DatabaseSchema,
+    DatasetSchema,
+    SampleRows,
+    TableSchema,
+)
+
+
+def _make_table(dataset_id, table_id, columns, samples=None):
+    return TableSchema(
+        project_id="p",
+        dataset_id=dataset_id,
+        table_id=table_id,
+        table_type="TABLE",
+        columns=[
+            ColumnSchema(name, "STRING", description=description)
+            for name, description in columns
+        ],
+        samples=SampleRows(values=samples or []),
+    )
+
+
+def _make_schema():
+    return DatabaseSchema(
+        {
+            "sales": DatasetSchema(
+                "p",
+                "sales",
+                [
+                    _make_table(
+                        "sales",
+                        "orders",
+                        [
+                            ("order_id", None),
+                            ("customerId", None),
+                            ("total_amount", "Order total, in dollars"),
+                        ],
+                    ),
+                    _make_table(
+                        "sales",
+                        "customers",
+                        [("customer_id", None), ("full_name", None)],
+                    ),
+                    _make_table(
+                        "sales",
+                        "stores",
+                        [("store_id", None), ("city", None)],
+                        samples=["1, 'Monterrey'", "2, 'Guadalajara'"],
+                    ),
+                ],
+            ),
+            "hr": DatasetSchema(
+                "p",
+                "hr",
+                [
+                    _make_table(
+                        "hr",
+                        "employees",
+                        [("employee_id", None), ("salary", "Yearly salary")],
+                    ),
+                ],
+            ),
+        }
+    )
+
+
+class TestSchemaIndex(unittest.TestCase):
+    """Test cases for `SchemaIndex`."""
+
+    def setUp(self):
+        """Set up for test methods."""
+        self.index = SchemaIndex(_make_schema())
+
+    def test_tokenize_identifiers(self):
+        """Identifiers are split into singular, lowercase words."""
+        self.assertEqual(tokenize("customerId"), ["customer", "id"])
+        self.assertEqual(tokenize("TOTAL_AMOUNTS"), ["total", "amount"])
+        self.assertEqual(tokenize("Categories of class"), ["category", "of", "class"])
+
+    def test_tables_are_ranked_by_relevance(self):
+        """The best matching tables come first, with their columns."""
+        links = self.index.search("Total amount of the orders per customer", 2)
+        self.assertEqual(
+            [link.table.table_id for link in links], ["orders", "customers"]
+        )
+        self.assertEqual(links[0].columns[0], "total_amount")
+        self.assertIn("customerId", links[0].columns)
+
+    def test_descriptions_and_sample_values_are_indexed(self):
+        """Tables also match on descriptions and example values."""
+        self.assertEqual(
+            self.index.search("yearly pay", 1)[0].table.table_id, "employees"
+        )
+        self.assertEqual(
+            self.index.search("How many stores in Monterrey?", 1)[0].table.table_id,
+            "stores",
+        )
+
+    def test_unrelated_question_links_nothing(self):
+        """Questions sharing no term with the schema link no table."""
+        self.assertEqual(self.index.search("hello there", 5), [])
+
+    def test_benchmark_search(self):
+        """A search over thousands of tables takes milliseconds."""
+        num_tables = 5000
+        schema = DatabaseSchema(
+            {
+                "d": DatasetSchema(
+                    "p",
+                    "d",
+                    [
+                        _make_table(
+                            "d",
+                            f"table_{i}_{['orders', 'users', 'events'][i % 3]}",
+                            [
+                                (f"column_{j}_{i % 97}", f"Metric {j}")
+                                for j in range(20)
+                            ],
+                        )
+                        for i in range(num_tables)
+                    ],
+                )
+            }
+        )
+        start = time.perf_counter()
+        index = SchemaIndex(schema)
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(10):
+            links = index.search("total orders per user for column_3_42", 10)
+        search_time = (time.perf_counter() - start) / 10
+        print(
+            f"\nSchemaIndex on {num_tables} tables: build={build_time:.2f}s,"
+            f" search={search_time * 1000:.1f}ms"
+        )
+        self.assertEqual(len(links), 10)
+        self.assertLess(search_time, 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
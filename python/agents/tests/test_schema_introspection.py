@@ -0,0 +1,305 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test cases and benchmark for the BigQuery schema introspection."""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fake_bigquery import FakeBigQueryClient, FakeTable
+from google.cloud import bigquery
+from data_science.sub_agents.bigquery import tools
+from data_science.sub_agents.bigquery.chase_sql.sql_postprocessor import (
+    sql_translator,
+)
+from data_science.sub_agents.bigquery.schema_model import (
+    DatabaseSchema,
+    TableSchema,
+)
+from data_science.sub_agents.bigquery.schema_snapshot import SchemaSnapshotStore
+
+
+def _make_mixed_client(num_tables=5, latency=0.0):
+    """Returns a fake client with base tables, a view and external tables."""
+    client = FakeBigQueryClient(num_tables=num_tables, latency=latency)
+    client.add_table(
+        FakeTable(
+            "a_view",
+            table_type="VIEW",
+            schema=[bigquery.SchemaField("id", "INTEGER")],
+            view_query="SELECT id FROM `fake-project.fake_dataset.table_0000`",
+        )
+    )
+    client.add_table(
+        FakeTable(
+            "iceberg_events",
+            table_type="EXTERNAL",
+            schema=[
+                bigquery.SchemaField("event_id", "STRING"),
+                bigquery.SchemaField("flags", "BOOLEAN", mode="REPEATED"),
+                bigquery.SchemaField("payload", "RECORD", description="Raw"),
+            ],
+            external_data_configuration=SimpleNamespace(
+                source_format="ICEBERG",
+                connection_id="fake-project.us.lake",
+                source_uris=["gs://bucket/a.json", "gs://bucket/b.json"],
+            ),
+        )
+    )
+    client.add_table(
+        FakeTable(
+            "csv_external",
+            table_type="EXTERNAL",
+            schema=[bigquery.SchemaField("line", "STRING")],
+            external_data_configuration=SimpleNamespace(
+                source_format="CSV",
+                connection_id=None,
+                source_uris=["gs://bucket/a.csv"],
+            ),
+        )
+    )
+    client.add_table(FakeTable("mv", table_type="MATERIALIZED VIEW"))
+    return client
+
+
+class TestSchemaIntrospection(unittest.TestCase):
+    """Test cases for `get_bigquery_schema`."""
+
+    def _get_schema(self, client, max_workers):
+        return tools.get_bigquery_schema(
+            dataset_id=client.dataset,
+            data_project_id=client.project,
+            client=client,
+            max_workers=max_workers,
+        ).to_ddl()
+
+    def test_ddl_is_deterministic_across_worker_counts(self):
+        """The DDL does not depend on the number of workers."""
+        client = FakeBigQueryClient(num_tables=20)
+        client.add_table(
+            FakeTable("a_view", table_type="VIEW", view_query="SELECT 1")
+        )
+        sequential = self._get_schema(client, max_workers=1)
+        for max_workers in (2, 8, 32):
+            self.assertEqual(sequential, self._get_schema(client, max_workers))
+
+    def test_ddl_is_ordered_by_table_name(self):
+        """Tables appear in the DDL in table name order."""
+        client = FakeBigQueryClient(num_tables=5)
+        ddl = self._get_schema(client, max_workers=4)
+        positions = [
+            ddl.index(f"CREATE OR REPLACE TABLE `fake-project.fake_dataset.{t}`")
+            for t in sorted(client.tables)
+        ]
+        self.assertEqual(positions, sorted(positions))
+        self.assertIn("OPTIONS(description='The user''s name')", ddl)
+        self.assertIn(
+            "INSERT INTO `fake-project.fake_dataset.table_0000` VALUES "
+            "(0, 'name_0', 0.0);",
+            ddl,
+        )
+
+    def test_sample_rows_avoid_query_jobs(self):
+        """Standard tables are sampled with list_rows, without query jobs."""
+        client = FakeBigQueryClient(num_tables=10)
+        self._get_schema(client, max_workers=4)
+        self.assertEqual(client.calls["list_rows"], 10)
+        # Only the INFORMATION_SCHEMA query runs as a job.
+        self.assertEqual(client.calls["query"], 1)
+
+    def test_biglake_tables_are_sampled_in_one_script(self):
+        """BigLake tables and list_rows failures share one script job."""
+        client = FakeBigQueryClient(num_tables=4)
+        for table_id in ("table_0000", "table_0001"):
+            client.tables[table_id].biglake_configuration = SimpleNamespace(
+                table_format="ICEBERG"
+            )
+        client.tables["table_0002"].list_rows_error = ValueError("unsupported")
+        ddl = self._get_schema(client, max_workers=4)
+
+        self.assertEqual(client.calls["list_rows"], 2)
+        self.assertEqual(client.calls["list_jobs"], 1)
+        # INFORMATION_SCHEMA query plus a single sampling script.
+        self.assertEqual(client.calls["query"], 2)
+        self.assertEqual(ddl, self._get_schema(FakeBigQueryClient(4), 1))
+
+    def test_failed_script_falls_back_to_single_queries(self):
+        """A failing script does not prevent sampling the other tables."""
+        client = FakeBigQueryClient(num_tables=3)
+        for table in client.tables.values():
+            table.list_rows_error = ValueError("unsupported")
+        client.tables["table_0001"].query_error = ValueError("access denied")
+        ddl = self._get_schema(client, max_workers=1)
+        self.assertIn(
+            "-- NOTE: Could not retrieve sample rows for table"
+            " /projects/fake-project/datasets/fake_dataset/tables/table_0001.",
+            ddl,
+        )
+        self.assertIn("-- Example values for table `fake-project.fake_dataset.table_0002`", ddl)
+
+    def test_bulk_loader_matches_per_table_loader(self):
+        """The INFORMATION_SCHEMA loader renders the same DDL in one query."""
+        client = _make_mixed_client()
+        per_table = self._get_schema(client, max_workers=1)
+        calls_before = dict(client.calls)
+        bulk = tools.get_bigquery_schema_bulk(
+            dataset_id=client.dataset,
+            data_project_id=client.project,
+            client=client,
+        ).to_ddl()
+        self.assertEqual(per_table, bulk)
+        self.assertIn("WITH CONNECTION `fake-project.us.lake`", bulk)
+        self.assertIn("`flags` ARRAY<BOOLEAN>", bulk)
+        self.assertEqual(client.calls["get_table"], calls_before["get_table"])
+        # One metadata query, the example rows are read with list_rows.
+        self.assertEqual(client.calls["query"] - calls_before["query"], 1)
+
+    def test_benchmark_concurrent_introspection(self):
+        """Concurrent introspection is bounded by latency, not table count."""
+        num_tables, latency = 40, 0.02
+        timings = {}
+        for max_workers in (1, 8):
+            client = FakeBigQueryClient(num_tables=num_tables, latency=latency)
+            start = time.perf_counter()
+            self._get_schema(client, max_workers=max_workers)
+            timings[max_workers] = time.perf_counter() - start
+            self.assertEqual(client.calls["get_table"], num_tables)
+        print(
+            f"\nget_bigquery_schema on {num_tables} tables with {latency}s"
+            f" latency: sequential={timings[1]:.3f}s,"
+            f" 8 workers={timings[8]:.3f}s"
+        )
+        self.assertLess(timings[8] * 3, timings[1])
+
+
+class TestSchemaSnapshot(unittest.TestCase):
+    """Test cases for `get_bigquery_schema_incremental`."""
+
+    def setUp(self):
+        """Set up for test methods."""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.store = SchemaSnapshotStore(self._tmp_dir.name)
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _get_schema(self, client):
+        return tools.get_bigquery_schema_incremental(
+            dataset_id=client.dataset,
+            data_project_id=client.project,
+            client=client,
+            store=self.store,
+        ).to_ddl()
+
+    def _get_per_table_schema(self, client):
+        return tools.get_bigquery_schema(
+            dataset_id=client.dataset,
+            data_project_id=client.project,
+            client=client,
+        ).to_ddl()
+
+    def test_warm_start_reuses_snapshot(self):
+        """A warm start only runs the metadata query."""
+        client = _make_mixed_client()
+        cold = self._get_schema(client)
+        self.assertEqual(client.calls["get_table"], len(client.tables))
+        self.assertEqual(cold, self._get_per_table_schema(client))
+
+        warm_client = _make_mixed_client()
+        self.assertEqual(cold, self._get_schema(warm_client))
+        self.assertEqual(
+            warm_client.calls,
+            {"query": 1, "get_table": 0, "list_rows": 0, "list_jobs": 0},
+        )
+
+    def test_only_changed_tables_are_refetched(self):
+        """New, modified and dropped tables are reflected in the DDL."""
+        client = _make_mixed_client()
+        self._get_schema(client)
+
+        client = _make_mixed_client()
+        client.tables["table_0001"].schema.append(
+            bigquery.SchemaField("added_column", "DATE")
+        )
+        client.tables["table_0001"].last_modified_time = 2
+        del client.tables["table_0002"]
+        client.add_table(
+            FakeTable("new_view", table_type="VIEW", view_query="SELECT 2")
+        )
+        ddl = self._get_schema(client)
+
+        self.assertEqual(client.calls["get_table"], 2)
+        self.assertIn("`added_column` DATE", ddl)
+        self.assertIn("CREATE OR REPLACE VIEW `fake-project.fake_dataset.new_view`", ddl)
+        self.assertNotIn("table_0002", ddl)
+        self.assertEqual(ddl, self._get_per_table_schema(client))
+
+
+class TestSchemaModel(unittest.TestCase):
+    """Test cases for the structured schema model."""
+
+    def setUp(self):
+        """Set up for test methods."""
+        client = _make_mixed_client(num_tables=2)
+        self.dataset = tools.get_bigquery_schema(
+            dataset_id=client.dataset,
+            data_project_id=client.project,
+            client=client,
+        )
+
+    def test_ddl_is_memoized(self):
+        """The DDL is rendered once per table."""
+        table = self.dataset.tables[0]
+        self.assertIs(table.to_ddl(), table.to_ddl())
+        self.assertIs(self.dataset.to_ddl(), self.dataset.to_ddl())
+
+    def test_dict_round_trip(self):
+        """Tables stored in snapshots are restored identically."""
+        for table in self.dataset.tables:
+            restored = TableSchema.from_dict(table.to_dict())
+            self.assertEqual(table, restored)
+            self.assertEqual(table.to_ddl(), restored.to_ddl())
+
+    def test_mapping_schema_is_used_without_parsing_ddl(self):
+        """The translator uses the SQLGlot schema of the model as is."""
+        mapping_schema = DatabaseSchema(
+            {self.dataset.dataset_id: self.dataset}
+        ).mapping_schema()
+        self.assertIs(
+            sql_translator.SqlTranslator.rewrite_schema_for_sqlglot(mapping_schema),
+            mapping_schema,
+        )
+        self.assertEqual(
+            mapping_schema.column_names("fake-project.fake_dataset.iceberg_events"),
+            ["event_id", "flags", "payload"],
+        )
+        errors, sql = sql_translator.SqlTranslator._check_for_errors(
+            "SELECT score FROM table_0000",
+            sql_dialect="bigquery",
+            db="fake_dataset",
+            catalog="fake-project",
+            schema_dict=mapping_schema,
+        )
+        self.assertIsNone(errors)
+        self.assertIn("`table_0000`.`score`", sql)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test cases for the cache of the SQL generated for the questions."""
+
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fake_context_cache import FakeClock
+from data_science.sub_agents.bigquery.sql_cache import (
+    SqlCache,
+    normalize_question,
+)
+
+SQL = "SELECT DISTINCT country FROM `p.test.t`"
+
+
+class TestSqlCache(unittest.TestCase):
+    """Test cases for `SqlCache`."""
+
+    def setUp(self):
+        """Set up for test methods."""
+        self.clock = FakeClock()
+        self.cache = SqlCache(
+            max_entries=2, ttl_seconds=60, similarity_threshold=0, clock=self.clock
+        )
+
+    def test_normalize_question(self):
+        """Case, spaces and final punctuation are ignored."""
+        self.assertEqual(
+            normalize_question("  What countries   are in TEST? "),
+            "what countries are in test",
+        )
+
+    def test_exact_questions_hit(self):
+        """Questions are looked up by their normalized text and schema."""
+        self.assertIsNone(self.cache.get("What countries are in test?", "v1"))
+        self.cache.put("What countries are in test?", "v1", SQL)
+        self.assertEqual(self.cache.get("what countries are in test", "v1"), SQL)
+        self.assertIsNone(self.cache.get("What countries are in test?", "v2"))
+        self.assertEqual(self.cache.stats.exact_hits, 1)
+        self.assertEqual(self.cache.stats.misses, 2)
+        self.assertAlmostEqual(self.cache.stats.hit_rate, 1 / 3)
+
+    def test_near_duplicates_hit_above_the_threshold(self):
+        """Close questions with the same literals reuse the SQL."""
+        cache = SqlCache(max_entries=8, ttl_seconds=60, similarity_threshold=0.8)
+        cache.put("What are the top 5 countries by revenue in test?", "v1", SQL)
+        self.assertEqual(
+            cache.get("Which are the top 5 countries by revenue in test?", "v1"),
+            SQL,
+        )
+        self.assertIsNone(
+            cache.get("What are the top 10 countries by revenue in test?", "v1")
+        )
+        self.assertIsNone(cache.get("How many orders were shipped?", "v1"))
+        self.assertEqual(cache.stats.similar_hits, 1)
+        self.assertEqual(cache.stats.misses, 2)
+
+    def test_near_duplicates_are_ignored_without_threshold(self):
+        """Only exact questions are looked up by default."""
+        self.cache.put("What are the countries in test?", "v1", SQL)
+        self.assertIsNone(self.cache.get("Which are the countries in test?", "v1"))
+
+    def test_least_recently_used_questions_are_evicted(self):
+        """The cache keeps at most `max_entries` questions."""
+        self.cache.put("a", "v1", "SELECT 1")
+        self.cache.put("b", "v1", "SELECT 2")
+        self.cache.get("a", "v1")
+        self.cache.put("c", "v1", "SELECT 3")
+        self.assertEqual(self.cache.get("a", "v1"), "SELECT 1")
+        self.assertIsNone(self.cache.get("b", "v1"))
+        self.assertEqual(self.cache.stats.evictions, 1)
+
+    def test_questions_expire(self):
+        """Questions are evicted after their TTL."""
+        self.cache.put("a", "v1", "SELECT 1")
+        self.clock.advance(59)
+        self.assertEqual(self.cache.get("a", "v1"), "SELECT 1")
+        self.clock.advance(1)
+        self.assertIsNone(self.cache.get("a", "v1"))
+
+    def test_disabled_cache(self):
+        """A cache of 0 entries stores nothing."""
+        cache = SqlCache(max_entries=0)
+        cache.put("a", "v1", "SELECT 1")
+        self.assertIsNone(cache.get("a", "v1"))
+        self.assertEqual(cache.stats.misses, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
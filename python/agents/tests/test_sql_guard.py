@@ -0,0 +1,228 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test cases for the read-only guard and row cap of the validated queries."""
+
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pyarrow as pa
+from sqlglot import exp
+
+from data_science.sub_agents.bigquery import tools
+from data_science.sub_agents.bigquery.result_cache import QueryResultCache
+from data_science.sub_agents.bigquery.sql_guard import (
+    ParsedQuery,
+    limit_rows,
+    parse_query,
+)
+
+# Column names that contain a DML or DDL keyword, and were rejected by the
+# former substring search.
+FALSE_REJECTION_COLUMNS = [
+    "created_at",
+    "create_time",
+    "creation_date",
+    "created_by",
+    "last_updated",
+    "updated_at",
+    "update_count",
+    "is_deleted",
+    "deleted_flag",
+    "soft_delete_ts",
+    "insert_date",
+    "inserted_at",
+    "drop_off_location",
+    "dropped_calls",
+    "dropship_flag",
+    "alteration_code",
+    "alternate_sku",
+    "truncated_description",
+    "merge_status",
+    "merged_store_id",
+]
+
+READ_ONLY_QUERIES = [
+    "SELECT country, COUNT(*) AS n FROM `p.d.orders` GROUP BY country",
+    "WITH recent AS (SELECT * FROM `p.d.orders` WHERE day > '2024-01-01')"
+    " SELECT COUNT(*) FROM recent",
+    "SELECT id FROM `p.d.a` UNION ALL SELECT id FROM `p.d.b`",
+    "SELECT * FROM (SELECT id FROM `p.d.orders`) AS t",
+    # Keywords as data or quoted names.
+    "SELECT id FROM `p.d.audit` WHERE action = 'DELETE'",
+    "SELECT `update` FROM `p.d.audit`",
+]
+
+WRITE_STATEMENTS = {
+    "INSERT": "INSERT INTO `p.d.orders` (id) VALUES (1)",
+    "UPDATE": "UPDATE `p.d.orders` SET status = 'x' WHERE TRUE",
+    "DELETE": "DELETE FROM `p.d.orders` WHERE TRUE",
+    "MERGE": "MERGE `p.d.orders` t USING `p.d.new` s ON t.id = s.id"
+    " WHEN MATCHED THEN DELETE",
+    "CREATE": "CREATE TABLE `p.d.copy` AS SELECT * FROM `p.d.orders`",
+    "DROP": "DROP TABLE `p.d.orders`",
+    "ALTER": "ALTER TABLE `p.d.orders` ADD COLUMN note STRING",
+    "TRUNCATE": "TRUNCATE TABLE `p.d.orders`",
+}
+
+
+class TestParseQuery(unittest.TestCase):
+    """Test cases for `parse_query`."""
+
+    def test_columns_named_like_keywords_are_allowed(self):
+        """Columns containing DML/DDL keywords do not reject the query."""
+        for column in FALSE_REJECTION_COLUMNS:
+            sql = (
+                f"SELECT {column}, COUNT(*) AS n FROM `p.d.orders` AS o"
+                f" WHERE o.{column} IS NOT NULL GROUP BY {column} ORDER BY n"
+                f" LIMIT {tools.MAX_NUM_ROWS}"
+            )
+            query = parse_query(sql)
+            self.assertIsNone(query.error, column)
+            self.assertIsNotNone(query.expression, column)
+
+    def test_read_only_queries_are_allowed(self):
+        """SELECT queries, with CTEs, set operations or subqueries, pass."""
+        for sql in READ_ONLY_QUERIES:
+            self.assertIsNone(parse_query(sql).error, sql)
+
+    def test_write_statements_are_rejected(self):
+        """DML and DDL statements are rejected, and named in the error."""
+        for keyword, sql in WRITE_STATEMENTS.items():
+            error = parse_query(sql).error
+            self.assertIsNotNone(error, sql)
+            self.assertIn("disallowed DML/DDL", error, sql)
+
+    def test_several_statements_are_rejected(self):
+        """A query cannot smuggle a second statement."""
+        query = parse_query("SELECT 1; DROP TABLE `p.d.orders`")
+        self.assertIsNotNone(query.error)
+        self.assertIsNone(query.expression)
+
+
+class TestLimitRows(unittest.TestCase):
+    """Test cases for `limit_rows`."""
+
+    @staticmethod
+    def _limit(sql, max_rows=80):
+        return limit_rows(parse_query(sql), max_rows)
+
+    def _assert_limit(self, query, rows):
+        self.assertEqual(query.expression.args["limit"].expression.name, str(rows))
+        self.assertEqual(
+            parse_query(query.sql).expression.args["limit"].expression.name,
+            str(rows),
+        )
+
+    def test_adds_missing_limit(self):
+        """Queries without LIMIT, even over `credit_limit`, get one."""
+        for sql in (
+            "SELECT id FROM `p.d.orders`",
+            "SELECT credit_limit FROM `p.d.customers`",
+            "SELECT SUM(x) AS limit_total FROM `p.d.t`",
+        ):
+            self._assert_limit(self._limit(sql), 80)
+
+    def test_lowers_large_limit(self):
+        """Existing limits are capped, smaller ones are kept."""
+        self._assert_limit(self._limit("SELECT id FROM `p.d.t` LIMIT 100000"), 80)
+        self._assert_limit(self._limit("SELECT id FROM `p.d.t` LIMIT 10"), 10)
+
+    def test_keeps_order_by_and_offset(self):
+        """The cap applies after ORDER BY, and keeps the OFFSET."""
+        query = self._limit(
+            "SELECT id FROM `p.d.t` ORDER BY id DESC LIMIT 500 OFFSET 20"
+        )
+        self._assert_limit(query, 80)
+        self.assertIsNotNone(query.expression.args.get("order"))
+        self.assertIn("OFFSET 20", query.sql)
+
+    def test_caps_set_operations(self):
+        """The whole UNION is capped, not its last SELECT."""
+        query = self._limit(
+            "SELECT id FROM `p.d.a` UNION ALL SELECT id FROM `p.d.b` ORDER BY id"
+        )
+        self.assertIsInstance(query.expression, exp.Union)
+        self._assert_limit(query, 80)
+        self.assertIsNone(query.expression.expression.args.get("limit"))
+
+    def test_only_caps_the_outermost_query(self):
+        """Limits of subqueries and CTEs are left as they are."""
+        query = self._limit(
+            "WITH top AS (SELECT id FROM `p.d.t` ORDER BY id LIMIT 1000)"
+            " SELECT * FROM (SELECT id FROM top LIMIT 500)"
+        )
+        self._assert_limit(query, 80)
+        self.assertIn("LIMIT 1000", query.sql)
+        self.assertIn("LIMIT 500", query.sql)
+
+    def test_unparsable_queries_get_a_limit(self):
+        """Queries SQLGlot cannot parse fall back to appending a LIMIT."""
+        sql = "SELECT id FROM `p.d.t` WHERE ("
+        query = limit_rows(ParsedQuery(sql=sql, expression=None, error=None), 80)
+        self.assertEqual(query.sql, f"{sql} limit 80")
+
+
+class TestValidationGuard(unittest.TestCase):
+    """Test cases for the guard in `run_bigquery_validation`."""
+
+    def setUp(self):
+        """Set up for test methods."""
+        self.client = mock.Mock()
+        self.client.query.return_value.total_bytes_processed = 1024
+        results = mock.MagicMock()
+        results.schema = ["created_at"]
+        results.total_rows = 1
+        results.to_arrow.return_value = pa.table({"created_at": ["2024-05-17"]})
+        self.client.query.return_value.result.return_value = results
+        for name, value in (
+            ("get_bq_client", mock.Mock(return_value=self.client)),
+            ("result_cache", QueryResultCache()),
+        ):
+            patcher = mock.patch.object(tools, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _validate(sql):
+        settings = {"all_bq_ddl_schemas": {}, "schema_version": "v1"}
+        context = SimpleNamespace(state={"database_settings": settings})
+        return tools.run_bigquery_validation_sync(sql, context)
+
+    def test_select_over_keyword_columns_runs(self):
+        """A SELECT over `created_at` runs, instead of being rejected."""
+        result = self._validate("SELECT created_at FROM `p.d.orders`")
+        self.assertIsNone(result["error_message"])
+        self.assertEqual(result["query_result"], [{"created_at": "2024-05-17"}])
+
+    def test_capped_query_is_run(self):
+        """BigQuery runs the query with the capped LIMIT."""
+        self._validate("SELECT credit_limit FROM `p.d.customers` LIMIT 100000")
+        sql = self.client.query.call_args.args[0]
+        self.assertTrue(sql.endswith(f"LIMIT {tools.MAX_NUM_ROWS}"), sql)
+
+    def test_write_statements_do_not_run(self):
+        """Rejected statements never reach BigQuery."""
+        result = self._validate(WRITE_STATEMENTS["DELETE"])
+        self.assertIn("disallowed DML/DDL", result["error_message"])
+        self.client.query.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()